@@ -0,0 +1,157 @@
+# backend/app/autoresolve.py
+"""
+Resolución automática de reservas pendientes.
+
+Para cada local, entre las reservas 'pending' de la ventana pedida, elige el
+conjunto SIN solapamientos de máximo peso (weighted interval scheduling,
+O(n log n)): se aprueban las elegidas y se rechazan las demás.
+
+Peso de una reserva:
+- Primero la prioridad. Menor número = más importante (1 es la máxima y 9 la
+  que se asigna por defecto), así que pesa `max(1, 10 - priority)`.
+- Después, el orden de creación: a igual prioridad total gana el conjunto con
+  reservas hechas antes. Va como término secundario que nunca supera una
+  unidad de prioridad.
+
+Las pendientes que chocan con una reserva ya aprobada se rechazan sin entrar
+en el cálculo. Las de locales de capacidad compartida (con headcount) no
+entran: varias pueden caber a la vez y se aprueban una a una (capacity.py).
+Las que no tienen headcount sí, pero al aplicar se toma antes el bloqueo de
+su local, como en cualquier aprobación en un local compartido.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from .enums import ReservationStatus
+from .models import Reservation
+from .bulk import StatusChange, apply_status_changes
+from .capacity import lock_shared_locales
+
+
+@dataclass
+class Candidate:
+    id: UUID
+    locale_id: UUID
+    start_dt: datetime
+    end_dt: datetime
+    priority: int
+    created_rank: int          # 0 = la más antigua de su local
+
+
+@dataclass
+class Decision:
+    id: UUID
+    locale_id: UUID
+    start_dt: datetime
+    end_dt: datetime
+    priority: int
+    status: ReservationStatus  # approved | rejected
+    reason: str                # "selected" | "outweighed" | "overlaps_approved"
+
+
+def priority_weight(priority: int | None) -> int:
+    return max(1, 10 - (9 if priority is None else priority))
+
+
+def max_weight_schedule(candidates: list[Candidate]) -> set[UUID]:
+    """Ids del subconjunto sin solapamientos de peso máximo (intervalos [inicio, fin))."""
+    n = len(candidates)
+    if n == 0:
+        return set()
+    by_end = sorted(candidates, key=lambda c: (c.end_dt, c.start_dt))
+    ends = [c.end_dt for c in by_end]
+    # El término de antigüedad suma como mucho n*n < scale: nunca pesa más que una unidad de prioridad
+    scale = n * n + 1
+    weights = [priority_weight(c.priority) * scale + (n - c.created_rank) for c in by_end]
+    # prev[j]: última reserva (en orden de fin) que termina antes de que empiece la j
+    prev = [bisect_right(ends, c.start_dt, hi=j) - 1 for j, c in enumerate(by_end)]
+
+    best = [0] * (n + 1)     # best[j+1]: óptimo usando las j+1 primeras
+    for j in range(n):
+        best[j + 1] = max(best[j], weights[j] + best[prev[j] + 1])
+
+    chosen = set()
+    j = n - 1
+    while j >= 0:
+        if weights[j] + best[prev[j] + 1] >= best[j]:
+            chosen.add(by_end[j].id)
+            j = prev[j]
+        else:
+            j -= 1
+    return chosen
+
+
+async def plan_resolution(
+    session: AsyncSession,
+    window_start: datetime,
+    window_end: datetime,
+    locale_id: UUID | None = None,
+    lock: bool = False,
+) -> list[Decision]:
+    """Calcula qué aprobar y qué rechazar entre las pendientes que EMPIEZAN en la ventana."""
+    approved = aliased(Reservation)
+    clashes_approved = exists().where(
+        approved.locale_id == Reservation.locale_id,
+        approved.status == ReservationStatus.approved,
+        approved.during.op("&&")(Reservation.during),
+    )
+    criteria = [
+        Reservation.status == ReservationStatus.pending,
+        Reservation.headcount.is_(None),
+        Reservation.start_dt >= window_start,
+        Reservation.start_dt < window_end,
+    ]
+    if locale_id is not None:
+        criteria.append(Reservation.locale_id == locale_id)
+    if lock:
+        # Locales compartidos: su bloqueo antes que el de las filas (capacity.lock_shared_locales)
+        await lock_shared_locales(session, *criteria)
+
+    stmt = (
+        select(
+            Reservation.id,
+            Reservation.locale_id,
+            Reservation.start_dt,
+            Reservation.end_dt,
+            Reservation.priority,
+            clashes_approved.label("clashes"),
+        )
+        .where(*criteria)
+        .order_by(Reservation.locale_id, Reservation.created_at.asc().nulls_last(), Reservation.id)
+    )
+    if lock:
+        stmt = stmt.with_for_update(of=Reservation)
+
+    decisions: list[Decision] = []
+    per_locale: dict[UUID, list[Candidate]] = {}
+    for row in await session.execute(stmt):
+        if row.clashes:
+            decisions.append(Decision(row.id, row.locale_id, row.start_dt, row.end_dt, row.priority,
+                                      ReservationStatus.rejected, "overlaps_approved"))
+            continue
+        bucket = per_locale.setdefault(row.locale_id, [])
+        bucket.append(Candidate(row.id, row.locale_id, row.start_dt, row.end_dt, row.priority, len(bucket)))
+
+    for candidates in per_locale.values():
+        chosen = max_weight_schedule(candidates)
+        for c in candidates:
+            if c.id in chosen:
+                decisions.append(Decision(c.id, c.locale_id, c.start_dt, c.end_dt, c.priority,
+                                          ReservationStatus.approved, "selected"))
+            else:
+                decisions.append(Decision(c.id, c.locale_id, c.start_dt, c.end_dt, c.priority,
+                                          ReservationStatus.rejected, "outweighed"))
+
+    decisions.sort(key=lambda d: (str(d.locale_id), d.start_dt))
+    return decisions
+
+
+async def apply_resolution(session: AsyncSession, decisions: list[Decision]):
+    """Aplica las decisiones con el UPDATE masivo de bulk.py (el commit lo hace quien llama)."""
+    return await apply_status_changes(session, [StatusChange(d.id, d.status) for d in decisions])
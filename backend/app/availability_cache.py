@@ -0,0 +1,116 @@
+# backend/app/availability_cache.py
+"""
+Caché de disponibilidad por (locale_id, fecha).
+
+- Memoria acotada con desalojo LRU (AVAILABILITY_CACHE_SIZE entradas).
+- Invalidación exacta: las escrituras de reservas llaman a `invalidate()` con el
+  local y el rango de la reserva, y solo caen los días afectados.
+- Single-flight: si llegan cien peticiones iguales con la caché vacía, solo la
+  primera consulta la BD; las demás esperan su resultado. El cálculo usa la
+  sesión de esa primera petición, así que no puede sobrevivirla: si se cancela
+  (el cliente se desconectó), las que esperaban no heredan el CancelledError,
+  una de ellas vuelve a calcular con su propia sesión.
+- Con réplicas, `invalidate()` fija el local al primario unos segundos: si no,
+  un recálculo en una réplica retrasada volvería a guardar el dato viejo.
+- Las escrituras hechas en otro worker llegan por el LISTEN de events.py, que
+  llama a `invalidate()`; AVAILABILITY_CACHE_TTL acota el desfase si se pierde
+  algún aviso (p. ej. con la conexión LISTEN caída).
+"""
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from . import replicas
+from .cache import TTLLRUCache
+
+AVAILABILITY_CACHE_SIZE = int(os.getenv("AVAILABILITY_CACHE_SIZE", "5000"))
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", "30"))
+
+Key = tuple[UUID, date]
+
+
+class _Flight:
+    """Cálculo en curso para una clave; `stale` se marca si se invalida mientras tanto."""
+    __slots__ = ("future", "stale")
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.stale = False
+
+
+# Resultado de un cálculo cuyo dueño se canceló: quien lo esperaba lo reintenta
+_ABANDONED = object()
+
+_cache = TTLLRUCache(maxsize=AVAILABILITY_CACHE_SIZE, ttl=AVAILABILITY_CACHE_TTL)
+_inflight: dict[Key, _Flight] = {}
+coalesced = 0
+
+
+async def get_or_compute(key: Key, compute: Callable[[], Awaitable]):
+    global coalesced
+    while True:
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+
+        flight = _inflight.get(key)
+        if flight is None:
+            break
+        coalesced += 1
+        value = await asyncio.shield(flight.future)
+        if value is not _ABANDONED:
+            return value
+
+    flight = _Flight()
+    _inflight[key] = flight
+    try:
+        value = await compute()
+    except asyncio.CancelledError:
+        flight.future.set_result(_ABANDONED)
+        raise
+    except Exception as exc:
+        flight.future.set_exception(exc)
+        # La marcamos como leída por si nadie más la esperaba (evita el aviso de asyncio)
+        flight.future.exception()
+        raise
+    else:
+        flight.future.set_result(value)
+        if not flight.stale:
+            _cache.set(key, value)
+        return value
+    finally:
+        if _inflight.get(key) is flight:
+            del _inflight[key]
+
+
+def _drop(key: Key) -> None:
+    _cache.pop(key)
+    flight = _inflight.pop(key, None)
+    if flight is not None:
+        flight.stale = True
+
+
+def invalidate(locale_id: UUID, start_dt: datetime, end_dt: datetime) -> None:
+    """Invalida los días del local que toca la reserva [start_dt, end_dt)."""
+    # Empezamos un día antes: con cierre después de medianoche, la ventana del
+    # día anterior también cubre las primeras horas de start_dt.
+    replicas.pin(replicas.locale_key(locale_id))   # hasta que la réplica lo vea, se recalcula en el primario
+    day = start_dt.date() - timedelta(days=1)
+    last = end_dt.date()
+    while day <= last:
+        _drop((locale_id, day))
+        day += timedelta(days=1)
+
+
+def invalidate_locale(locale_id: UUID) -> None:
+    """Invalida todos los días de un local (cambio de horario, borrado...)."""
+    replicas.pin(replicas.locale_key(locale_id))
+    for key in [k for k in _inflight if k[0] == locale_id]:
+        _drop(key)
+    _cache.discard_where(lambda key, _value: key[0] == locale_id)
+
+
+def availability_cache_stats() -> dict:
+    return {**_cache.stats(), "inflight": len(_inflight), "coalesced": coalesced}
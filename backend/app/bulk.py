@@ -0,0 +1,196 @@
+# backend/app/bulk.py
+"""
+Cambios de estado masivos sobre reservas, en una sola transacción.
+
+Por lote, sin importar cuántas reservas traiga:
+1. Un SELECT ... FOR UPDATE que bloquea las reservas del lote y, para las que
+   pasan a 'approved', comprueba (EXISTS sobre el índice GiST) si chocan con
+   otra reserva aprobada que seguirá aprobada: solo se ignoran las del lote
+   que dejan de estarlo (una ya aprobada que el lote vuelve a aprobar sigue
+   contando como bloqueo para las demás).
+2. En memoria: solapamientos ENTRE aprobaciones del mismo lote (gana la que
+   aparece primero en la lista).
+3. Un único UPDATE ... FROM (VALUES ...) RETURNING con lo que quedó aceptado,
+   dentro de un SAVEPOINT: si una aprobación simultánea se coló entre medias y
+   salta la restricción de exclusión, se repite uno a uno y las que chocan
+   salen como "overlap".
+
+En locales compartidos (capacity.py), antes de todo se toma el bloqueo de
+cada local con aprobaciones en el lote, en orden de id, igual que la
+aprobación individual; así el paso 1 ve lo que otra aprobación acaba de
+confirmar. Aprobar una que se solapa con otra aprobada da "overlap" aunque
+hubiera capacidad. Es conservador: sin nada aprobado solapado, la comprobación
+de capacity.approval_conflict se reduce a que su headcount quepa en el local
+("full" si no). Para aprovechar la capacidad está el cambio de estado
+individual.
+
+El commit lo hace quien llama.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import Integer, cast, exists, func, select, update, values, column
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from .capacity import lock_shared_locales
+from .conflicts import is_exclusion_violation
+from .enums import ReservationStatus
+from .models import Locale, Reservation
+
+
+@dataclass
+class StatusChange:
+    id: UUID
+    status: ReservationStatus
+    priority: int | None = None
+
+
+@dataclass
+class ChangeResult:
+    id: UUID
+    result: str                      # "updated" | "not_found" | "overlap" | "full"
+    locale_id: UUID | None = None
+    start_dt: datetime | None = None
+    end_dt: datetime | None = None
+    status: ReservationStatus | None = None
+    priority: int | None = None
+    user_id: UUID | None = None
+
+
+def _values(changes: list[StatusChange]):
+    status_type = Reservation.status.type
+    return values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("status", status_type),
+        column("priority", Integer),
+        name="v",
+        literal_binds=True,
+    ).data([(c.id, c.status, c.priority) for c in changes])
+
+
+async def apply_status_changes(session: AsyncSession, changes: list[StatusChange]) -> list[ChangeResult]:
+    # Si un id viene repetido, vale la última aparición
+    changes = list({c.id: c for c in changes}.values())
+    if not changes:
+        return []
+
+    v = _values(changes)
+    v_id = cast(v.c.id, PG_UUID(as_uuid=True))
+    other = aliased(Reservation)
+    leaving_ids = [c.id for c in changes if c.status != ReservationStatus.approved]
+    approving_ids = [c.id for c in changes if c.status == ReservationStatus.approved]
+
+    # 0. Locales compartidos: su bloqueo, antes que el de las filas
+    if approving_ids:
+        await lock_shared_locales(session, Reservation.id.in_(approving_ids))
+
+    # 1. Bloquear el lote y detectar choques con aprobadas que seguirán aprobadas
+    clashes_outside = exists().where(
+        other.locale_id == Reservation.locale_id,
+        other.status == ReservationStatus.approved,
+        other.during.op("&&")(Reservation.during),
+        other.id != Reservation.id,
+    )
+    if leaving_ids:
+        clashes_outside = clashes_outside.where(other.id.not_in(leaving_ids))
+    rows = (await session.execute(
+        select(
+            Reservation.id,
+            Reservation.locale_id,
+            Reservation.start_dt,
+            Reservation.end_dt,
+            Reservation.headcount,
+            Locale.shared_capacity,
+            Locale.capacity,
+            clashes_outside.label("clashes"),
+        )
+        .join(v, Reservation.id == v_id)
+        .join(Locale, Locale.id == Reservation.locale_id)
+        .with_for_update(of=Reservation)
+    )).all()
+    found = {r.id: r for r in rows}
+
+    # 2. Decidir cada cambio (en el orden recibido)
+    results: dict[UUID, ChangeResult] = {}
+    accepted: list[StatusChange] = []
+    approved_in_batch: dict[UUID, list[tuple[datetime, datetime]]] = {}
+    for c in changes:
+        row = found.get(c.id)
+        if row is None:
+            results[c.id] = ChangeResult(id=c.id, result="not_found")
+            continue
+        if c.status == ReservationStatus.approved:
+            taken = approved_in_batch.setdefault(row.locale_id, [])
+            if row.clashes or any(s < row.end_dt and row.start_dt < e for s, e in taken):
+                results[c.id] = ChangeResult(id=c.id, result="overlap", locale_id=row.locale_id,
+                                             start_dt=row.start_dt, end_dt=row.end_dt)
+                continue
+            if row.shared_capacity and row.headcount is not None and row.headcount > (row.capacity or 0):
+                results[c.id] = ChangeResult(id=c.id, result="full", locale_id=row.locale_id,
+                                             start_dt=row.start_dt, end_dt=row.end_dt)
+                continue
+            taken.append((row.start_dt, row.end_dt))
+        accepted.append(c)
+
+    # 3. Un solo UPDATE para todo lo aceptado
+    for r in await _update_accepted(session, accepted, results):
+        results[r.id] = ChangeResult(
+            id=r.id, result="updated", locale_id=r.locale_id, start_dt=r.start_dt,
+            end_dt=r.end_dt, status=r.status, priority=r.priority, user_id=r.user_id,
+        )
+
+    return [results[c.id] for c in changes]
+
+
+def _update_stmt(accepted: list[StatusChange]):
+    va = _values(accepted)
+    return (
+        update(Reservation)
+        .where(Reservation.id == cast(va.c.id, PG_UUID(as_uuid=True)))
+        .values(
+            status=cast(va.c.status, Reservation.status.type),
+            priority=func.coalesce(cast(va.c.priority, Integer), Reservation.priority),
+        )
+        .returning(
+            Reservation.id, Reservation.locale_id, Reservation.start_dt,
+            Reservation.end_dt, Reservation.status, Reservation.priority, Reservation.user_id,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _update_accepted(session: AsyncSession, accepted: list[StatusChange],
+                           results: dict[UUID, ChangeResult]) -> list:
+    """
+    El UPDATE, en un SAVEPOINT. Si aun así choca con una aprobación simultánea
+    (la restricción de exclusión la ve aunque el EXISTS de antes no), se repite
+    uno a uno y las que chocan quedan como "overlap" en `results`, en lugar de
+    tumbar el lote entero.
+    """
+    if not accepted:
+        return []
+    try:
+        async with session.begin_nested():
+            return (await session.execute(_update_stmt(accepted))).all()
+    except IntegrityError as exc:
+        if not is_exclusion_violation(exc):
+            raise
+
+    rows = []
+    for c in accepted:
+        try:
+            async with session.begin_nested():
+                rows += (await session.execute(_update_stmt([c]))).all()
+        except IntegrityError as exc:
+            if not is_exclusion_violation(exc):
+                raise
+            row = (await session.execute(
+                select(Reservation.locale_id, Reservation.start_dt, Reservation.end_dt).where(Reservation.id == c.id)
+            )).one()
+            results[c.id] = ChangeResult(id=c.id, result="overlap", locale_id=row.locale_id,
+                                         start_dt=row.start_dt, end_dt=row.end_dt)
+    return rows
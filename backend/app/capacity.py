@@ -0,0 +1,212 @@
+# backend/app/capacity.py
+"""
+Locales de capacidad compartida (Locale.shared_capacity).
+
+En un local normal una reserva aprobada lo ocupa entero. En uno compartido
+caben varias reservas a la vez mientras la suma de sus asistentes
+(Reservation.headcount) no supere `capacity` en ningún instante. Una reserva
+sin headcount en un local compartido (p. ej. de antes de marcarlo) cuenta como
+el local entero.
+
+El pico de ocupación de un intervalo (o de varios a la vez, p. ej. las fechas
+de una serie) sale de UNA consulta (sweep-line):
+
+1. Las reservas del local que tocan el intervalo, por el índice GiST
+   (locale_id, during), recortadas a él.
+2. Cada una aporta dos eventos: +asistentes al empezar y -asistentes al
+   terminar.
+3. La suma acumulada ordenada por (instante, delta) es la ocupación tras cada
+   evento; las salidas van antes que las entradas del mismo instante porque
+   los intervalos son [inicio, fin).
+4. El máximo es el pico (por intervalo si hay varios).
+
+Reservar o aprobar en un local compartido se serializa por local con un
+advisory lock de transacción; la restricción de exclusión de la BD solo cubre
+las reservas sin headcount.
+
+Con capacidad se comprueban:
+- al crear: las pendientes y aprobadas (una reserva pendiente ya ocupa sitio,
+  igual que en la disponibilidad);
+- al aprobar: solo las aprobadas.
+"""
+from collections import defaultdict
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import DateTime, Integer, and_, column, func, literal, select, union_all, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .conflicts import find_approved_overlap
+from .enums import ReservationStatus
+from .models import Locale, Reservation
+
+ACTIVE = (ReservationStatus.approved, ReservationStatus.pending)
+FULL_DETAIL = "No queda capacidad en el local para ese horario."
+
+
+def windows_values(windows: list[tuple[int, datetime, datetime]]):
+    """VALUES (n, start_dt, end_dt) con las ventanas que mide peaks_stmt."""
+    return select(values(
+        column("n", Integer),
+        column("start_dt", DateTime),
+        column("end_dt", DateTime),
+        name="w",
+    ).data(windows)).cte("windows")
+
+
+def peaks_stmt(
+    locale_id: UUID,
+    capacity: int,
+    windows,
+    statuses: tuple[ReservationStatus, ...] = ACTIVE,
+    exclude_id: UUID | str | None = None,
+    exclude_series_id: UUID | None = None,
+):
+    """
+    (n, peak) por cada ventana de `windows` (columnas n, start_dt, end_dt): el
+    máximo de asistentes simultáneos del local dentro de ella, 0 si no hay nadie.
+    Una sola consulta para todas; la suma acumulada va por ventana.
+    """
+    load = func.coalesce(Reservation.headcount, capacity)
+    overlapping = (
+        select(
+            windows.c.n,
+            func.greatest(Reservation.start_dt, windows.c.start_dt).label("start_dt"),
+            func.least(Reservation.end_dt, windows.c.end_dt).label("end_dt"),
+            load.label("load"),
+        )
+        .join_from(windows, Reservation, and_(
+            Reservation.locale_id == locale_id,
+            Reservation.status.in_(statuses),
+            Reservation.during.op("&&")(func.tsrange(windows.c.start_dt, windows.c.end_dt, literal("[)"))),
+        ))
+    )
+    if exclude_id is not None:
+        overlapping = overlapping.where(Reservation.id != exclude_id)
+    if exclude_series_id is not None:
+        overlapping = overlapping.where(Reservation.series_id.is_distinct_from(exclude_series_id))
+    overlapping = overlapping.cte("overlapping")
+
+    events = union_all(
+        select(overlapping.c.n, overlapping.c.start_dt.label("at"), overlapping.c.load.label("delta")),
+        select(overlapping.c.n, overlapping.c.end_dt, -overlapping.c.load),
+    ).subquery("events")
+    running = select(
+        events.c.n,
+        func.sum(events.c.delta)
+        .over(partition_by=events.c.n, order_by=(events.c.at, events.c.delta))
+        .label("load"),
+    ).subquery("running")
+    return (
+        select(windows.c.n, func.coalesce(func.max(running.c.load), 0).label("peak"))
+        .outerjoin(running, running.c.n == windows.c.n)
+        .group_by(windows.c.n)
+    )
+
+
+def peak_stmt(
+    locale_id: UUID,
+    capacity: int,
+    start_dt: datetime,
+    end_dt: datetime,
+    statuses: tuple[ReservationStatus, ...] = ACTIVE,
+    exclude_id: UUID | str | None = None,
+):
+    """Pico de asistentes del local dentro de [start_dt, end_dt) (0 si no hay nadie)."""
+    peaks = peaks_stmt(
+        locale_id, capacity, windows_values([(0, start_dt, end_dt)]), statuses, exclude_id
+    ).subquery("peaks")
+    return select(peaks.c.peak)
+
+
+async def lock_locale(session: AsyncSession, locale_id: UUID) -> None:
+    """Serializa, hasta el commit, las reservas y aprobaciones de un local compartido."""
+    await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"capacity:{locale_id}"))))
+
+
+async def lock_shared_locales(session: AsyncSession, *criteria) -> list[UUID]:
+    """
+    Bloquea los locales compartidos de las reservas que cumplen `criteria`
+    (p. ej. las de un lote), en orden de id para que dos lotes no se
+    interbloqueen. Va ANTES de bloquear filas con FOR UPDATE: es el mismo
+    orden que la aprobación individual (bloqueo del local y luego el UPDATE).
+    """
+    locale_ids = (await session.scalars(
+        select(Locale.id).distinct()
+        .join(Reservation, Reservation.locale_id == Locale.id)
+        .where(Locale.shared_capacity.is_(True), *criteria)
+        .order_by(Locale.id)
+    )).all()
+    for locale_id in locale_ids:
+        await lock_locale(session, locale_id)
+    return locale_ids
+
+
+async def has_room(session: AsyncSession, locale: Locale, headcount: int,
+                   start_dt: datetime, end_dt: datetime) -> bool:
+    """Si una reserva nueva de `headcount` personas cabe en el local compartido (bloquea el local)."""
+    await lock_locale(session, locale.id)
+    peak = await session.scalar(peak_stmt(locale.id, locale.capacity, start_dt, end_dt))
+    return peak + headcount <= locale.capacity
+
+
+async def approval_conflict(session: AsyncSession, reservation: Reservation, overlap_detail: str) -> str | None:
+    """
+    Motivo por el que no se puede aprobar la reserva, o None. Sin headcount
+    choca con cualquier aprobada solapada; con headcount, las aprobadas más
+    ella no pueden superar la capacidad del local.
+
+    En un local compartido toda aprobación toma el bloqueo del local, también
+    las de reservas sin headcount: si no, una de ellas y otra con headcount
+    podrían aprobarse a la vez sin ver la una a la otra.
+    """
+    locale = (await session.execute(
+        select(Locale.shared_capacity, Locale.capacity).where(Locale.id == reservation.locale_id)
+    )).one()
+    if locale.shared_capacity or reservation.headcount is not None:
+        await lock_locale(session, reservation.locale_id)
+
+    if reservation.headcount is None:
+        overlap = await find_approved_overlap(
+            session, reservation.locale_id, reservation.start_dt, reservation.end_dt, exclude_id=reservation.id
+        )
+        return overlap_detail if overlap else None
+    capacity = locale.capacity or 0
+    peak = await session.scalar(peak_stmt(
+        reservation.locale_id, capacity, reservation.start_dt, reservation.end_dt,
+        statuses=(ReservationStatus.approved,), exclude_id=reservation.id,
+    ))
+    if peak + reservation.headcount > capacity:
+        return FULL_DETAIL
+    return None
+
+
+def load_profile(start: datetime, end: datetime,
+                 intervals: list[tuple[datetime, datetime, int]]) -> list[tuple[datetime, datetime, int]]:
+    """
+    Tramos consecutivos que cubren [start, end) con la ocupación de cada uno,
+    a partir de (inicio, fin, asistentes). Es el mismo sweep-line que peak_stmt,
+    sobre filas ya leídas.
+    """
+    deltas: dict[datetime, int] = defaultdict(int)
+    for s, e, load in intervals:
+        s, e = max(s, start), min(e, end)
+        if s < e:
+            deltas[s] += load
+            deltas[e] -= load
+    points = sorted(set(deltas) | {start, end})
+    blocks: list[tuple[datetime, datetime, int]] = []
+    current = 0
+    for a, b in zip(points, points[1:]):
+        current += deltas.get(a, 0)
+        if blocks and blocks[-1][2] == current:
+            blocks[-1] = (blocks[-1][0], b, current)
+        else:
+            blocks.append((a, b, current))
+    return blocks
+
+
+def remaining_blocks(start: datetime, end: datetime, capacity: int,
+                     intervals: list[tuple[datetime, datetime, int]]) -> list[tuple[datetime, datetime, int]]:
+    """(inicio, fin, plazas libres) de cada tramo de [start, end)."""
+    return [(s, e, max(capacity - load, 0)) for s, e, load in load_profile(start, end, intervals)]
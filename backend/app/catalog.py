@@ -0,0 +1,110 @@
+# backend/app/catalog.py
+"""
+Caché del catálogo de locales.
+
+El catálogo cambia unas pocas veces al mes pero se pide en cada vista. Se guarda
+ya serializado a bytes junto con un ETag fuerte; las escrituras de admin.py
+llaman a `bump_catalog_version()` y la siguiente lectura lo reconstruye.
+
+Cada worker de Uvicorn tiene su propia copia, así que además se reconstruye
+cada LOCALE_CATALOG_TTL segundos para acotar cuánto puede tardar un worker en
+enterarse de un cambio hecho en otro.
+"""
+import hashlib
+import os
+import time
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from . import replicas
+from .models import Locale
+from .schemas import LocaleOut
+
+LOCALE_CATALOG_TTL = float(os.getenv("LOCALE_CATALOG_TTL", "30"))
+
+_catalog_adapter = TypeAdapter(list[LocaleOut])
+
+_version = 0
+_cached: dict | None = None   # {"version", "built_at", "body", "etag"}
+hits = 0
+misses = 0
+
+
+def bump_catalog_version() -> None:
+    """Invalida el catálogo tras crear, editar o borrar un local."""
+    global _version
+    _version += 1
+    replicas.pin(replicas.CATALOG_KEY)   # la reconstrucción lee del primario hasta que la réplica lo vea
+
+
+def locale_out(r: Locale) -> LocaleOut:
+    return LocaleOut(
+        id=str(r.id),                    # ← UUID → string
+        name=r.name,
+        description=r.description,
+        capacity=r.capacity,
+        shared_capacity=r.shared_capacity,
+        location=r.location,
+        open_time=r.open_time.strftime("%H:%M"),
+        close_time=r.close_time.strftime("%H:%M"),
+        schedule=r.schedule,
+        imagen_url=f"/assets/locales/{r.imagen}" if r.imagen else "/assets/img/no-image.jpg"
+    )
+
+
+async def _build(session: AsyncSession) -> dict:
+    version = _version   # capturado ANTES de consultar: si alguien escribe mientras tanto, quedará viejo
+    rows = (await session.execute(select(Locale).order_by(Locale.name))).scalars().all()
+    body = _catalog_adapter.dump_json([locale_out(r) for r in rows])
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return {"version": version, "built_at": time.monotonic(), "body": body, "etag": etag}
+
+
+def _is_fresh(entry: dict | None) -> bool:
+    return (
+        entry is not None
+        and entry["version"] == _version
+        and time.monotonic() - entry["built_at"] < LOCALE_CATALOG_TTL
+    )
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Comparación débil (RFC 9110): nginx marca el ETag como W/ al comprimir
+    candidates = {c.strip().removeprefix("W/") for c in header.split(",")}
+    return etag in candidates
+
+
+async def catalog_response(request: Request, session: AsyncSession) -> Response:
+    """Catálogo completo como JSON, o 304 si el cliente ya tiene esta versión."""
+    global _cached, hits, misses
+    entry = _cached
+    if _is_fresh(entry):
+        hits += 1
+    else:
+        misses += 1
+        replicas.use_primary_if_pinned(session, replicas.CATALOG_KEY)
+        entry = await _build(session)
+        _cached = entry
+
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
+def catalog_stats() -> dict:
+    total = hits + misses
+    return {
+        "version": _version,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
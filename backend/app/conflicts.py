@@ -0,0 +1,206 @@
+# backend/app/conflicts.py
+"""
+Motor de detección de conflictos entre reservas.
+
+Agrupa las reservas que se solapan en el mismo local en "grupos de conflicto"
+(componentes conexas del grafo de solapamientos) con UNA sola consulta:
+
+1. Se ordenan las reservas de cada local por (start_dt, id).
+2. Con una función ventana se obtiene el mayor end_dt de las filas anteriores.
+   Si la fila empieza después (o justo cuando) termina todo lo anterior,
+   abre un grupo nuevo; si no, pertenece al grupo en curso (sweep-line).
+3. La suma acumulada de esos "inicios de grupo" da el número de grupo.
+4. Solo interesan los grupos con más de una reserva.
+
+También expone la comprobación puntual de solapamiento contra reservas
+aprobadas, respaldada por el índice GiST de la restricción de exclusión
+`reservations_no_overlap_approved` (ver db/init.sql).
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import and_, case, func, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .enums import ReservationStatus
+from .models import Locale, Reservation, User
+
+
+# SQLSTATE de PostgreSQL para "exclusion_violation"
+EXCLUSION_VIOLATION = "23P01"
+
+
+def is_exclusion_violation(exc: IntegrityError) -> bool:
+    """True si el IntegrityError lo disparó la restricción de no-solapamiento."""
+    return getattr(exc.orig, "sqlstate", None) == EXCLUSION_VIOLATION
+
+
+async def find_approved_overlap(
+    session: AsyncSession,
+    locale_id: UUID,
+    start_dt: datetime,
+    end_dt: datetime,
+    exclude_id: UUID | str | None = None,
+) -> UUID | None:
+    """
+    Devuelve el id de una reserva APROBADA del local que se solape con
+    [start_dt, end_dt), o None. Usa el operador && sobre `during`, que resuelve
+    el índice GiST (locale_id, during) en O(log n) en vez de recorrer la tabla.
+    """
+    stmt = (
+        select(Reservation.id)
+        .where(
+            Reservation.locale_id == locale_id,
+            Reservation.status == ReservationStatus.approved,
+            Reservation.during.op("&&")(func.tsrange(start_dt, end_dt, literal("[)"))),
+        )
+        .limit(1)
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(Reservation.id != exclude_id)
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+@dataclass
+class ConflictGroup:
+    locale_id: UUID
+    locale_name: str
+    start_dt: datetime
+    end_dt: datetime
+    reservations: list[dict] = field(default_factory=list)
+
+
+def _marked_reservations(
+    statuses: tuple[ReservationStatus, ...],
+    locale_id: UUID | None,
+    window_start: datetime | None,
+    window_end: datetime | None,
+):
+    """Subconsulta: cada reserva con el número de grupo de solapamiento de su local."""
+    order = (Reservation.start_dt, Reservation.id)
+
+    prev_end = func.max(Reservation.end_dt).over(
+        partition_by=Reservation.locale_id, order_by=order, rows=(None, -1)
+    )
+    base = select(
+        Reservation.id,
+        Reservation.locale_id,
+        Reservation.user_id,
+        Reservation.start_dt,
+        Reservation.end_dt,
+        Reservation.status,
+        Reservation.priority,
+        Reservation.motive,
+        case(
+            (or_(prev_end.is_(None), Reservation.start_dt >= prev_end), 1),
+            else_=0,
+        ).label("is_new"),
+    ).where(Reservation.status.in_(statuses))
+
+    if locale_id is not None:
+        base = base.where(Reservation.locale_id == locale_id)
+    if window_start is not None:
+        base = base.where(Reservation.end_dt > window_start)
+    if window_end is not None:
+        base = base.where(Reservation.start_dt < window_end)
+
+    base = base.subquery("base")
+    return select(
+        base,
+        func.sum(base.c.is_new)
+        .over(partition_by=base.c.locale_id, order_by=(base.c.start_dt, base.c.id))
+        .label("grp"),
+    ).subquery("marked")
+
+
+async def find_conflict_groups(
+    session: AsyncSession,
+    *,
+    locale_id: UUID | None = None,
+    window_start: datetime | None = None,
+    window_end: datetime | None = None,
+    statuses: tuple[ReservationStatus, ...] = (ReservationStatus.pending,),
+    limit: int = 50,
+    offset: int = 0,
+) -> tuple[int, list[ConflictGroup]]:
+    """
+    Devuelve (total_de_grupos, grupos_de_la_página).
+    Una sola ida y vuelta a la base de datos, sin importar cuántas reservas haya.
+    """
+    marked = _marked_reservations(statuses, locale_id, window_start, window_end)
+
+    groups = (
+        select(
+            marked.c.locale_id,
+            marked.c.grp,
+            func.min(marked.c.start_dt).label("group_start"),
+            func.max(marked.c.end_dt).label("group_end"),
+            func.count().over().label("total_groups"),
+        )
+        .group_by(marked.c.locale_id, marked.c.grp)
+        .having(func.count() > 1)
+        .order_by(func.min(marked.c.start_dt), marked.c.locale_id)
+        .limit(limit)
+        .offset(offset)
+        .subquery("groups")
+    )
+
+    stmt = (
+        select(
+            marked,
+            groups.c.group_start,
+            groups.c.group_end,
+            groups.c.total_groups,
+            Locale.name.label("locale_name"),
+            User.email.label("user_email"),
+            User.full_name.label("user_name"),
+        )
+        .join(groups, and_(groups.c.locale_id == marked.c.locale_id, groups.c.grp == marked.c.grp))
+        .join(Locale, Locale.id == marked.c.locale_id)
+        .join(User, User.id == marked.c.user_id)
+        .order_by(groups.c.group_start, marked.c.locale_id, marked.c.start_dt, marked.c.id)
+    )
+
+    total = 0
+    result: list[ConflictGroup] = []
+    current_key = None
+    for row in await session.execute(stmt):
+        total = row.total_groups
+        key = (row.locale_id, row.grp)
+        if key != current_key:
+            current_key = key
+            result.append(
+                ConflictGroup(
+                    locale_id=row.locale_id,
+                    locale_name=row.locale_name,
+                    start_dt=row.group_start,
+                    end_dt=row.group_end,
+                )
+            )
+        result[-1].reservations.append(
+            {
+                "id": str(row.id),
+                "user_id": str(row.user_id),
+                "userName": row.user_name,
+                "userEmail": row.user_email,
+                "startDate": row.start_dt.isoformat(),
+                "endDate": row.end_dt.isoformat(),
+                "status": row.status.value,
+                "priority": row.priority,
+                "motive": row.motive,
+            }
+        )
+
+    if not result and offset > 0:
+        # Página vacía: el total no viaja en ninguna fila, lo pedimos aparte.
+        count_stmt = select(func.count()).select_from(
+            select(marked.c.locale_id, marked.c.grp)
+            .group_by(marked.c.locale_id, marked.c.grp)
+            .having(func.count() > 1)
+            .subquery()
+        )
+        total = (await session.execute(count_stmt)).scalar_one()
+
+    return total, result
@@ -1,30 +1,148 @@
 # backend/app/database.py
+"""
+Engine, pool y sesiones: único punto de acceso a la base de datos.
+
+    DB_POOL_SIZE              conexiones permanentes por proceso (5)
+    DB_MAX_OVERFLOW           conexiones extra en picos (10)
+    DB_POOL_TIMEOUT           segundos esperando una conexión libre antes de fallar (30)
+    DB_POOL_RECYCLE           vida máxima de una conexión en segundos (1800; -1 = sin límite)
+    DB_POOL_PRE_PING          1 = comprobar la conexión antes de prestarla (1)
+    DB_STATEMENT_TIMEOUT_MS   tope por sentencia para toda la app (15000; 0 = sin tope)
+    DB_POOL_WARMUP            conexiones que se abren al arrancar (= DB_POOL_SIZE)
+
+Con varios workers cada proceso tiene su propio pool: el total posible es
+workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW), más los procesos de trabajos
+(python -m app.jobs) y una conexión de LISTEN por proceso (events.py). Debe
+quedar por debajo de max_connections. db_pool_saturation y
+db_pool_checkout_wait_seconds en /metrics dicen cuánto se usa de verdad.
+
+Las rutas usan `Depends(get_async_session)`: FastAPI reutiliza la misma sesión
+(y la misma conexión) para la autenticación y para el handler. Las rutas
+pesadas suben su tope con `dependencies=[statement_timeout(ms)]`. Las rutas de
+solo lectura pueden ir a réplicas con `get_read_session` (ver replicas.py).
+"""
+import asyncio
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, AsyncEngine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
 
-# 🚨 NUEVA IMPORTACIÓN: Necesitas la clase Pool
-from sqlalchemy.pool import Pool 
-from sqlalchemy import event, DDL 
+from fastapi import Depends
+from sqlalchemy import event, DDL, text
+from sqlalchemy.exc import DBAPIError
+
+from .metrics import InstrumentedQueuePool, instrument_engine
+from . import sql_budget
 
 # Si UserRole no es necesario en database.py, puedes borrar esta línea.
 from .enums import UserRole 
 
+logger = logging.getLogger(__name__)
+
 # Cargar variables de entorno
 load_dotenv()
 
 # Leer la URL desde el .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Crear engine y sesión
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+
+# SQLSTATE de PostgreSQL para "query_canceled" (lo lanza statement_timeout)
+QUERY_CANCELED = "57014"
+
+def make_engine(url: str, name: str = "primary") -> AsyncEngine:
+    """Engine con la configuración de pool de arriba e instrumentado (también para réplicas)."""
+    new_engine = create_async_engine(
+        url,
+        # SQL_ECHO=1 vuelve a volcar cada sentencia a stdout (solo para depurar: frena
+        # el camino caliente). Para números agregados está /metrics (ver metrics.py).
+        echo=os.getenv("SQL_ECHO", "0") == "1",
+        future=True,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        # Se aplican al abrir cada conexión: no cuestan idas y vueltas por petición
+        connect_args={"server_settings": {
+            "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS),
+            "application_name": f"reserva-locales:{name}",
+        }},
+    )
+    instrument_engine(new_engine, name)
+    sql_budget.instrument_engine(new_engine)
+    return new_engine
+
+
+# Crear engine (primario: todas las escrituras) y sesión
+engine = make_engine(DATABASE_URL)
 async_session = sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+
+async def get_async_session() -> AsyncSession:
+    """Sesión por petición; la comparten todas las dependencias de la misma petición."""
+    async with async_session() as session:
+        yield session
+
+
+async def set_statement_timeout(session: AsyncSession, ms: int) -> None:
+    """Tope por sentencia para esta sesión: SET LOCAL en cada transacción que abra."""
+    sql = f"SET LOCAL statement_timeout = {int(ms)}"
+
+    def _on_begin(_session, _transaction, connection):
+        connection.exec_driver_sql(sql)
+
+    event.listen(session.sync_session, "after_begin", _on_begin)
+    if session.in_transaction():
+        await session.execute(text(sql))
+
+
+def statement_timeout(ms: int, session_dependency=get_async_session):
+    """
+    Dependencia de ruta: `dependencies=[statement_timeout(60_000)]` (una ida y vuelta más).
+    Si la ruta lee de una réplica, pasar su dependencia de sesión (replicas.py).
+    """
+    async def apply(session: AsyncSession = Depends(session_dependency)) -> None:
+        await set_statement_timeout(session, ms)
+    return Depends(apply)
+
+
+def is_statement_timeout(exc: DBAPIError) -> bool:
+    return getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED
+
+
+async def warm_up_pool(connections: int = DB_POOL_WARMUP, target: AsyncEngine | None = None) -> None:
+    """Abre `connections` conexiones a la vez al arrancar, para que las primeras peticiones no paguen el connect."""
+    target = target or engine
+
+    async def _one():
+        async with target.connect() as conn:
+            await conn.exec_driver_sql("SELECT 1")
+
+    n = min(connections, DB_POOL_SIZE)
+    results = await asyncio.gather(*(_one() for _ in range(n)), return_exceptions=True)
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        logger.warning("Calentamiento del pool %s: %s de %s conexiones fallaron (%s)",
+                       target.url.host, len(failed), n, failed[0])
+
+
+async def dispose() -> None:
+    """Cierra todas las conexiones del pool (parada del proceso)."""
+    await engine.dispose()
+
 # Base para los modelos
 Base = declarative_base()
 
@@ -54,7 +172,3 @@ def register_enum_types_sync(dbapi_connection, connection_record):
         decoder=UserRole, 
         format='text'
     )
-
-async def get_async_session() -> AsyncSession:
-    async with async_session() as session:
-        yield session
\ No newline at end of file
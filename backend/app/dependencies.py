@@ -1,33 +1,168 @@
-from fastapi import Depends, HTTPException, status
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 # Asegúrate de que tu async_session esté correctamente importada y sea un SessionMaker
-from .database import async_session 
+from .database import async_session, get_async_session  # noqa: F401  (los routers la importan de aquí)
+from . import replicas
 from .models import User
+from .enums import UserRole
+from .cache import TTLLRUCache
 
 # --- Configuración de Seguridad ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 SECRET_KEY = "super-secret-jwt-key-change-me"
 ALGORITHM = "HS256"
 
+# --- Caché de usuarios autenticados ---
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+REVOCATION_HORIZON = 24 * 3600  # segundos; mayor que la vida de cualquier access token
+# Ticket para abrir el stream SSE (?ticket=): solo sirve para conectar, dura poco
+STREAM_TICKET_TTL = int(os.getenv("STREAM_TICKET_TTL", "60"))
+STREAM_SCOPE = "stream"
+
 # =======================================================
-# 1. FUNCIÓN DE DEPENDENCIA PARA SESIÓN DB (AÑADIDA)
+# 2. CACHÉ DEL USUARIO AUTENTICADO (token -> Principal)
 # =======================================================
-async def get_async_session() -> AsyncSession:
-    """Proporciona una sesión de base de datos asíncrona para las dependencias."""
-    # Nota: Tu async_session debe ser la factoría (SessionMaker)
-    async with async_session() as session:
-        yield session
+@dataclass(frozen=True)
+class Principal:
+    """Instantánea inmutable del usuario autenticado; segura de compartir entre peticiones."""
+    id: UUID
+    email: str
+    full_name: str
+    role: UserRole
+    is_active: bool = True
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role=UserRole(user.role),
+            is_active=bool(user.is_active) if user.is_active is not None else True,
+        )
+
+
+_principal_cache = TTLLRUCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+# email -> instante (epoch) del último cambio de rol/estado. Los tokens emitidos
+# antes de ese instante no pueden confiar en sus claims y pasan por la BD.
+# Es la copia en memoria de users.tokens_valid_after: cada worker la carga de la
+# BD al conectar su LISTEN (events.py) y la mantiene con los avisos que llegan.
+_revoked_before: dict[str, float] = {}
+# Sin esa copia al día (arrancando, o con el LISTEN caído y avisos quizá
+# perdidos) no se confía en ningún claim: todo pasa por la BD.
+_revocations_synced = False
+
+
+def sync_revocations(rows: Iterable[tuple[str, datetime]]) -> None:
+    """Recarga las revocaciones (email, tokens_valid_after en UTC) y vacía la caché."""
+    global _revocations_synced
+    _revoked_before.clear()
+    for email, valid_after in rows:
+        _revoked_before[email] = valid_after.replace(tzinfo=timezone.utc).timestamp()
+    _principal_cache.clear()
+    _revocations_synced = True
+
+
+def revocations_unsynced() -> None:
+    """El LISTEN se cayó: pudieron perderse revocaciones hasta la próxima recarga."""
+    global _revocations_synced
+    _revocations_synced = False
+    _principal_cache.clear()
+
+
+def invalidate_user(email: str) -> None:
+    """
+    Llamar cuando cambie el rol o is_active de un usuario (PATCH /api/admin/users/{id},
+    y en los demás workers por events.publish_user_access_change). Lo persistente
+    es users.tokens_valid_after, que fija quien hace el cambio.
+    """
+    now = time.time()
+    # Las marcas más viejas que cualquier token vigente ya no sirven
+    for stale in [e for e, ts in _revoked_before.items() if now - ts > REVOCATION_HORIZON]:
+        del _revoked_before[stale]
+    _revoked_before[email] = now
+    _principal_cache.discard_where(lambda _token, p: p.email == email)
+
+
+def principal_cache_stats() -> dict:
+    return _principal_cache.stats()
+
+
+def _principal_from_claims(payload: dict) -> Principal | None:
+    """
+    Si el token trae uid, rol y nombre (y no fue invalidado), no hace falta ir a la BD.
+    Solo con las revocaciones sincronizadas (sync_revocations).
+    is_active no viaja en el token: solo se emiten tokens a usuarios activos (login)
+    y desactivar a uno invalida los tokens anteriores, que vuelven a pasar por la BD.
+    """
+    email = payload.get("sub")
+    if not _revocations_synced:
+        return None
+    if email in _revoked_before and payload.get("iat", 0) <= _revoked_before[email]:
+        return None
+    try:
+        return Principal(
+            id=UUID(payload["uid"]),
+            email=email,
+            full_name=payload["name"],
+            role=UserRole(payload["role"]),
+        )
+    except (KeyError, ValueError, TypeError):
+        return None
+
 
 # =======================================================
-# 2. FUNCIÓN DE DEPENDENCIA PARA USUARIO ACTUAL (ORIGINAL)
+# 3. FUNCIÓN DE DEPENDENCIA PARA USUARIO ACTUAL
 # =======================================================
 async def get_current_user(session: AsyncSession = Depends(get_async_session), # ⬅️ Usa la nueva dependencia aquí
-                           token: str = Depends(oauth2_scheme)):
-    
+                           token: str = Depends(oauth2_scheme)) -> Principal:
+    return await resolve_principal(token, session)
+
+
+def create_stream_ticket(principal: Principal) -> str:
+    """
+    Ticket de vida corta para EventSource, que no puede enviar la cabecera
+    Authorization. Solo vale en get_current_user_from_ticket (no como access
+    token) y solo hace falta al conectar: el cliente pide uno nuevo en cada
+    reconexión, así el stream sobrevive a la expiración del token de acceso.
+    """
+    now = int(time.time())
+    claims = {
+        "sub": principal.email, "uid": str(principal.id), "name": principal.full_name,
+        "role": principal.role.value, "scope": STREAM_SCOPE, "iat": now, "exp": now + STREAM_TICKET_TTL,
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+async def get_current_user_from_ticket(
+    ticket: str = Query(..., description="Ticket de POST /api/admin/events/ticket"),
+) -> Principal:
+    """
+    Para el stream SSE. Usa una sesión propia y breve (solo si el usuario fue
+    invalidado): la conexión no queda retenida mientras dure el stream.
+    """
+    async with async_session() as session:
+        return await resolve_principal(ticket, session, scope=STREAM_SCOPE)
+
+
+async def resolve_principal(token: str, session: AsyncSession, scope: str | None = None) -> Principal:
+    """`scope=None`: access token de la cabecera; STREAM_SCOPE: ticket del stream (no se cachea)."""
+    cached = _principal_cache.get(token) if scope is None else None
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Credenciales inválidas",
@@ -37,16 +172,35 @@ async def get_current_user(session: AsyncSession = Depends(get_async_session), #
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    # Usa la sesión inyectada por la dependencia get_async_session
-    user = await session.execute(select(User).where(User.email == email))
-    user = user.scalars().first()
-    
-    if user is None:
-        raise credentials_exception
-    
-    return user
+    principal = _principal_from_claims(payload)
+    if principal is None:
+        # Usa la sesión inyectada por la dependencia get_async_session
+        user = await session.execute(select(User).where(User.email == email))
+        user = user.scalars().first()
+
+        if user is None or user.is_active is False:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+
+    if scope is not None:
+        return principal
+
+    # Nunca cacheamos más allá de la expiración del propio token
+    ttl = min(PRINCIPAL_CACHE_TTL, payload.get("exp", 0) - time.time())
+    _principal_cache.set(token, principal, ttl=ttl)
+    return principal
+
+
+# =======================================================
+# 4. SESIÓN DE LECTURA CON "LEER LO QUE ACABO DE ESCRIBIR"
+# =======================================================
+async def get_user_read_session(current_user: Principal = Depends(get_current_user)) -> AsyncSession:
+    """Como replicas.get_read_session, pero al primario si el usuario escribió hace poco."""
+    async with replicas.read_session() as session:
+        replicas.use_primary_if_pinned(session, replicas.user_key(current_user.id))
+        yield session
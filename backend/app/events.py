@@ -0,0 +1,205 @@
+# backend/app/events.py
+"""
+Eventos en vivo para el panel de administración (Server-Sent Events).
+
+Las escrituras publican con pg_notify DENTRO de su transacción, así que el
+evento solo sale si el commit se completa. Cada worker de Uvicorn mantiene una
+conexión asyncpg dedicada haciendo LISTEN y reparte lo que recibe a sus
+clientes SSE conectados. Así un cambio hecho en cualquier worker llega a todos
+los paneles, y un panel inactivo no genera ninguna consulta. De paso, cada
+worker invalida con ellos su caché de disponibilidad (availability_cache.py).
+
+Tipos de evento:
+    reservation_created   una reserva nueva (pendiente)
+    status_changed        una reserva cambió de estado
+    conflicts_changed     pueden haber cambiado los grupos de conflicto de un
+                          local en [start, end): basta recargar esa ventana
+    resync                se pudieron perder eventos; recargar todo
+
+Por el mismo canal viaja `user_access_changed` (cambió el rol o is_active de
+un usuario): no llega a los paneles, cada worker invalida su caché de
+usuarios autenticados (dependencies.invalidate_user). Como un aviso perdido
+dejaría a un worker confiando en claims viejos, al (re)conectar el LISTEN se
+recargan las revocaciones de users.tokens_valid_after, y mientras está caído
+los tokens pasan por la BD.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Iterable
+from uuid import UUID
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import availability_cache, replicas
+from .database import DATABASE_URL
+from .dependencies import REVOCATION_HORIZON, invalidate_user, revocations_unsynced, sync_revocations
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "reservas_admin"
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("ADMIN_EVENTS_QUEUE_SIZE", "256"))
+# pg_notify admite payloads de hasta 8000 bytes
+_MAX_PAYLOAD = 7500
+
+_subscribers: set[asyncio.Queue] = set()
+_listener_task: asyncio.Task | None = None
+
+
+# ---------- PUBLICAR (desde los routers) ----------
+
+def reservation_event(kind: str, r) -> dict:
+    return {
+        "type": kind,
+        "id": str(r.id),
+        "locale_id": str(r.locale_id),
+        "start": r.start_dt.isoformat(),
+        "end": r.end_dt.isoformat(),
+        "status": getattr(r.status, "value", r.status),
+        "user_id": str(r.user_id) if r.user_id else None,
+    }
+
+
+def _conflict_events(events: list[dict]) -> list[dict]:
+    """Un conflicts_changed por local, cubriendo todas las reservas tocadas."""
+    windows: dict[str, list[str]] = {}
+    for e in events:
+        w = windows.setdefault(e["locale_id"], [e["start"], e["end"]])
+        w[0] = min(w[0], e["start"])
+        w[1] = max(w[1], e["end"])
+    return [
+        {"type": "conflicts_changed", "locale_id": locale_id, "start": start, "end": end}
+        for locale_id, (start, end) in windows.items()
+    ]
+
+
+def _chunks(events: list[dict]) -> list[str]:
+    payloads, current, size = [], [], 2
+    for e in events:
+        encoded = json.dumps(e, separators=(",", ":"))
+        if current and size + len(encoded) + 1 > _MAX_PAYLOAD:
+            payloads.append("[" + ",".join(current) + "]")
+            current, size = [], 2
+        current.append(encoded)
+        size += len(encoded) + 1
+    if current:
+        payloads.append("[" + ",".join(current) + "]")
+    return payloads
+
+
+async def publish_reservation_changes(session: AsyncSession, kind: str, reservations: Iterable) -> None:
+    """Encola los eventos en la transacción en curso (una sola ida y vuelta)."""
+    events = [reservation_event(kind, r) for r in reservations]
+    if not events:
+        return
+    payloads = _chunks(events + _conflict_events(events))
+    await session.execute(
+        text("SELECT pg_notify(:channel, p) FROM unnest(CAST(:payloads AS text[])) AS p"),
+        {"channel": CHANNEL, "payloads": payloads},
+    )
+
+
+async def publish_user_access_change(session: AsyncSession, email: str) -> None:
+    """Avisa a todos los workers (al hacer commit) de que el usuario cambió de rol o estado."""
+    payload = json.dumps([{"type": "user_access_changed", "email": email}], separators=(",", ":"))
+    await session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+# ---------- SUSCRIBIRSE (endpoint SSE) ----------
+
+def subscribe() -> asyncio.Queue:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.add(queue)
+    return queue
+
+
+def unsubscribe(queue: asyncio.Queue) -> None:
+    _subscribers.discard(queue)
+
+
+def _broadcast(event: dict) -> None:
+    for queue in list(_subscribers):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Cliente lento: descartamos lo acumulado y le pedimos que recargue
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"type": "resync"})
+
+
+def _on_notify(_conn, _pid, _channel, payload: str) -> None:
+    try:
+        events = json.loads(payload)
+    except ValueError:
+        logger.warning("Payload de evento inválido: %r", payload[:200])
+        return
+    for event in events:
+        if event.get("type") == "user_access_changed":
+            invalidate_user(event["email"])
+            continue
+        if event.get("type") != "conflicts_changed" and event.get("locale_id"):
+            # La disponibilidad cacheada en este worker (también fija el local al primario)
+            availability_cache.invalidate(
+                UUID(event["locale_id"]),
+                datetime.fromisoformat(event["start"]),
+                datetime.fromisoformat(event["end"]),
+            )
+        if event.get("user_id"):
+            # Leer lo que acabo de escribir también en este worker (replicas.py)
+            replicas.pin(replicas.user_key(event["user_id"]))
+        _broadcast(event)
+
+
+# ---------- LISTENER (uno por worker) ----------
+
+async def _listen_forever() -> None:
+    dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+    backoff = 1
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _c: lost.set())
+            await conn.add_listener(CHANNEL, _on_notify)
+            # Ya escuchando: las revocaciones de la BD cubren lo que se perdió antes
+            sync_revocations(await conn.fetch(
+                "SELECT email, tokens_valid_after FROM users WHERE tokens_valid_after > $1",
+                datetime.utcnow() - timedelta(seconds=REVOCATION_HORIZON),
+            ))
+            backoff = 1
+            # Pudimos perdernos eventos mientras no escuchábamos
+            _broadcast({"type": "resync"})
+            await lost.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("LISTEN %s caído; reintentando en %ss", CHANNEL, backoff)
+        finally:
+            revocations_unsynced()
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def start_listener() -> None:
+    global _listener_task
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(_listen_forever())
+
+
+async def stop_listener() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
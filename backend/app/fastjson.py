@@ -0,0 +1,72 @@
+# backend/app/fastjson.py
+"""
+Listados sin hidratar entidades ORM ni pasar por Pydantic.
+
+Con `response_model`, FastAPI valida cada objeto devuelto contra el esquema, lo
+pasa por jsonable_encoder y después por json.dumps; con cientos de reservas es
+casi todo el tiempo de la petición (ver bench_serialization.py). Aquí:
+
+- `columns(entity, Schema)`: solo las columnas de los campos del esquema, con
+  su nombre, para `select(*columns(...))` en lugar de `select(Entity)`;
+- `rows_response(rows, Schema)`: esas filas directamente a bytes JSON con
+  orjson (UUID, datetime y enums sin conversión previa).
+
+La ruta conserva su response_model para la documentación OpenAPI, pero la
+respuesta no pasa por él. Lo único que el esquema rechazaría con estos tipos
+(UUID, datetime, enums de texto, enteros) es un None en un campo que no lo
+admite (p. ej. motive, que en la BD es nullable): si aparece, las filas se
+validan con el esquema y sale el mismo ValidationError que antes.
+
+Con FAST_JSON=0 las filas pasan siempre por el esquema, como antes.
+check_fastjson.py (y bench_serialization.py) comprueban que ambos caminos
+dan el mismo JSON y rechazan lo mismo.
+"""
+import os
+import types
+from functools import lru_cache
+from typing import Union, get_args, get_origin
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from starlette.responses import Response
+
+FAST_JSON = os.getenv("FAST_JSON", "1") == "1"
+
+
+def columns(entity, schema: type[BaseModel]) -> list:
+    """Columnas de `entity` con los nombres de los campos de `schema`, en su orden."""
+    return [getattr(entity, name).label(name) for name in schema.model_fields]
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema: type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(list[schema])
+
+
+def _accepts_none(annotation) -> bool:
+    return annotation is None or (
+        get_origin(annotation) in (Union, types.UnionType) and type(None) in get_args(annotation)
+    )
+
+
+@lru_cache(maxsize=None)
+def _not_null(schema: type[BaseModel]) -> tuple[str, ...]:
+    """Campos de `schema` que no admiten None."""
+    return tuple(name for name, f in schema.model_fields.items() if not _accepts_none(f.annotation))
+
+
+def _schema_response(rows, schema: type[BaseModel], headers: dict | None) -> Response:
+    adapter = _adapter(schema)
+    body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def rows_response(rows, schema: type[BaseModel], headers: dict | None = None) -> Response:
+    """Filas de `select(*columns(..., schema))` como JSON de una lista de `schema`."""
+    if not FAST_JSON or not rows:
+        return _schema_response(rows, schema, headers)
+    keys = rows[0]._fields
+    required = [keys.index(name) for name in _not_null(schema)]
+    if any(r[i] is None for r in rows for i in required):
+        return _schema_response(rows, schema, headers)   # lanza el ValidationError del esquema
+    return ORJSONResponse([dict(zip(keys, r)) for r in rows], headers=headers)
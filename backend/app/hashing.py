@@ -0,0 +1,88 @@
+# backend/app/hashing.py
+"""
+Hash y verificación de contraseñas fuera del event loop.
+
+bcrypt tarda ~250 ms por llamada (coste 12). Si se llama directamente dentro de
+un `async def`, bloquea el worker de Uvicorn y todas las demás peticiones esperan.
+Aquí el trabajo se envía a un pool de hilos dedicado (bcrypt libera el GIL, así
+que escala con los núcleos) con un tope de concurrencia configurable:
+
+    PASSWORD_HASH_WORKERS   hilos del pool (por defecto: nº de CPUs)
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt as bcrypt_native
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+
+
+# ✅ Wrapper propio: mismo nombre para no tocar el resto del código (versión síncrona)
+class pwd_context:
+    @staticmethod
+    def hash(password: str) -> str:
+        return bcrypt_native.hashpw(
+            password.encode('utf-8')[:72],
+            bcrypt_native.gensalt()
+        ).decode('utf-8')
+
+    @staticmethod
+    def verify(password: str, hashed: str) -> bool:
+        return bcrypt_native.checkpw(
+            password.encode('utf-8')[:72],
+            hashed.encode('utf-8')
+        )
+
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
+_lock = threading.Lock()
+_queued = 0      # tareas enviadas que aún esperan un hilo libre
+_running = 0     # tareas ejecutándose ahora mismo
+_completed = 0
+
+
+def _track(fn, *args):
+    """Envuelve la llamada para llevar la cuenta de cola / ejecución."""
+    global _queued, _running, _completed
+    with _lock:
+        _queued -= 1
+        _running += 1
+    try:
+        return fn(*args)
+    finally:
+        with _lock:
+            _running -= 1
+            _completed += 1
+
+
+async def _submit(fn, *args):
+    global _queued
+    with _lock:
+        _queued += 1
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _track, fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _submit(pwd_context.verify, password, hashed)
+
+
+def pool_stats() -> dict:
+    """Métricas del pool: profundidad de cola, tareas en curso y completadas."""
+    with _lock:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "queue_depth": _queued,
+            "running": _running,
+            "completed": _completed,
+        }
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
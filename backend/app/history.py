@@ -0,0 +1,98 @@
+# backend/app/history.py
+"""
+Historial de reservas y grupos de conflicto como filas para el panel.
+
+Lo comparten GET /api/admin/history y /conflicts (routers/admin.py) y los
+trabajos en segundo plano que exportan lo mismo (job_handlers.py), así ambos
+devuelven exactamente el mismo formato.
+"""
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import desc, select, tuple_
+
+from .enums import ReservationStatus
+from .models import Locale, User
+from .partitions import reservations_source
+
+# Filas por FETCH al recorrer el historial completo con un cursor del servidor
+HISTORY_STREAM_BATCH = 500
+
+
+def parse_iso(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def history_stmt(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    locale_id: UUID | None = None,
+    user_id: UUID | None = None,
+    status: ReservationStatus | None = None,
+    q: str | None = None,
+    after: tuple[datetime, UUID] | None = None,
+):
+    """
+    Historial proyectado a las columnas que se devuelven (sin hidratar entidades ORM).
+    Si `start` llega a meses archivados (o no hay `start`), incluye archive.reservations.
+    """
+    R = reservations_source(start)
+    stmt = (
+        select(
+            R.id,
+            R.start_dt,
+            R.end_dt,
+            R.status,
+            R.motive,
+            R.locale_id,
+            User.full_name.label("user_name"),
+            User.email.label("user_email"),
+            Locale.name.label("locale_name"),
+            Locale.imagen.label("locale_imagen"),
+        )
+        .outerjoin(User, User.id == R.user_id)
+        .outerjoin(Locale, Locale.id == R.locale_id)
+    )
+    if start:
+        stmt = stmt.where(R.start_dt >= start)
+    if end:
+        stmt = stmt.where(R.start_dt <= end)
+    if locale_id:
+        stmt = stmt.where(R.locale_id == locale_id)
+    if user_id:
+        stmt = stmt.where(R.user_id == user_id)
+    if status:
+        stmt = stmt.where(R.status == status)
+    if q:
+        pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        stmt = stmt.where(R.motive.ilike(f"%{pattern}%", escape="\\"))
+    if after:
+        stmt = stmt.where(tuple_(R.start_dt, R.id) < tuple_(*after))
+    return stmt.order_by(desc(R.start_dt), desc(R.id))
+
+
+def history_row(r) -> dict:
+    return {
+        "id": str(r.id),
+        "startDate": r.start_dt.isoformat(),
+        "endDate": r.end_dt.isoformat(),
+        "status": r.status.value,
+        "motive": r.motive,
+        "userName": r.user_name or "Usuario Desconocido",
+        "userEmail": r.user_email or "Sin email",
+        "locale": {
+            "id": str(r.locale_id),
+            "name": r.locale_name or "Local Desconocido",
+            "imagen_url": f"/assets/locales/{r.locale_imagen}" if r.locale_imagen else "/assets/img/no-image.jpg"
+        }
+    }
+
+
+def conflict_group_out(g) -> dict:
+    return {
+        "locale_id": str(g.locale_id),
+        "locale_name": g.locale_name,
+        "startDate": g.start_dt.isoformat(),
+        "endDate": g.end_dt.isoformat(),
+        "reservations": g.reservations,
+    }
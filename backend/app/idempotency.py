@@ -0,0 +1,363 @@
+# backend/app/idempotency.py
+"""
+Cabecera Idempotency-Key en las escrituras.
+
+    IDEMPOTENCY_TTL_SECONDS     cuánto se guarda cada respuesta (86400)
+    IDEMPOTENCY_LOCK_SECONDS    tras cuánto se da por perdida una petición en curso, p. ej. worker caído (60)
+    IDEMPOTENCY_WAIT_SECONDS    cuánto espera un duplicado a que termine la original (10)
+    IDEMPOTENCY_CACHE_SIZE      respuestas recientes en memoria, por worker (10000)
+    IDEMPOTENCY_PURGE_SECONDS   cada cuánto se borran las claves vencidas (600)
+
+Una ruta la admite así:
+
+    idem: Idempotency = Depends(idempotency("create_reservation"))
+    ...
+    return await idem.run(lambda: _create(..., idem), status_code=201, response_model=ReservationOut)
+
+    # dentro de _create, justo antes del commit de la escritura:
+    await idem.save(session, reservation)
+    await session.commit()
+
+Con la cabecera:
+
+- la primera petición se queda la clave (INSERT ... ON CONFLICT en
+  idempotency_keys), hace la escritura y guarda el código y el cuerpo de la
+  respuesta EN LA MISMA TRANSACCIÓN (`save`): si el proceso cae tras el
+  commit, el reintento encuentra la respuesta y no repite la escritura. Los
+  4xx (no han escrito nada) se guardan aparte; un 409 se repite como 409;
+- un reintento recibe esa misma respuesta, con `Idempotent-Replayed: true`,
+  sin ejecutar la ruta ni tocar reservations;
+- duplicados simultáneos: en el mismo worker esperan a la original (un solo
+  INSERT); en otro worker consultan la fila hasta que termine y, pasados
+  IDEMPOTENCY_WAIT_SECONDS, reciben 409;
+- la misma clave con otro cuerpo u otra URL -> 422;
+- si la escritura acaba en 5xx o en una excepción, la clave se libera y el
+  cliente puede reintentar.
+
+La clave vale por ruta y por usuario (en rutas sin autenticación, solo por
+ruta). Sin la cabecera no cambia nada.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import Counter
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+from fastapi import Depends, Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .cache import TTLLRUCache
+from .database import async_session
+from .dependencies import Principal, get_current_user
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_PURGE_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_SECONDS", "600"))
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.1
+PURGE_BATCH_SIZE = 1000
+MISMATCH_DETAIL = "La Idempotency-Key ya se usó con otra solicitud."
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: bytes
+    status_code: int
+    body: Any
+
+
+_recent = TTLLRUCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+# clave -> Future con la StoredResponse de la petición en curso en este worker
+# (None si falló y la clave quedó libre)
+_inflight: dict[bytes, asyncio.Future] = {}
+_counts = Counter()
+
+
+def _digest(*parts: str | bytes) -> bytes:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else part.encode())
+        h.update(b"\0")
+    return h.digest()
+
+
+def _replay(stored: StoredResponse) -> Response:
+    headers = {REPLAYED_HEADER: "true"}
+    if stored.body is None:
+        return Response(status_code=stored.status_code, headers=headers)
+    return JSONResponse(stored.body, status_code=stored.status_code, headers=headers)
+
+
+@dataclass
+class Idempotency:
+    """Lo que recibe la ruta; `key` es None si la petición no trae la cabecera."""
+    key: bytes | None = None
+    fingerprint: bytes = b""
+    owned: bool = False
+    status_code: int = 200
+    response_model: type | None = None
+    saved: StoredResponse | None = None    # lo que `save` dejó en la transacción de la escritura
+
+    def _stored(self, result: Any) -> StoredResponse:
+        if result is None:
+            body = None
+        elif self.response_model is not None:
+            body = self.response_model.model_validate(result).model_dump(mode="json")
+        else:
+            body = jsonable_encoder(result)
+        return StoredResponse(self.fingerprint, self.status_code, body)
+
+    async def save(self, session, result: Any) -> None:
+        """
+        Guarda la respuesta `result` en la sesión de la escritura; llamar justo
+        antes de su commit para que ambas queden (o no) a la vez.
+        """
+        if self.key is None:
+            return
+        stored = self._stored(result)
+        await session.execute(_complete_stmt(self.key, stored))
+        self.saved = stored
+
+    async def run(self, write: Callable[[], Awaitable[Any]], *, status_code: int = 200,
+                  response_model: type | None = None) -> Any:
+        """Ejecuta `write()` una sola vez por clave; los duplicados reciben su respuesta."""
+        self.status_code, self.response_model = status_code, response_model
+        if self.key is None:
+            return await write()
+
+        while True:
+            stored = _recent.get(self.key)
+            pending = _inflight.get(self.key) if stored is None else None
+            if pending is None:
+                break
+            _counts["coalesced"] += 1
+            stored = await asyncio.shield(pending)
+            if stored is not None:
+                break
+            # la original falló y liberó la clave: esta lo intenta de nuevo
+        if stored is not None:
+            return self._replay(stored)
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[self.key] = future
+        stored = None
+        try:
+            stored = await self._claim()
+            if stored is not None:
+                return self._replay(stored)
+            try:
+                result = await write()
+            except HTTPException as exc:
+                if exc.status_code >= 500:
+                    raise
+                stored = StoredResponse(self.fingerprint, exc.status_code, {"detail": jsonable_encoder(exc.detail)})
+                await self._complete(stored)
+                raise
+            if self.saved is not None:
+                stored = self.saved
+                _recent.set(self.key, stored)
+            else:
+                # La ruta no llegó a escribir (p. ej. nada que cambiar): se guarda aparte
+                stored = self._stored(result)
+                await self._complete(stored)
+            _counts["executed"] += 1
+            return result
+        except BaseException:
+            if self.owned and stored is None:
+                await self._release()
+            raise
+        finally:
+            _inflight.pop(self.key, None)
+            future.set_result(stored)
+
+    def _replay(self, stored: StoredResponse) -> Response:
+        if stored.fingerprint != self.fingerprint:
+            _counts["mismatched"] += 1
+            raise HTTPException(status_code=422, detail=MISMATCH_DETAIL)
+        _counts["replayed"] += 1
+        return _replay(stored)
+
+    async def _claim(self) -> StoredResponse | None:
+        """None si esta petición se queda la clave; si no, la respuesta que ya está guardada."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            async with async_session() as session:
+                claimed = await session.scalar(_claim_stmt(self.key, self.fingerprint))
+                row = None
+                if claimed is None:
+                    row = (await session.execute(
+                        select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.body)
+                        .where(IdempotencyKey.key == self.key)
+                    )).one_or_none()
+                await session.commit()
+            if claimed is not None:
+                self.owned = True
+                return None
+            if row is not None and row.status_code is not None:
+                stored = StoredResponse(row.fingerprint, row.status_code, row.body)
+                _recent.set(self.key, stored)
+                return stored
+            if row is not None and row.fingerprint != self.fingerprint:
+                _counts["mismatched"] += 1
+                raise HTTPException(status_code=422, detail=MISMATCH_DETAIL)
+            if loop.time() >= deadline:
+                _counts["conflicts"] += 1
+                raise HTTPException(
+                    status_code=409,
+                    detail="Hay una solicitud con la misma Idempotency-Key en curso; reintente en unos segundos.",
+                )
+            await asyncio.sleep(POLL_SECONDS)
+
+    async def _complete(self, stored: StoredResponse) -> None:
+        async with async_session() as session:
+            await session.execute(_complete_stmt(self.key, stored))
+            await session.commit()
+        _recent.set(self.key, stored)
+
+    async def _release(self) -> None:
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    delete(IdempotencyKey.__table__)
+                    .where(IdempotencyKey.key == self.key, IdempotencyKey.status_code.is_(None))
+                )
+                await session.commit()
+        except Exception:
+            # Si no se pudo borrar, la clave se libera sola en IDEMPOTENCY_LOCK_SECONDS
+            logger.exception("No se pudo liberar una Idempotency-Key")
+
+
+def _complete_stmt(key: bytes, stored: StoredResponse):
+    return (
+        update(IdempotencyKey.__table__)
+        .where(IdempotencyKey.key == key)
+        .values(status_code=stored.status_code, body=stored.body,
+                expires_at=func.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+    )
+
+
+def _claim_stmt(key: bytes, fingerprint: bytes):
+    """Inserta la clave en curso; si existe, solo la retoma si venció o su petición se perdió."""
+    now = func.now()
+    stmt = pg_insert(IdempotencyKey.__table__).values(
+        key=key,
+        fingerprint=fingerprint,
+        locked_until=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={
+            "fingerprint": stmt.excluded.fingerprint,
+            "status_code": None,
+            "body": None,
+            "locked_until": stmt.excluded.locked_until,
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=or_(
+            IdempotencyKey.expires_at < now,
+            and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.locked_until < now),
+        ),
+    ).returning(IdempotencyKey.key)
+
+
+async def _build(request: Request, scope: str, user_id: UUID, raw_key: str | None) -> Idempotency:
+    if raw_key is None:
+        return Idempotency()
+    if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400,
+                            detail=f"Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres.")
+    return Idempotency(
+        key=_digest(scope, str(user_id), raw_key),
+        fingerprint=_digest(request.method, request.url.path, request.url.query, await request.body()),
+    )
+
+
+def idempotency(scope: str):
+    """Dependencia que lee la cabecera Idempotency-Key para la ruta `scope` (claves por usuario)."""
+    async def for_user(request: Request,
+                       idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_HEADER),
+                       current_user: Principal = Depends(get_current_user)) -> Idempotency:
+        return await _build(request, scope, current_user.id, idempotency_key)
+    return for_user
+
+
+# ---------- LIMPIEZA ----------
+
+async def purge_expired() -> int:
+    """Borra las claves vencidas en lotes. Devuelve cuántas."""
+    purged = 0
+    while True:
+        async with async_session() as session:
+            batch = (
+                select(IdempotencyKey.key)
+                .where(IdempotencyKey.expires_at < func.now())
+                .limit(PURGE_BATCH_SIZE)
+            )
+            res = await session.execute(
+                delete(IdempotencyKey.__table__).where(IdempotencyKey.key.in_(batch.scalar_subquery()))
+            )
+            await session.commit()
+        purged += res.rowcount
+        if res.rowcount < PURGE_BATCH_SIZE:
+            return purged
+
+
+async def _purge_forever() -> None:
+    while True:
+        try:
+            _counts["purged"] += await purge_expired()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Limpieza de Idempotency-Key falló; reintento en %ss", IDEMPOTENCY_PURGE_SECONDS)
+        await asyncio.sleep(IDEMPOTENCY_PURGE_SECONDS)
+
+
+_purge_task: asyncio.Task | None = None
+
+
+def start_purger() -> None:
+    global _purge_task
+    if _purge_task is None:
+        _purge_task = asyncio.create_task(_purge_forever())
+
+
+async def stop_purger() -> None:
+    global _purge_task
+    if _purge_task is not None:
+        _purge_task.cancel()
+        try:
+            await _purge_task
+        except asyncio.CancelledError:
+            pass
+        _purge_task = None
+
+
+def idempotency_stats() -> dict:
+    return {
+        "executed": _counts["executed"],
+        "replayed": _counts["replayed"],
+        "coalesced": _counts["coalesced"],
+        "conflicts": _counts["conflicts"],
+        "mismatched": _counts["mismatched"],
+        "purged": _counts["purged"],
+        "in_flight": len(_inflight),
+        "cached": len(_recent),
+    }
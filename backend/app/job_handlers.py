@@ -0,0 +1,144 @@
+# backend/app/job_handlers.py
+"""
+Tipos de trabajo en segundo plano (ver jobs.py).
+
+    export_history        exportación completa del historial (NDJSON gzip en `output`)
+    delete_locale         borrado de un local y sus reservas, en lotes
+    recompute_conflicts   grupos de conflicto de una ventana, sin paginar
+    archive_reservations  meses de reservas anteriores al horizonte al esquema archive
+
+Se encolan con POST /api/admin/jobs {"type": ..., "params": {...}}.
+"""
+import gzip
+import io
+import os
+from uuid import UUID
+
+import orjson
+from sqlalchemy import delete, select
+
+from . import availability_cache, jobs, partitions
+from .catalog import bump_catalog_version
+from .conflicts import find_conflict_groups
+from .database import async_session
+from .enums import ReservationStatus
+from .history import HISTORY_STREAM_BATCH, conflict_group_out, history_row, history_stmt, parse_iso
+from .jobs import JobContext, JobFailed, job_type
+from .models import Locale, Reservation, archived_reservations
+
+DELETE_BATCH_SIZE = int(os.getenv("JOB_DELETE_BATCH_SIZE", "2000"))
+CONFLICT_GROUPS_MAX = int(os.getenv("JOB_CONFLICT_GROUPS_MAX", "5000"))
+
+
+def _uuid(params: dict, key: str, required: bool = False) -> UUID | None:
+    value = params.get(key)
+    if value is None:
+        if required:
+            raise JobFailed(f"Falta el parámetro {key}")
+        return None
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise JobFailed(f"{key} no es un UUID válido")
+
+
+def _datetime(params: dict, key: str):
+    value = params.get(key)
+    if value is None:
+        return None
+    try:
+        return parse_iso(str(value))
+    except ValueError:
+        raise JobFailed(f"{key}: formato de fecha inválido, use ISO 8601")
+
+
+@job_type("export_history", concurrency=1)
+async def export_history(params: dict, ctx: JobContext) -> dict:
+    """Mismos filtros que GET /api/admin/history; el archivo queda en GET /jobs/{id}/output."""
+    try:
+        status = ReservationStatus(params["status"]) if params.get("status") else None
+    except ValueError:
+        raise JobFailed("Estado inválido")
+    stmt = history_stmt(
+        _datetime(params, "start_date"),
+        _datetime(params, "end_date"),
+        _uuid(params, "locale_id"),
+        _uuid(params, "user_id"),
+        status,
+        params.get("q"),
+    )
+
+    buffer = io.BytesIO()
+    compressor = gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=6)
+    rows = 0
+    async with async_session() as session:
+        result = await session.stream(stmt.execution_options(yield_per=HISTORY_STREAM_BATCH))
+        async for partition in result.partitions():
+            compressor.write(b"".join(orjson.dumps(history_row(r)) + b"\n" for r in partition))
+            rows += len(partition)
+    compressor.close()
+
+    data = buffer.getvalue()
+    ctx.set_output(data, "application/gzip")
+    return {"rows": rows, "bytes": len(data), "filename": f"historial-{ctx.id}.ndjson.gz"}
+
+
+@job_type("delete_locale", concurrency=1, max_attempts=5)
+async def delete_locale(params: dict, ctx: JobContext) -> dict:
+    """
+    Desactiva el local (deja de aceptar reservas) y borra sus reservas, vivas y
+    archivadas, en lotes de DELETE_BATCH_SIZE, con un commit por lote para no
+    bloquear la tabla.
+    Si se interrumpe, el reintento sigue donde quedó.
+    """
+    locale_id = _uuid(params, "locale_id", required=True)
+    deleted = 0
+    async with async_session() as session:
+        locale = await session.get(Locale, locale_id)
+        if locale is None:
+            if ctx.attempt > 1:   # un intento anterior ya lo terminó de borrar
+                return {"locale_id": str(locale_id), "reservations_deleted": 0}
+            raise JobFailed("Local no encontrado")
+        locale.active = False
+        await session.commit()
+
+        for table in (Reservation.__table__, archived_reservations):
+            while True:
+                batch = select(table.c.id).where(table.c.locale_id == locale_id).limit(DELETE_BATCH_SIZE)
+                res = await session.execute(delete(table).where(table.c.id.in_(batch.scalar_subquery())))
+                await session.commit()
+                deleted += res.rowcount
+                if res.rowcount < DELETE_BATCH_SIZE:
+                    break
+
+        await session.execute(delete(Locale.__table__).where(Locale.id == locale_id))
+        await session.commit()
+
+    bump_catalog_version()
+    availability_cache.invalidate_locale(locale_id)
+    return {"locale_id": str(locale_id), "reservations_deleted": deleted}
+
+
+@job_type("recompute_conflicts", concurrency=2)
+async def recompute_conflicts(params: dict, ctx: JobContext) -> dict:
+    """Todos los grupos de conflicto de la ventana (hasta CONFLICT_GROUPS_MAX) en el resultado."""
+    async with async_session() as session:
+        total, groups = await find_conflict_groups(
+            session,
+            locale_id=_uuid(params, "locale_id"),
+            window_start=_datetime(params, "start_date"),
+            window_end=_datetime(params, "end_date"),
+            limit=CONFLICT_GROUPS_MAX,
+        )
+    return {"total": total, "truncated": total > len(groups), "groups": [conflict_group_out(g) for g in groups]}
+
+
+@job_type(partitions.ARCHIVE_JOB, concurrency=1, max_attempts=5)
+async def archive_reservations(params: dict, ctx: JobContext) -> dict:
+    """Hasta ARCHIVE_BATCH_PARTITIONS meses por ejecución; si quedan más, encola la siguiente."""
+    result = await partitions.archive_due(int(params.get("limit") or partitions.ARCHIVE_BATCH_PARTITIONS))
+    if result["remaining"]:
+        async with async_session() as session:
+            await jobs.enqueue(session, partitions.ARCHIVE_JOB, params)
+            await session.commit()
+    return result
@@ -0,0 +1,304 @@
+# backend/app/jobs.py
+"""
+Cola de trabajos en segundo plano sobre PostgreSQL (tabla `jobs`).
+
+- `enqueue()` inserta el trabajo en la transacción de quien llama; el router
+  responde 202 con el id y el cliente consulta GET /api/admin/jobs/{id}.
+- Cada proceso de Uvicorn corre un despachador con hasta JOB_WORKERS trabajos
+  a la vez (JOB_WORKERS=0 lo desactiva; `python -m app.jobs` levanta un
+  proceso dedicado solo a trabajos). Reclaman con FOR UPDATE SKIP LOCKED, así
+  que pueden convivir tantos procesos como se quiera.
+- Límite de concurrencia GLOBAL por tipo: el reclamo de cada tipo toma un
+  advisory lock de transacción, cuenta los 'running' y solo reclama hasta el
+  límite. Sin ese lock dos procesos podrían contar a la vez y pasarse.
+- Latidos: cada proceso actualiza heartbeat_at de sus trabajos cada
+  JOB_HEARTBEAT_SECONDS. Un trabajo 'running' sin latido en JOB_STALE_SECONDS
+  (el proceso murió) vuelve a la cola o, sin intentos restantes, falla.
+- Resultado: lo que devuelve el handler se guarda en `result` (JSONB); los
+  resultados voluminosos (exportaciones) van a `output` con `ctx.set_output()`.
+
+Los tipos se registran con `@job_type(...)` en job_handlers.py.
+"""
+import asyncio
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import async_session
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobFailed(Exception):
+    """Error definitivo (parámetros inválidos, recurso inexistente...): no se reintenta."""
+
+
+@dataclass
+class JobContext:
+    id: UUID
+    attempt: int
+    output: bytes | None = None
+    output_type: str | None = None
+
+    def set_output(self, data: bytes, content_type: str) -> None:
+        self.output = data
+        self.output_type = content_type
+
+
+Handler = Callable[[dict, JobContext], Awaitable[dict | None]]
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: Handler
+    concurrency: int = 1       # trabajos de este tipo en curso, sumando todos los procesos
+    max_attempts: int = 3
+
+
+JOB_TYPES: dict[str, JobType] = {}
+
+
+def job_type(name: str, *, concurrency: int = 1, max_attempts: int = 3):
+    """Registra un handler: `async def handler(params, ctx) -> dict | None`."""
+    def register(handler: Handler) -> Handler:
+        JOB_TYPES[name] = JobType(name, handler, concurrency, max_attempts)
+        return handler
+    return register
+
+
+# ---------- ENCOLAR / CONSULTAR (desde los routers) ----------
+
+async def enqueue(session: AsyncSession, type_: str, params: dict | None = None,
+                  created_by: UUID | None = None) -> Job:
+    """Encola un trabajo (el commit lo hace quien llama). ValueError si el tipo no existe."""
+    jt = JOB_TYPES.get(type_)
+    if jt is None:
+        raise ValueError(type_)
+    job = Job(type=type_, params=params or {}, max_attempts=jt.max_attempts, created_by=created_by)
+    session.add(job)
+    await session.flush()
+    await session.refresh(job)
+    return job
+
+
+def job_out(job) -> dict:
+    return {
+        "id": str(job.id),
+        "type": job.type,
+        "status": job.status,
+        "params": job.params,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": job.result,
+        "error": job.error,
+        "has_output": job.output_type is not None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+    }
+
+
+# ---------- RECLAMAR / TERMINAR ----------
+
+_now = func.current_timestamp
+
+
+async def _claim(session: AsyncSession, jt: JobType, limit: int):
+    """Marca como 'running' hasta `limit` trabajos de un tipo, respetando su límite global."""
+    await session.execute(select(func.pg_advisory_xact_lock(func.hashtext("jobs:" + jt.name))))
+    running = await session.scalar(
+        select(func.count()).select_from(Job).where(Job.type == jt.name, Job.status == "running")
+    )
+    free = min(limit, jt.concurrency - running)
+    if free <= 0:
+        await session.commit()
+        return []
+    due = (
+        select(Job.id)
+        .where(Job.type == jt.name, Job.status == "queued", Job.run_after <= _now())
+        .order_by(Job.run_after, Job.created_at)
+        .limit(free)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+    stmt = (
+        update(Job.__table__)
+        .where(Job.id == due.c.id)
+        .values(status="running", attempts=Job.attempts + 1, locked_by=WORKER_ID,
+                started_at=_now(), heartbeat_at=_now(), error=None)
+        .returning(Job.id, Job.params, Job.attempts, Job.max_attempts)
+    )
+    rows = (await session.execute(stmt)).all()
+    await session.commit()
+    return rows
+
+
+async def _finish(job_id: UUID, **values) -> None:
+    """Cierra un trabajo propio; si ya no es nuestro (lo recuperó el reaper) no toca nada."""
+    async with async_session() as session:
+        await session.execute(
+            update(Job.__table__)
+            .where(Job.id == job_id, Job.locked_by == WORKER_ID, Job.status == "running")
+            .values(**values)
+        )
+        await session.commit()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), 3600))
+
+
+async def _execute(jt: JobType, row) -> None:
+    ctx = JobContext(row.id, row.attempts)
+    try:
+        result = await jt.handler(row.params or {}, ctx)
+    except asyncio.CancelledError:
+        # Parada del proceso: el trabajo vuelve a la cola sin gastar el intento
+        await _finish(row.id, status="queued", locked_by=None, heartbeat_at=None,
+                      attempts=Job.attempts - 1, run_after=_now(), error="interrumpido por parada del worker")
+        raise
+    except JobFailed as exc:
+        logger.warning("Trabajo %s (%s) descartado: %s", row.id, jt.name, exc)
+        await _finish(row.id, status="failed", error=str(exc)[:2000], finished_at=_now(), locked_by=None)
+    except Exception as exc:
+        logger.exception("Trabajo %s (%s) falló en el intento %s", row.id, jt.name, row.attempts)
+        error = f"{type(exc).__name__}: {exc}"[:2000]
+        if row.attempts >= row.max_attempts:
+            await _finish(row.id, status="failed", error=error, finished_at=_now(), locked_by=None)
+        else:
+            await _finish(row.id, status="queued", error=error, locked_by=None, heartbeat_at=None,
+                          run_after=_now() + retry_delay(row.attempts))
+    else:
+        values = {"status": "succeeded", "result": result, "finished_at": _now(), "locked_by": None}
+        if ctx.output_type is not None:
+            values.update(output=ctx.output, output_type=ctx.output_type)
+        await _finish(row.id, **values)
+
+
+# ---------- DESPACHADOR ----------
+
+_running: dict[UUID, asyncio.Task] = {}
+_wake = asyncio.Event()
+
+
+async def _reap_stale(session: AsyncSession) -> None:
+    """Trabajos de procesos que dejaron de latir: a la cola si les quedan intentos."""
+    exhausted = Job.attempts >= Job.max_attempts
+    await session.execute(
+        update(Job.__table__)
+        .where(Job.status == "running", Job.heartbeat_at < _now() - timedelta(seconds=JOB_STALE_SECONDS))
+        .values(
+            status=case((exhausted, "failed"), else_="queued"),
+            finished_at=case((exhausted, _now()), else_=None),
+            locked_by=None,
+            error="sin latido: el proceso que lo ejecutaba se detuvo",
+        )
+    )
+    await session.commit()
+
+
+async def _heartbeat_forever() -> None:
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        if not _running:
+            continue
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(Job.__table__)
+                    .where(Job.id.in_(list(_running)), Job.locked_by == WORKER_ID)
+                    .values(heartbeat_at=_now())
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("No se pudo registrar el latido de los trabajos")
+
+
+async def _dispatch_forever() -> None:
+    loop = asyncio.get_running_loop()
+    last_reap = 0.0
+    while True:
+        try:
+            async with async_session() as session:
+                if loop.time() - last_reap >= JOB_HEARTBEAT_SECONDS:
+                    await _reap_stale(session)
+                    last_reap = loop.time()
+                for jt in JOB_TYPES.values():
+                    free = JOB_WORKERS - len(_running)
+                    if free <= 0:
+                        break
+                    for row in await _claim(session, jt, free):
+                        task = asyncio.create_task(_execute(jt, row))
+                        _running[row.id] = task
+                        task.add_done_callback(lambda _t, job_id=row.id: _done(job_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Despachador de trabajos: error reclamando; reintento en %ss", JOB_POLL_SECONDS)
+        try:
+            await asyncio.wait_for(_wake.wait(), JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+
+
+def _done(job_id: UUID) -> None:
+    _running.pop(job_id, None)
+    _wake.set()   # hay un hueco libre: reclamar sin esperar al siguiente sondeo
+
+
+_tasks: list[asyncio.Task] = []
+
+
+def start_worker() -> None:
+    if JOB_WORKERS > 0 and not _tasks:
+        _tasks.extend([asyncio.create_task(_dispatch_forever()), asyncio.create_task(_heartbeat_forever())])
+
+
+async def stop_worker() -> None:
+    """Para el despachador y devuelve a la cola lo que estaba en curso."""
+    pending = _tasks + list(_running.values())
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    _tasks.clear()
+
+
+def jobs_stats() -> dict:
+    return {"worker_id": WORKER_ID, "slots": JOB_WORKERS, "running": len(_running)}
+
+
+async def run_forever() -> None:
+    """Proceso dedicado a trabajos (sin API): `python -m app.jobs`."""
+    start_worker()
+    try:
+        await asyncio.gather(*_tasks)
+    finally:
+        await stop_worker()
+
+
+if __name__ == "__main__":
+    # Importamos por el nombre del paquete: este archivo corre como __main__ y
+    # los handlers se registran en app.jobs, no en esta copia del módulo.
+    from app import job_handlers, jobs  # noqa: F401  (registra los tipos)
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(jobs.run_forever())
@@ -0,0 +1,358 @@
+# backend/app/mailer.py
+"""
+Avisos por correo de las reservas (patrón outbox).
+
+- Las escrituras NO envían nada: `enqueue_reservation_notices()` inserta una
+  fila en email_outbox dentro de la misma transacción que la reserva. Si el
+  commit falla no sale ningún correo, y si el SMTP está caído la reserva se
+  guarda igual. Es un INSERT de pocos bytes, sin consultas previas.
+- Un worker en segundo plano (uno por proceso de Uvicorn, arrancado desde el
+  lifespan de main.py) reclama lotes con FOR UPDATE SKIP LOCKED, así varios
+  procesos pueden drenar la misma tabla sin pisarse. El texto se arma al
+  enviar, con los datos de la reserva, el usuario y el local.
+- Una única conexión SMTP persistente por worker, que se reabre si el servidor
+  la corta y se cierra tras MAIL_SMTP_IDLE_SECONDS sin trabajo.
+- Reintentos con backoff exponencial hasta MAIL_MAX_ATTEMPTS; después la fila
+  queda en 'failed' con el último error.
+- Como mucho MAIL_RATE_PER_MINUTE envíos por minuto (por proceso).
+
+La configuración SMTP usa las variables de fastapi-mail (MAIL_SERVER,
+MAIL_PORT, MAIL_FROM...). Por defecto apunta a MailHog en localhost:1025;
+con MAIL_SUPPRESS_SEND=1 las filas se marcan como enviadas sin conectar.
+Para probar contra un servidor SMTP local, ver backend/check_mailer.py.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Iterable
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import async_session
+from .enums import ReservationStatus
+from .models import EmailOutbox, Locale, Reservation, User
+
+logger = logging.getLogger(__name__)
+
+MAIL_OUTBOX_WORKER = os.getenv("MAIL_OUTBOX_WORKER", "1") == "1"
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", "2"))
+MAIL_RATE_PER_MINUTE = int(os.getenv("MAIL_RATE_PER_MINUTE", "120"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "6"))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", "30"))
+MAIL_RETRY_MAX_SECONDS = float(os.getenv("MAIL_RETRY_MAX_SECONDS", "3600"))
+MAIL_SMTP_IDLE_SECONDS = float(os.getenv("MAIL_SMTP_IDLE_SECONDS", "60"))
+# Mientras una fila está reclamada nadie más la toma; si el worker muere a
+# mitad de lote, vuelve a estar disponible cuando vence este plazo.
+MAIL_CLAIM_LEASE_SECONDS = float(os.getenv("MAIL_CLAIM_LEASE_SECONDS", "300"))
+
+
+# ---------- PLANTILLAS ----------
+
+TEMPLATES = {
+    "received": (
+        "Hemos recibido tu solicitud de reserva",
+        "Hola {name}:\n\nRecibimos tu solicitud para {locale} el {start} (hasta {end}).\n"
+        "Te avisaremos cuando un administrador la revise.\n",
+    ),
+    "approved": (
+        "Tu reserva fue aprobada",
+        "Hola {name}:\n\nTu reserva de {locale} para el {start} (hasta {end}) fue APROBADA.\n",
+    ),
+    "rejected": (
+        "Tu reserva fue rechazada",
+        "Hola {name}:\n\nTu reserva de {locale} para el {start} (hasta {end}) fue rechazada.\n"
+        "Puedes solicitar otro horario desde la aplicación.\n",
+    ),
+}
+
+_STATUS_TEMPLATES = {
+    ReservationStatus.approved: "approved",
+    ReservationStatus.rejected: "rejected",
+}
+
+
+def template_for(kind: str, status) -> str | None:
+    """Plantilla para un evento de reserva; None si no merece aviso (p. ej. cancelaciones)."""
+    if kind == "reservation_created":
+        return "received"
+    if kind == "status_changed":
+        return _STATUS_TEMPLATES.get(status)
+    return None
+
+
+def render(template: str, *, to_email: str, name: str, locale: str,
+           start: datetime, end: datetime, sender: str) -> EmailMessage:
+    subject, body = TEMPLATES[template]
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.set_content(body.format(
+        name=name,
+        locale=locale,
+        start=start.strftime("%d/%m/%Y %H:%M"),
+        end=end.strftime("%H:%M") if end.date() == start.date() else end.strftime("%d/%m/%Y %H:%M"),
+    ))
+    return msg
+
+
+# ---------- ENCOLAR (desde los routers) ----------
+
+async def enqueue_reservation_notices(session: AsyncSession, kind: str, reservations: Iterable) -> None:
+    """Encola los avisos en la transacción en curso (un solo INSERT; el commit lo hace quien llama)."""
+    rows = []
+    for r in reservations:
+        template = template_for(kind, r.status)
+        if template:
+            rows.append({"reservation_id": r.id, "reservation_start": r.start_dt, "template": template})
+    if rows:
+        await session.execute(insert(EmailOutbox), rows)
+
+
+# ---------- CONEXIÓN SMTP ----------
+
+def mail_config() -> ConnectionConfig:
+    return ConnectionConfig(
+        MAIL_USERNAME=os.getenv("MAIL_USERNAME", ""),
+        MAIL_PASSWORD=os.getenv("MAIL_PASSWORD", ""),
+        MAIL_FROM=os.getenv("MAIL_FROM", "reservas@example.com"),
+        MAIL_FROM_NAME=os.getenv("MAIL_FROM_NAME", "Reserva Locales"),
+        MAIL_SERVER=os.getenv("MAIL_SERVER", "localhost"),
+        MAIL_PORT=int(os.getenv("MAIL_PORT", "1025")),
+        MAIL_STARTTLS=os.getenv("MAIL_STARTTLS", "0") == "1",
+        MAIL_SSL_TLS=os.getenv("MAIL_SSL_TLS", "0") == "1",
+        USE_CREDENTIALS=bool(os.getenv("MAIL_USERNAME")),
+        VALIDATE_CERTS=os.getenv("MAIL_VALIDATE_CERTS", "1") == "1",
+        SUPPRESS_SEND=int(os.getenv("MAIL_SUPPRESS_SEND", "0")),
+        TIMEOUT=int(os.getenv("MAIL_TIMEOUT", "30")),
+    )
+
+
+class SMTPConnection:
+    """Conexión SMTP reutilizada entre envíos y lotes; se reabre sola si se cae."""
+
+    def __init__(self, config: ConnectionConfig):
+        self.config = config
+        self.sender = formataddr((config.MAIL_FROM_NAME or "", config.MAIL_FROM))
+        self._smtp: aiosmtplib.SMTP | None = None
+        self.last_used = 0.0
+        self.connects = 0
+
+    async def _connect(self) -> None:
+        c = self.config
+        self._smtp = aiosmtplib.SMTP(
+            hostname=c.MAIL_SERVER,
+            port=c.MAIL_PORT,
+            use_tls=c.MAIL_SSL_TLS,
+            start_tls=c.MAIL_STARTTLS,
+            validate_certs=c.VALIDATE_CERTS,
+            timeout=c.TIMEOUT,
+        )
+        await self._smtp.connect()
+        if c.USE_CREDENTIALS:
+            await self._smtp.login(c.MAIL_USERNAME, c.MAIL_PASSWORD.get_secret_value())
+        self.connects += 1
+
+    async def send(self, message: EmailMessage) -> None:
+        self.last_used = time.monotonic()
+        if self.config.SUPPRESS_SEND:
+            return
+        for attempt in (1, 2):
+            if self._smtp is None or not self._smtp.is_connected:
+                await self._connect()
+            try:
+                await self._smtp.send_message(message)
+                return
+            except aiosmtplib.SMTPServerDisconnected:
+                # El servidor cerró la conexión ociosa: una reconexión y reintento
+                self._smtp = None
+                if attempt == 2:
+                    raise
+
+    async def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_used
+
+
+# ---------- WORKER ----------
+
+class RateLimiter:
+    """Ventana deslizante de 60 s: cuántos envíos quedan y cuánto esperar si no queda ninguno."""
+
+    def __init__(self, per_minute: int, clock=time.monotonic):
+        self.per_minute = per_minute
+        self.clock = clock
+        self._sent: deque[float] = deque()
+
+    def _trim(self) -> None:
+        horizon = self.clock() - 60
+        while self._sent and self._sent[0] <= horizon:
+            self._sent.popleft()
+
+    def available(self) -> int:
+        self._trim()
+        return max(0, self.per_minute - len(self._sent))
+
+    def wait_time(self) -> float:
+        self._trim()
+        if len(self._sent) < self.per_minute:
+            return 0.0
+        return self._sent[0] + 60 - self.clock()
+
+    def record(self) -> None:
+        self._sent.append(self.clock())
+
+
+def retry_delay(attempts: int) -> float:
+    return min(MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAIL_RETRY_MAX_SECONDS)
+
+
+async def _claim(session: AsyncSession, limit: int):
+    """Reclama hasta `limit` avisos vencidos y devuelve lo necesario para armarlos."""
+    due = (
+        select(EmailOutbox.id)
+        .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= func.current_timestamp())
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+    # UPDATE de Core (sobre la tabla): el de ORM no admite RETURNING de las tablas unidas
+    stmt = (
+        update(EmailOutbox.__table__)
+        .where(
+            EmailOutbox.id == due.c.id,
+            Reservation.id == EmailOutbox.reservation_id,
+            Reservation.start_dt == EmailOutbox.reservation_start,   # poda: una sola partición
+            User.id == Reservation.user_id,
+            Locale.id == Reservation.locale_id,
+        )
+        .values(
+            attempts=EmailOutbox.attempts + 1,
+            next_attempt_at=func.current_timestamp() + timedelta(seconds=MAIL_CLAIM_LEASE_SECONDS),
+        )
+        .returning(
+            EmailOutbox.id, EmailOutbox.template, EmailOutbox.attempts,
+            User.email, User.full_name, Locale.name.label("locale_name"),
+            Reservation.start_dt, Reservation.end_dt,
+        )
+    )
+    rows = (await session.execute(stmt)).all()
+    await session.commit()
+    return rows
+
+
+async def _record_outcome(session: AsyncSession, sent: list, failed: list[tuple]) -> None:
+    if sent:
+        await session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(sent))
+            .values(status="sent", sent_at=func.current_timestamp(), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    for outbox_id, attempts, error in failed:
+        values = {"last_error": error[:1000]}
+        if attempts >= MAIL_MAX_ATTEMPTS:
+            values["status"] = "failed"
+        else:
+            values["next_attempt_at"] = func.current_timestamp() + timedelta(seconds=retry_delay(attempts))
+        await session.execute(
+            update(EmailOutbox).where(EmailOutbox.id == outbox_id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+
+
+async def drain_once(conn: SMTPConnection, limiter: RateLimiter) -> int:
+    """Un lote: reclamar, enviar por la conexión abierta y registrar el resultado."""
+    budget = min(MAIL_BATCH_SIZE, limiter.available())
+    if budget == 0:
+        return 0
+    async with async_session() as session:
+        rows = await _claim(session, budget)
+        if not rows:
+            return 0
+        sent, failed = [], []
+        down = None   # error de conexión: el resto del lote se reintenta más tarde
+        for r in rows:
+            if down is not None:
+                failed.append((r.id, r.attempts, down))
+                continue
+            message = render(r.template, to_email=r.email, name=r.full_name, locale=r.locale_name,
+                             start=r.start_dt, end=r.end_dt, sender=conn.sender)
+            try:
+                await conn.send(message)
+            except (aiosmtplib.SMTPException, OSError) as exc:
+                logger.warning("Fallo enviando aviso %s (intento %s): %s", r.id, r.attempts, exc)
+                failed.append((r.id, r.attempts, str(exc)))
+                if isinstance(exc, (aiosmtplib.SMTPConnectError, aiosmtplib.SMTPServerDisconnected, OSError)):
+                    await conn.close()
+                    down = str(exc)
+            else:
+                limiter.record()
+                sent.append(r.id)
+        await _record_outcome(session, sent, failed)
+        return len(rows)
+
+
+async def _run_worker() -> None:
+    conn = SMTPConnection(mail_config())
+    limiter = RateLimiter(MAIL_RATE_PER_MINUTE)
+    backoff = MAIL_POLL_SECONDS
+    try:
+        while True:
+            try:
+                processed = await drain_once(conn, limiter)
+                backoff = MAIL_POLL_SECONDS
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Worker de correo: error drenando la bandeja; reintento en %ss", backoff)
+                processed = 0
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            if processed >= MAIL_BATCH_SIZE:
+                continue          # probablemente quedan más: sin esperar
+            wait = limiter.wait_time()
+            if not processed and not wait and conn.idle_for() > MAIL_SMTP_IDLE_SECONDS:
+                await conn.close()
+            await asyncio.sleep(max(wait, MAIL_POLL_SECONDS if not processed else 0))
+    finally:
+        await conn.close()
+
+
+_worker_task: asyncio.Task | None = None
+
+
+def start_worker() -> None:
+    global _worker_task
+    if MAIL_OUTBOX_WORKER and _worker_task is None:
+        _worker_task = asyncio.create_task(_run_worker())
+
+
+async def stop_worker() -> None:
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
@@ -3,14 +3,44 @@
 from dotenv import load_dotenv
 import os
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError
 from .routers import auth, locales, reservations, admin
+from .dependencies import principal_cache_stats
+from .catalog import catalog_stats
+from .availability_cache import availability_cache_stats
+from . import database, hashing, events, mailer, idempotency, jobs, metrics, partitions, replicas, schedules, sql_budget
+from . import job_handlers  # noqa: F401  (registra los tipos de trabajo)
 
 load_dotenv()
 
+
+# 2.  Ciclo de vida: arranque / parada de recursos compartidos
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.warm_up_pool()   # abre el pool antes de aceptar peticiones
+    await replicas.start()          # pools de réplicas y sus chequeos de salud
+    events.start_listener()   # LISTEN de eventos del panel admin (uno por worker)
+    mailer.start_worker()     # drena la bandeja de salida de correos
+    jobs.start_worker()       # trabajos en segundo plano (JOB_WORKERS=0 lo desactiva)
+    partitions.start_maintenance()  # particiones mensuales de reservas y archivado
+    idempotency.start_purger()      # borra las Idempotency-Key vencidas
+    yield
+    await idempotency.stop_purger()
+    await partitions.stop_maintenance()
+    await jobs.stop_worker()
+    await mailer.stop_worker()
+    await events.stop_listener()
+    hashing.shutdown()
+    await replicas.stop()
+    await database.dispose()  # lo último: los workers anteriores aún usan conexiones
+
+
 # 3.  Crear la app
-app = FastAPI(title="Reserva Locales API", version="1.0.0")
+app = FastAPI(title="Reserva Locales API", version="1.0.0", lifespan=lifespan)
 
 # 4.  CORS
 app.add_middleware(
@@ -19,15 +49,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "Idempotent-Replayed"],
 )
 
-# 5.  Routers
+# 5.  Conteo de SQL por petición: cabecera Server-Timing y presupuestos (sql_budget.py)
+app.add_middleware(sql_budget.SQLBudgetMiddleware)
+
+# 6.  Métricas Prometheus (GET /metrics); va por fuera del anterior
+app.add_middleware(metrics.PrometheusMiddleware)
+app.add_route("/metrics", metrics.metrics_endpoint, include_in_schema=False)
+metrics.register_cache("principal", principal_cache_stats)
+metrics.register_cache("catalog", catalog_stats)
+metrics.register_cache("availability", availability_cache_stats)
+metrics.register_cache("locale_schedule", schedules.schedule_cache_stats)
+metrics.register_stats("password_hash", hashing.pool_stats)
+metrics.register_stats("jobs", jobs.jobs_stats)
+metrics.register_stats("db_replicas", replicas.replica_stats)
+metrics.register_stats("reservation_partitions", partitions.partition_stats)
+metrics.register_stats("idempotency", idempotency.idempotency_stats)
+
+# 7.  Consultas canceladas por statement_timeout -> 503 (no un 500 genérico)
+@app.exception_handler(DBAPIError)
+async def database_error_handler(request: Request, exc: DBAPIError):
+    if database.is_statement_timeout(exc):
+        return JSONResponse(status_code=503,
+                            content={"detail": "La consulta tardó demasiado; pruebe con un rango menor."})
+    raise exc
+
+# 8.  Routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(locales.router, prefix="/api/locales", tags=["locales"])
 app.include_router(reservations.router, prefix="/api/reservations", tags=["reservations"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
-# 6.  Health check
+# 9.  Health check
 @app.get("/")
 def read_root():
     return {"msg": "API de Reserva de Locales"}
\ No newline at end of file
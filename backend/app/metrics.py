@@ -0,0 +1,245 @@
+# backend/app/metrics.py
+"""
+Métricas Prometheus, expuestas en GET /metrics.
+
+- Peticiones: histograma de latencia por (método, ruta, status) y peticiones
+  en curso por ruta. La ruta es la plantilla ("/api/reservations/{reservation_id}"),
+  nunca la URL real, para no disparar la cardinalidad.
+- SQL: sentencias y duración por ruta, medidas con los eventos
+  before/after_cursor_execute del engine. Lo que ejecutan los workers (correo,
+  trabajos) cuenta bajo la ruta "background".
+- Pool, con la etiqueta `pool` (primary, replica1...): conexiones en uso,
+  libres y en overflow, saturación (en uso sobre tamaño + overflow), el tiempo
+  de espera para obtener una y las esperas que agotaron DB_POOL_TIMEOUT
+  (InstrumentedQueuePool).
+- Cachés y pools propios: lo que devuelven sus funciones *_stats(), registradas
+  desde main.py con `register_cache()` / `register_stats()`.
+
+Cada proceso de Uvicorn expone sus propios números; con varios workers hay que
+raspar cada uno o configurar el modo multiproceso de prometheus_client.
+
+/metrics no es público: con METRICS_TOKEN exige `Authorization: Bearer <token>`
+(bearer_token en la configuración del scrape de Prometheus); sin él solo
+responde a clientes locales (127.0.0.1 / ::1).
+"""
+import hmac
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+_LOCAL_CLIENTS = {"127.0.0.1", "::1", "localhost"}
+
+BACKGROUND = "background"
+UNMATCHED = "unmatched"
+
+# Ruta de la petición en curso; la leen los eventos de SQLAlchemy
+current_route: ContextVar[str] = ContextVar("current_route", default=BACKGROUND)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Peticiones HTTP en curso", ["method", "route"],
+)
+SQL_STATEMENTS = Counter(
+    "db_statements_total", "Sentencias SQL ejecutadas", ["route"],
+)
+SQL_DURATION = Histogram(
+    "db_statement_duration_seconds", "Duración de cada sentencia SQL", ["route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts", "Peticiones que no consiguieron conexión en DB_POOL_TIMEOUT",
+)
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+
+# ---------- PETICIONES ----------
+
+def route_label(scope) -> str:
+    app = scope.get("app")
+    if app is None:
+        return UNMATCHED
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match != Match.NONE:   # PARTIAL = ruta correcta con método no permitido
+            return getattr(route, "path", UNMATCHED)
+    return UNMATCHED
+
+
+class PrometheusMiddleware:
+    """Middleware ASGI puro (no envuelve el cuerpo: sirve también para SSE y streaming)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_label(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        token = current_route.set(route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            current_route.reset(token)
+            in_progress.dec()
+
+
+def _metrics_allowed(request: Request) -> bool:
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+    return request.client is not None and request.client.host in _LOCAL_CLIENTS
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if not _metrics_allowed(request):
+        return Response("No autorizado", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+# ---------- SQL Y POOL ----------
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """El pool por defecto de asyncpg, midiendo cuánto se espera por una conexión."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+
+class _PoolCollector:
+    """Un gauge por métrica con la etiqueta `pool` (primary, replica1...)."""
+
+    def __init__(self):
+        self.engines: dict[str, AsyncEngine] = {}
+
+    def collect(self):
+        metrics = [
+            ("db_pool_saturation", "Fracción de la capacidad (tamaño + overflow) en uso",
+             lambda p, cap: p.checkedout() / cap if cap else 0.0),
+            ("db_pool_size", "Tamaño configurado del pool", lambda p, cap: p.size()),
+            ("db_pool_max_overflow", "Conexiones extra permitidas sobre el tamaño", lambda p, cap: p._max_overflow),
+            ("db_pool_checked_out", "Conexiones prestadas ahora mismo", lambda p, cap: p.checkedout()),
+            ("db_pool_checked_in", "Conexiones libres en el pool", lambda p, cap: p.checkedin()),
+            ("db_pool_overflow", "Conexiones abiertas por encima del tamaño", lambda p, cap: max(p.overflow(), 0)),
+        ]
+        families = [(GaugeMetricFamily(name, doc, labels=["pool"]), fn) for name, doc, fn in metrics]
+        for label, engine in self.engines.items():
+            pool = engine.pool
+            if not isinstance(pool, AsyncAdaptedQueuePool):
+                continue
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            for family, fn in families:
+                family.add_metric([label], fn(pool, capacity))
+        for family, _ in families:
+            yield family
+
+
+_pools = _PoolCollector()
+REGISTRY.register(_pools)
+
+
+def instrument_engine(engine: AsyncEngine, pool: str = "primary") -> None:
+    _pools.engines[pool] = engine
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        route = current_route.get()
+        SQL_STATEMENTS.labels(route).inc()
+        SQL_DURATION.labels(route).observe(elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # Una sentencia que falla no llega a after_cursor_execute: sacamos su
+        # inicio de la pila para que no se acumule en la conexión del pool.
+        conn = context.connection
+        if conn is None or not conn.info.get("query_start"):
+            return
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        route = current_route.get()
+        SQL_STATEMENTS.labels(route).inc()
+        SQL_DURATION.labels(route).observe(elapsed)
+
+
+# ---------- CACHÉS Y POOLS PROPIOS ----------
+
+_caches: dict[str, Callable[[], dict]] = {}
+_stats: dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    """`stats()` devuelve hits, misses, hit_ratio y (opcional) size, como TTLLRUCache.stats()."""
+    _caches[name] = stats
+
+
+def register_stats(prefix: str, stats: Callable[[], dict]) -> None:
+    """Cada valor numérico de `stats()` sale como gauge `<prefix>_<clave>`."""
+    _stats[prefix] = stats
+
+
+class _StatsCollector:
+    def collect(self):
+        hits = CounterMetricFamily("app_cache_hits", "Aciertos de caché", labels=["cache"])
+        misses = CounterMetricFamily("app_cache_misses", "Fallos de caché", labels=["cache"])
+        ratio = GaugeMetricFamily("app_cache_hit_ratio", "Proporción de aciertos de caché", labels=["cache"])
+        entries = GaugeMetricFamily("app_cache_entries", "Entradas en caché", labels=["cache"])
+        for name, fn in _caches.items():
+            s = fn()
+            hits.add_metric([name], s.get("hits", 0))
+            misses.add_metric([name], s.get("misses", 0))
+            ratio.add_metric([name], s.get("hit_ratio", 0.0))
+            if "size" in s:
+                entries.add_metric([name], s["size"])
+        yield from (hits, misses, ratio, entries)
+
+        for prefix, fn in _stats.items():
+            for key, value in fn().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield GaugeMetricFamily(f"{prefix}_{key}", f"{prefix}: {key}", value=value)
+
+
+REGISTRY.register(_StatsCollector())
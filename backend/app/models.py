@@ -1,9 +1,10 @@
 #backend/app/models.py
 from sqlalchemy import (
-    Column, String, Integer, Boolean, DateTime, Text, ForeignKey, sql
+    Column, String, Integer, Boolean, DateTime, Text, ForeignKey, ForeignKeyConstraint, Computed,
+    CheckConstraint, Index, MetaData, Table, sql
 )
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import UUID, TSRANGE, JSONB, BYTEA
+from sqlalchemy.orm import declarative_base, relationship, deferred
 from sqlalchemy import Enum as SAEnum  # ← importamos el de SQLA
 from .enums import UserRole, ReservationStatus
 
@@ -31,6 +32,8 @@ class User(Base):
         nullable=False
     )
     is_active = Column(Boolean, default=True)
+    # Tokens emitidos hasta aquí (UTC) no confían en sus claims (dependencies.py)
+    tokens_valid_after = Column(DateTime)
 
     # ⬇️⬇️  Relación inversa  ⬇️⬇️
     reservations = relationship("Reservation", back_populates="user")
@@ -41,9 +44,15 @@ class Locale(Base):
     name = Column(String, nullable=False)
     description = Column(Text)
     capacity = Column(Integer)
+    # True: varias reservas a la vez mientras la suma de asistentes quepa en
+    # `capacity` (ver capacity.py). False: una reserva aprobada ocupa el local.
+    shared_capacity = Column(Boolean, nullable=False, server_default=sql.false())
     location = Column(String)
     open_time = Column(String)
     close_time = Column(String)
+    # Horario semanal, excepciones y cierres (schemas.LocaleSchedule, ver
+    # schedules.py). NULL: open_time a close_time todos los días.
+    schedule = Column(JSONB)
     active = Column(Boolean, default=True)
     imagen = Column(String, nullable=True)
 
@@ -51,6 +60,10 @@ class Locale(Base):
     reservations = relationship("Reservation", back_populates="locale")
 
 class Reservation(Base):
+    """
+    Tabla particionada por mes sobre start_dt (ver partitions.py y la migración
+    0006). En la BD la clave primaria es (id, start_dt); aquí basta con id.
+    """
     __tablename__ = "reservations"
 
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=sql.text("uuid_generate_v4()"))
@@ -65,7 +78,132 @@ class Reservation(Base):
         server_default=sql.text("'pending'::reservation_status")
     )
     priority = Column(Integer, server_default=sql.text("9"))
+    # Asistentes, solo en locales de capacidad compartida; NULL = ocupa el local entero
+    headcount = Column(Integer)
+    series_id = Column(UUID(as_uuid=True), ForeignKey("reservation_series.id", ondelete="SET NULL"))
+    created_at = Column(DateTime, server_default=sql.func.current_timestamp())
+    # Rango [start_dt, end_dt) calculado por PostgreSQL; lo usan el índice GiST
+    # y la restricción de exclusión para detectar solapamientos en O(log n).
+    during = Column(TSRANGE, Computed("tsrange(start_dt, end_dt, '[)')", persisted=True))
+
+    __table_args__ = (
+        CheckConstraint("start_dt < end_dt", name="reservations_valid_range"),
+        CheckConstraint("headcount IS NULL OR headcount > 0", name="reservations_headcount_positive"),
+        Index("ix_reservations_locale_during", "locale_id", "during", postgresql_using="gist"),
+        # Índices de las consultas calientes (migración 0002)
+        Index("ix_reservations_locale_start", "locale_id", "start_dt",
+              postgresql_include=["end_dt", "status", "user_id"]),
+        Index("ix_reservations_user_start", "user_id", "start_dt"),
+        Index("ix_reservations_pending_start", "start_dt",
+              postgresql_where=sql.text("status = 'pending'")),
+        Index("ix_reservations_pending_locale_start", "locale_id", "start_dt", "id",
+              postgresql_where=sql.text("status = 'pending'")),
+        Index("ix_reservations_start_brin", "start_dt", postgresql_using="brin"),
+        # Paginación por cursor del historial (migración 0003)
+        Index("ix_reservations_start_id", "start_dt", "id"),
+        # Cancelar o editar una serie entera (migración 0009)
+        Index("ix_reservations_series", "series_id", "start_dt",
+              postgresql_where=sql.text("series_id IS NOT NULL")),
+        # La exclusión de reservas APROBADAS solapadas (sin headcount) va en cada
+        # partición (reservations_ensure_partition): PostgreSQL 15 no la admite en la tabla padre.
+    )
 
     # ⬇️⬇️  Relaciones  ⬇️⬇️
-    locale = relationship("Locale", back_populates="reservations", lazy="joined")
-    user = relationship("User", back_populates="reservations", lazy="joined")
\ No newline at end of file
+    # Sin carga implícita: quien necesite el local o el usuario lo pide con
+    # joinedload()/selectinload(). Acceder sin cargarlo lanza un error en vez de
+    # disparar una consulta por fila (N+1) o un JOIN que nadie usa.
+    locale = relationship("Locale", back_populates="reservations", lazy="raise_on_sql")
+    user = relationship("User", back_populates="reservations", lazy="raise_on_sql")
+
+
+# Reservas archivadas (partitions.py): mismas columnas, en el esquema `archive`.
+# Solo se lee, unida a `reservations` cuando la ventana pedida llega hasta ahí.
+archived_reservations = Table(
+    "reservations", MetaData(schema="archive"),
+    *(Column(c.name, c.type) for c in Reservation.__table__.columns),
+)
+
+
+class ReservationSeries(Base):
+    """Serie de reservas recurrentes (ver series.py); sus reservas apuntan aquí con series_id."""
+    __tablename__ = "reservation_series"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=sql.text("uuid_generate_v4()"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    locale_id = Column(UUID(as_uuid=True), ForeignKey("locales.id", ondelete="CASCADE"), nullable=False)
+    rule = Column(JSONB, nullable=False)   # el patrón tal como se pidió
+    created_at = Column(DateTime, server_default=sql.func.current_timestamp())
+
+
+class EmailOutbox(Base):
+    """Correos pendientes de enviar; se escriben en la misma transacción que la reserva (ver mailer.py)."""
+    __tablename__ = "email_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=sql.text("uuid_generate_v4()"))
+    reservation_id = Column(UUID(as_uuid=True), nullable=False)
+    reservation_start = Column(DateTime, nullable=False)   # parte de la clave de la reserva (particionada)
+    template = Column(String, nullable=False)          # received | approved | rejected
+    status = Column(String, nullable=False, server_default=sql.text("'pending'"))  # pending | sent | failed
+    attempts = Column(Integer, nullable=False, server_default=sql.text("0"))
+    next_attempt_at = Column(DateTime, nullable=False, server_default=sql.func.current_timestamp())
+    last_error = Column(Text)
+    created_at = Column(DateTime, server_default=sql.func.current_timestamp())
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        # Lo que recorre el worker: solo las pendientes, por orden de vencimiento
+        Index("ix_email_outbox_due", "next_attempt_at",
+              postgresql_where=sql.text("status = 'pending'")),
+        Index("ix_email_outbox_reservation", "reservation_start", "reservation_id"),
+        ForeignKeyConstraint(
+            ["reservation_id", "reservation_start"], ["reservations.id", "reservations.start_dt"],
+            ondelete="CASCADE", onupdate="CASCADE",   # editar el horario de una serie mueve start_dt
+        ),
+    )
+
+
+class Job(Base):
+    """Trabajo en segundo plano (ver jobs.py)."""
+    __tablename__ = "jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=sql.text("uuid_generate_v4()"))
+    type = Column(String, nullable=False)
+    params = Column(JSONB, nullable=False, server_default=sql.text("'{}'::jsonb"))
+    status = Column(String, nullable=False, server_default=sql.text("'queued'"))  # queued | running | succeeded | failed
+    attempts = Column(Integer, nullable=False, server_default=sql.text("0"))
+    max_attempts = Column(Integer, nullable=False, server_default=sql.text("3"))
+    run_after = Column(DateTime, nullable=False, server_default=sql.func.current_timestamp())
+    locked_by = Column(String)
+    heartbeat_at = Column(DateTime)
+    result = Column(JSONB)
+    output = deferred(Column(BYTEA))     # resultado voluminoso (p. ej. exportación gzip); solo se carga al descargarlo
+    output_type = Column(String)
+    error = Column(Text)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
+    created_at = Column(DateTime, server_default=sql.func.current_timestamp())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        # Reclamar: siguientes en cola de cada tipo
+        Index("ix_jobs_queued", "type", "run_after", postgresql_where=sql.text("status = 'queued'")),
+        # Contar en curso por tipo y buscar latidos vencidos
+        Index("ix_jobs_running", "type", "heartbeat_at", postgresql_where=sql.text("status = 'running'")),
+        Index("ix_jobs_created", "created_at"),
+    )
+
+
+class IdempotencyKey(Base):
+    """Respuesta guardada de una escritura con cabecera Idempotency-Key (ver idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(BYTEA, primary_key=True)             # sha256(ruta, usuario, clave del cliente)
+    fingerprint = Column(BYTEA, nullable=False)       # sha256(método, URL, cuerpo)
+    status_code = Column(Integer)                     # NULL = en curso
+    body = Column(JSONB)
+    locked_until = Column(DateTime, nullable=False)   # pasado este instante, otra petición puede retomarla
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires", "expires_at"),
+    )
@@ -0,0 +1,288 @@
+# backend/app/partitions.py
+"""
+Particiones mensuales de `reservations` y archivo de los meses viejos.
+
+    RESERVATIONS_MONTHS_AHEAD           meses futuros que se mantienen creados (12)
+    RESERVATIONS_ARCHIVE_AFTER_MONTHS   meses completos que quedan en la tabla viva (24)
+    ARCHIVE_BATCH_PARTITIONS            meses que mueve cada ejecución del trabajo (6)
+    PARTITION_MAINTENANCE_SECONDS       cada cuánto se crean meses y se busca qué archivar (3600)
+    PARTITION_REFRESH_SECONDS           cada cuánto se relee qué meses hay archivados (60)
+
+- Crear: la función SQL reservations_ensure_partition(mes) (migración 0006)
+  crea reservations_AAAA_MM con su restricción de exclusión. Cada worker deja
+  creados el mes anterior, el actual y los RESERVATIONS_MONTHS_AHEAD
+  siguientes. Una reserva para un mes más lejano crea su partición con
+  `ensure_partitions()` en una transacción propia y corta, ANTES de que la
+  petición lea reservations. La tabla se crea suelta y se engancha con ATTACH
+  PARTITION (migración 0011), que convive con lecturas y escrituras; PARTITION
+  OF pedía ACCESS EXCLUSIVE y se interbloqueaba con la propia petición.
+- Archivar: el trabajo archive_reservations toma cada mes anterior al
+  horizonte y:
+    1. borra sus avisos de correo (la FK de email_outbox impide el DETACH);
+    2. lo desengancha con DETACH ... CONCURRENTLY, sin bloquear lecturas ni
+       escrituras;
+    3. lo pasa al esquema archive y lo engancha en archive.reservations.
+  Las filas no se copian. Si se interrumpe, la siguiente ejecución retoma cada
+  mes desde el paso en que quedó. El mantenimiento lo encola cuando hay meses
+  vencidos.
+- Leer: `reservations_source(desde)` devuelve Reservation o, si la ventana
+  llega a meses archivados, la misma entidad sobre
+  `reservations UNION ALL archive.reservations`. Las consultas de historial la
+  usan en lugar de Reservation.
+
+Limitación: la exclusión de aprobadas solapadas es por partición. Dos reservas
+de meses distintos que se solapan en el cambio de mes (una que empieza el
+último día y cruza la medianoche) solo las separa la comprobación de la
+aplicación (find_approved_overlap).
+"""
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from sqlalchemy import delete, func, select, text, union_all
+from sqlalchemy.orm import aliased
+
+from . import jobs
+from .database import async_session, engine
+from .models import EmailOutbox, Job, Reservation, archived_reservations
+
+logger = logging.getLogger(__name__)
+
+RESERVATIONS_MONTHS_AHEAD = int(os.getenv("RESERVATIONS_MONTHS_AHEAD", "12"))
+RESERVATIONS_ARCHIVE_AFTER_MONTHS = int(os.getenv("RESERVATIONS_ARCHIVE_AFTER_MONTHS", "24"))
+ARCHIVE_BATCH_PARTITIONS = int(os.getenv("ARCHIVE_BATCH_PARTITIONS", "6"))
+PARTITION_MAINTENANCE_SECONDS = float(os.getenv("PARTITION_MAINTENANCE_SECONDS", "3600"))
+PARTITION_REFRESH_SECONDS = float(os.getenv("PARTITION_REFRESH_SECONDS", "60"))
+
+ARCHIVE_JOB = "archive_reservations"
+
+_NAME = re.compile(r"^reservations_(\d{4})_(\d{2})$")
+_ENSURE_SQL = text("SELECT reservations_ensure_partition(:month)")
+_TABLES_SQL = text(r"""
+    SELECT n.nspname AS schema, c.relname AS name, c.relispartition AS attached,
+           COALESCE(i.inhdetachpending, false) AS detach_pending
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+    WHERE c.relkind = 'r'
+      AND n.nspname IN ('public', 'archive')
+      AND c.relname ~ '^reservations_[0-9]{4}_[0-9]{2}$'
+""")
+
+
+def month_start(d: date | datetime) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    years, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + years, month + 1, 1)
+
+
+def archive_cutoff(today: date | None = None) -> date:
+    """Los meses que terminan en o antes de esta fecha van al archivo."""
+    return add_months(month_start(today or date.today()), -RESERVATIONS_ARCHIVE_AFTER_MONTHS)
+
+
+@dataclass(frozen=True)
+class MonthTable:
+    """Una tabla reservations_AAAA_MM, viva, archivada o a medio mover."""
+    schema: str
+    name: str
+    attached: bool
+    detach_pending: bool
+
+    @property
+    def month(self) -> date:
+        year, month = _NAME.match(self.name).groups()
+        return date(int(year), int(month), 1)
+
+    @property
+    def end(self) -> date:
+        return add_months(self.month, 1)
+
+    @property
+    def live(self) -> bool:
+        return self.schema == "public" and self.attached and not self.detach_pending
+
+    @property
+    def archived(self) -> bool:
+        return self.schema == "archive" and self.attached
+
+
+async def month_tables(conn) -> list[MonthTable]:
+    rows = (await conn.execute(_TABLES_SQL)).all()
+    return sorted((MonthTable(**row._mapping) for row in rows), key=lambda t: (t.month, t.schema))
+
+
+# ---------- ESTADO POR PROCESO ----------
+
+_live_months: set[date] = set()
+_archived_until: date | None = None   # fin (exclusivo) del mes archivado más reciente
+_archived_months = 0
+
+
+async def refresh() -> None:
+    global _archived_until, _archived_months
+    async with engine.connect() as conn:
+        tables = await month_tables(conn)
+    _live_months.clear()
+    _live_months.update(t.month for t in tables if t.live)
+    archived = [t.end for t in tables if t.archived]
+    _archived_until = max(archived) if archived else None
+    _archived_months = len(archived)
+
+
+def reaches_archive(start: datetime | None) -> bool:
+    return _archived_until is not None and (start is None or start.date() < _archived_until)
+
+
+def reservations_source(start: datetime | None = None):
+    """
+    Entidad para consultar reservas desde `start` (None = sin límite): Reservation
+    tal cual o, si la ventana llega al archivo, Reservation sobre el UNION ALL.
+    PostgreSQL empuja los filtros a cada rama y poda las particiones que no tocan.
+    """
+    if not reaches_archive(start):
+        return Reservation
+    both = union_all(
+        select(*Reservation.__table__.c),
+        select(*archived_reservations.c),
+    ).subquery("reservations_all")
+    return aliased(Reservation, both, adapt_on_names=True)
+
+
+# ---------- CREAR ----------
+
+async def ensure_partitions(*moments: date | datetime) -> None:
+    """Crea (si faltan) las particiones de esos meses. Sin ida a la BD si ya se conocen."""
+    missing = {month_start(m) for m in moments} - _live_months
+    if not missing:
+        return
+    async with engine.begin() as conn:
+        for month in sorted(missing):
+            await conn.execute(_ENSURE_SQL, {"month": month})
+    _live_months.update(missing)
+
+
+async def maintain() -> int:
+    """Crea los meses siguientes y encola el archivado si hay meses vencidos. Devuelve cuántos."""
+    this_month = month_start(date.today())
+    await ensure_partitions(*(add_months(this_month, i) for i in range(-1, RESERVATIONS_MONTHS_AHEAD + 1)))
+    async with engine.connect() as conn:
+        tables = await month_tables(conn)
+    cutoff = archive_cutoff()
+    due = [t for t in tables if not t.archived and (not t.live or t.end <= cutoff)]
+    if due:
+        await enqueue_archive()
+    return len(due)
+
+
+async def enqueue_archive() -> None:
+    """Encola archive_reservations salvo que ya haya uno en cola o en curso (entre todos los workers)."""
+    async with async_session() as session:
+        await session.execute(select(func.pg_advisory_xact_lock(func.hashtext("enqueue:" + ARCHIVE_JOB))))
+        busy = await session.scalar(
+            select(func.count()).select_from(Job)
+            .where(Job.type == ARCHIVE_JOB, Job.status.in_(("queued", "running")))
+        )
+        if not busy:
+            await jobs.enqueue(session, ARCHIVE_JOB, {})
+        await session.commit()
+
+
+# ---------- ARCHIVAR ----------
+
+async def archive_month(table: MonthTable) -> None:
+    """Lleva un mes al archivo desde el paso en que esté; se puede repetir sin riesgo."""
+    lo, hi = table.month, table.end
+    if table.schema == "public" and table.attached:
+        async with engine.begin() as conn:
+            await conn.execute(
+                delete(EmailOutbox.__table__)
+                .where(EmailOutbox.reservation_start >= lo, EmailOutbox.reservation_start < hi)
+            )
+        async with engine.connect() as conn:
+            # CONCURRENTLY no puede ir dentro de una transacción
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("SET statement_timeout = 0")   # espera a las transacciones en curso
+            try:
+                mode = "FINALIZE" if table.detach_pending else "CONCURRENTLY"
+                await conn.exec_driver_sql(
+                    f'ALTER TABLE public.reservations DETACH PARTITION public."{table.name}" {mode}'
+                )
+            finally:
+                await conn.exec_driver_sql("RESET statement_timeout")
+
+    async with engine.begin() as conn:
+        # DETACH CONCURRENTLY deja un CHECK equivalente a los límites: el ATTACH no recorre la tabla
+        await conn.exec_driver_sql("SET LOCAL statement_timeout = 0")
+        if table.schema == "public":
+            await conn.exec_driver_sql(f'ALTER TABLE public."{table.name}" SET SCHEMA archive')
+        await conn.exec_driver_sql(
+            f'ALTER TABLE archive.reservations ATTACH PARTITION archive."{table.name}" '
+            f"FOR VALUES FROM ('{lo}') TO ('{hi}')"
+        )
+
+
+async def archive_due(limit: int = ARCHIVE_BATCH_PARTITIONS) -> dict:
+    """Archiva hasta `limit` meses vencidos (o a medio mover), del más viejo al más nuevo."""
+    async with engine.connect() as conn:
+        tables = await month_tables(conn)
+    cutoff = archive_cutoff()
+    due = [t for t in tables if not t.archived and (not t.live or t.end <= cutoff)]
+    done = []
+    for table in due[:limit]:
+        await archive_month(table)
+        logger.info("Reservas de %s archivadas", table.month.strftime("%Y-%m"))
+        done.append(table.month.strftime("%Y-%m"))
+    await refresh()
+    return {"archived": done, "remaining": len(due) - len(done), "cutoff": cutoff.isoformat()}
+
+
+# ---------- MANTENIMIENTO (uno por worker) ----------
+
+async def _maintain_forever() -> None:
+    loop = asyncio.get_running_loop()
+    last_maintenance = None
+    while True:
+        try:
+            await refresh()
+            if last_maintenance is None or loop.time() - last_maintenance >= PARTITION_MAINTENANCE_SECONDS:
+                await maintain()
+                last_maintenance = loop.time()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Mantenimiento de particiones falló; reintento en %ss", PARTITION_REFRESH_SECONDS)
+        await asyncio.sleep(PARTITION_REFRESH_SECONDS)
+
+
+_task: asyncio.Task | None = None
+
+
+def start_maintenance() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_maintain_forever())
+
+
+async def stop_maintenance() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def partition_stats() -> dict:
+    return {
+        "live_months": len(_live_months),
+        "archived_months": _archived_months,
+    }
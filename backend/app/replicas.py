@@ -0,0 +1,223 @@
+# backend/app/replicas.py
+"""
+Lecturas en réplicas de PostgreSQL.
+
+    DATABASE_REPLICA_URLS       URLs de las réplicas, separadas por comas (vacío = todo al primario)
+    REPLICA_HEALTH_SECONDS      cada cuánto se comprueba cada réplica (5)
+    REPLICA_MAX_LAG_SECONDS     retraso de replicación a partir del cual se deja de usar (10)
+    REPLICA_PIN_SECONDS         ventana "leer lo que acabo de escribir" (10)
+
+Las rutas de solo lectura piden `Depends(get_read_session)` (o
+`get_user_read_session` en dependencies.py si hay usuario). Esa sesión elige
+el engine en cada sentencia (RoutingSession.get_bind):
+
+- escrituras y flush: siempre al primario;
+- sesión marcada con `use_primary()`: al primario;
+- el resto: a una réplica sana, en turno rotatorio, fija para toda la sesión.
+  Sin réplicas sanas, al primario.
+
+Leer lo que acabo de escribir: tras una escritura se fija una clave con
+`pin()` durante REPLICA_PIN_SECONDS y las lecturas que dependen de ella van al
+primario mientras tanto:
+
+    user_key(id)     reservas de un usuario (crear, cancelar, cambio de estado)
+    locale_key(id)   disponibilidad de un local (availability_cache.invalidate)
+    CATALOG_KEY      catálogo de locales (bump_catalog_version)
+
+Los eventos de reservas (events.py) llegan a todos los workers y fijan allí al
+dueño de la reserva, así que una lectura en otro worker también ve el cambio.
+
+Para probar en local basta con dos instancias de PostgreSQL (ver
+check_replicas.py): una instancia que no está en recuperación se acepta como
+réplica con retraso 0.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import Delete, Insert, Update, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from .cache import TTLLRUCache
+from .database import DB_POOL_WARMUP, engine as primary_engine, make_engine, warm_up_pool
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_HEALTH_SECONDS = float(os.getenv("REPLICA_HEALTH_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "10"))
+REPLICA_PIN_MAX_KEYS = int(os.getenv("REPLICA_PIN_MAX_KEYS", "50000"))
+
+# Si la réplica ya reprodujo todo lo recibido, está al día aunque el primario
+# lleve rato sin escribir (en ese caso now() - replay_timestamp crece sin motivo).
+_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+CATALOG_KEY = ("catalog",)
+
+
+def user_key(user_id: UUID) -> tuple:
+    return ("user", str(user_id))
+
+
+def locale_key(locale_id: UUID) -> tuple:
+    return ("locale", str(locale_id))
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    healthy: bool = False       # hasta el primer chequeo no recibe lecturas
+    lag: float | None = None
+    last_error: str | None = None
+    checked_at: float | None = None
+
+
+replicas = [
+    Replica(f"replica{i}", make_engine(url, f"replica{i}"))
+    for i, url in enumerate(DATABASE_REPLICA_URLS, start=1)
+]
+
+_turn = itertools.count()
+_pins = TTLLRUCache(maxsize=REPLICA_PIN_MAX_KEYS, ttl=REPLICA_PIN_SECONDS)
+statements_on_replica = 0
+statements_on_primary = 0
+
+
+# ---------- LEER LO QUE ACABO DE ESCRIBIR ----------
+
+def pin(*keys) -> None:
+    """Durante REPLICA_PIN_SECONDS, las lecturas de estas claves van al primario."""
+    for key in keys:
+        _pins.set(key, True)
+
+
+def is_pinned(*keys) -> bool:
+    return any(_pins.get(key) for key in keys)
+
+
+def use_primary(session: AsyncSession) -> None:
+    """Manda al primario el resto de sentencias de esta sesión."""
+    session.sync_session.info["primary"] = True
+
+
+def use_primary_if_pinned(session: AsyncSession, *keys) -> None:
+    if is_pinned(*keys):
+        use_primary(session)
+
+
+# ---------- ENRUTADO ----------
+
+def choose_replica() -> Replica | None:
+    healthy = [r for r in replicas if r.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_turn) % len(healthy)]
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kw):
+        global statements_on_replica, statements_on_primary
+        if (
+            self._flushing
+            or self.info.get("primary")
+            or isinstance(clause, (Insert, Update, Delete))
+        ):
+            statements_on_primary += 1
+            return primary_engine.sync_engine
+        replica = self.info.get("replica")
+        if replica is None:
+            replica = self.info["replica"] = choose_replica() or False
+        if replica is False:
+            statements_on_primary += 1
+            return primary_engine.sync_engine
+        statements_on_replica += 1
+        return replica.engine.sync_engine
+
+
+read_session = sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+)
+
+
+async def get_read_session() -> AsyncSession:
+    """Sesión de solo lectura (réplica si hay una sana); ver el docstring del módulo."""
+    async with read_session() as session:
+        yield session
+
+
+# ---------- SALUD ----------
+
+async def check_replica(replica: Replica) -> None:
+    try:
+        async with replica.engine.connect() as conn:
+            lag = float(await asyncio.wait_for(conn.scalar(_LAG_SQL), REPLICA_HEALTH_SECONDS))
+    except Exception as exc:
+        if replica.healthy:
+            logger.warning("Réplica %s fuera de servicio: %s", replica.name, exc)
+        replica.healthy, replica.lag, replica.last_error = False, None, f"{type(exc).__name__}: {exc}"[:500]
+    else:
+        healthy = lag <= REPLICA_MAX_LAG_SECONDS
+        if healthy != replica.healthy:
+            logger.warning("Réplica %s %s (retraso %.1fs)", replica.name,
+                           "de vuelta en servicio" if healthy else "demasiado retrasada", lag)
+        replica.healthy, replica.lag, replica.last_error = healthy, lag, None
+    replica.checked_at = time.time()
+
+
+async def _health_forever() -> None:
+    while True:
+        await asyncio.gather(*(check_replica(r) for r in replicas))
+        await asyncio.sleep(REPLICA_HEALTH_SECONDS)
+
+
+_health_task: asyncio.Task | None = None
+
+
+async def start() -> None:
+    """Calienta los pools, hace el primer chequeo y lanza los siguientes."""
+    global _health_task
+    if not replicas or _health_task is not None:
+        return
+    await asyncio.gather(*(warm_up_pool(DB_POOL_WARMUP, r.engine) for r in replicas))
+    await asyncio.gather(*(check_replica(r) for r in replicas))
+    _health_task = asyncio.create_task(_health_forever())
+
+
+async def stop() -> None:
+    global _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+        try:
+            await _health_task
+        except asyncio.CancelledError:
+            pass
+        _health_task = None
+    await asyncio.gather(*(r.engine.dispose() for r in replicas))
+
+
+def replica_stats() -> dict:
+    stats = {
+        "configured": len(replicas),
+        "healthy": sum(r.healthy for r in replicas),
+        "statements_on_replica": statements_on_replica,
+        "statements_on_primary": statements_on_primary,
+        "pinned_keys": len(_pins),
+    }
+    for r in replicas:
+        stats[f"{r.name}_lag_seconds"] = r.lag if r.lag is not None else -1.0
+    return stats
@@ -1,203 +1,586 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, UploadFile, File, Form
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, Request, Response, UploadFile, File, Form
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from ..models import Reservation, Locale
-from ..database import async_session, get_async_session
-from ..dependencies import get_current_user, get_async_session
-from ..schemas import ReservationOut, ReservationWithLocaleOut, ReservationStatusUpdate, LocaleOut
+from ..models import Reservation, Locale, User, Job
+from ..database import get_async_session, set_statement_timeout, statement_timeout
+from ..dependencies import (
+    create_stream_ticket, get_current_user, get_current_user_from_ticket, get_user_read_session, invalidate_user,
+    STREAM_TICKET_TTL,
+)
+from ..schemas import ReservationOut, ReservationWithLocaleOut, ReservationStatusUpdate, ReservationBulkItem, LocaleOut, LocaleSchedule, JobCreate, UserAccessUpdate
+from ..bulk import StatusChange, apply_status_changes
+from ..autoresolve import plan_resolution, apply_resolution
 from ..enums import UserRole, ReservationStatus
+from ..catalog import catalog_response, bump_catalog_version, locale_out
+from .. import availability_cache
+from .. import events, jobs, replicas, schedules
+from ..mailer import enqueue_reservation_notices
+from ..sql_budget import query_budget
+from ..idempotency import Idempotency, idempotency
+from ..conflicts import find_conflict_groups, is_exclusion_violation
+from ..capacity import approval_conflict
+from ..history import HISTORY_STREAM_BATCH, conflict_group_out, history_row, history_stmt, parse_iso
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy import desc
 from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime, time
 from typing import List
+import asyncio
+import base64
+import json
+import orjson
+import os
+from uuid import UUID
 
 router = APIRouter()
 
-@router.get("/conflicts")
-async def list_overlapping():
+OVERLAP_DETAIL = "El horario se solapa con otra reserva aprobada del local."
+
+# Topes por sentencia de las consultas de informe (el general es DB_STATEMENT_TIMEOUT_MS)
+CONFLICTS_STATEMENT_TIMEOUT_MS = int(os.getenv("CONFLICTS_STATEMENT_TIMEOUT_MS", "30000"))
+HISTORY_STATEMENT_TIMEOUT_MS = int(os.getenv("HISTORY_STATEMENT_TIMEOUT_MS", "30000"))
+# La exportación NDJSON lee todo el historial por un cursor: cada FETCH es una sentencia
+HISTORY_STREAM_STATEMENT_TIMEOUT_MS = int(os.getenv("HISTORY_STREAM_STATEMENT_TIMEOUT_MS", "120000"))
+
+
+async def _overlap_or_raise(session: AsyncSession, exc: IntegrityError):
+    await session.rollback()
+    if is_exclusion_violation(exc):
+        raise HTTPException(status_code=409, detail=OVERLAP_DETAIL)
+    raise exc
+
+
+async def _flush_status_change(session: AsyncSession):
     """
-    Devuelve todas las reservas 'pending' que se solapan en mismo local y horario.
+    Envía el UPDATE de estado antes de publicar eventos y encolar avisos: sus
+    sentencias harían el autoflush fuera de cualquier try y la violación de la
+    restricción de exclusión (una aprobación simultánea) saldría como 500.
     """
-    async with async_session() as session:
-        pending = await session.execute(select(Reservation).filter(Reservation.status == "pending"))
-        pending = pending.scalars().all()
-
-    conflicts = []
-    for r in pending:
-        async with async_session() as session:
-            overlap = await session.execute(
-                select(Reservation).filter(
-                    Reservation.locale_id == r.locale_id,
-                    Reservation.id != r.id,
-                    Reservation.status == "pending",
-                    Reservation.start_dt < r.end_dt,
-                    Reservation.end_dt > r.start_dt
-                )
-            )
-            if overlap.scalars().first():
-                conflicts.append(r)
-    return conflicts
+    try:
+        await session.flush()
+    except IntegrityError as exc:
+        await _overlap_or_raise(session, exc)
+
+
+async def _commit_status_change(session: AsyncSession):
+    """Commit que traduce la violación de la restricción de exclusión a un 409."""
+    try:
+        await session.commit()
+    except IntegrityError as exc:
+        await _overlap_or_raise(session, exc)
+
+@router.get("/conflicts", response_model=dict,
+            dependencies=[statement_timeout(CONFLICTS_STATEMENT_TIMEOUT_MS), query_budget(4)])
+async def list_overlapping(
+    locale_id: UUID | None = Query(None, description="Filtrar por local"),
+    start_date: datetime | None = Query(None, description="Inicio de la ventana (ISO 8601)"),
+    end_date: datetime | None = Query(None, description="Fin de la ventana (ISO 8601)"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Devuelve los grupos de reservas 'pending' que se solapan en mismo local y horario.
+    Cada grupo es una componente conexa de solapamientos; se calculan todos en una sola consulta.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    total, groups = await find_conflict_groups(
+        session,
+        locale_id=locale_id,
+        window_start=start_date.replace(tzinfo=None) if start_date else None,
+        window_end=end_date.replace(tzinfo=None) if end_date else None,
+        limit=limit,
+        offset=offset,
+    )
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "groups": [conflict_group_out(g) for g in groups],
+    }
 
 
 @router.post("/resolve/{reservation_id}")
-async def resolve(reservation_id: str, priority: int, status: str):
+async def resolve(reservation_id: str, priority: int, status: str,
+                  current_user=Depends(get_current_user),
+                  session: AsyncSession = Depends(get_async_session),
+                  idem: Idempotency = Depends(idempotency("resolve"))):
     """
     Asigna prioridad y estado (approved/rejected) a una reserva.
+    Solo administradores. Admite Idempotency-Key (por usuario).
     """
-    async with async_session() as session:
-        res = await session.get(Reservation, reservation_id)
-        if not res:
-            raise HTTPException(status_code=404, detail="Reserva no encontrada")
-        res.priority = priority
-        res.status = status
-        await session.commit()
-    return {"msg": "Resolución guardada"}
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return await idem.run(lambda: _resolve(reservation_id, priority, status, session, idem))
+
 
-@router.get("/reservations/pending", response_model=list[dict])
-async def pending_reservations(current_user=Depends(get_current_user)):
+async def _resolve(reservation_id: str, priority: int, status: str, session: AsyncSession, idem: Idempotency):
+    res = await session.get(Reservation, reservation_id)
+    if not res:
+        raise HTTPException(status_code=404, detail="Reserva no encontrada")
+    if status == ReservationStatus.approved and (conflict := await approval_conflict(session, res, OVERLAP_DETAIL)):
+        raise HTTPException(status_code=409, detail=conflict)
+    res.priority = priority
+    res.status = status
+    await _flush_status_change(session)
+    await events.publish_reservation_changes(session, "status_changed", [res])
+    await enqueue_reservation_notices(session, "status_changed", [res])
+    response = {"msg": "Resolución guardada"}
+    await idem.save(session, response)   # en el mismo commit que el cambio
+    await _commit_status_change(session)
+    availability_cache.invalidate(res.locale_id, res.start_dt, res.end_dt)
+    return response
+
+def pending_stmt():
+    """Pendientes por fecha (usa el índice parcial ix_reservations_pending_start)."""
+    return (
+        select(Reservation)
+        .options(joinedload(Reservation.locale), joinedload(Reservation.user))  # ← local y usuario en el mismo SELECT
+        .where(Reservation.status == ReservationStatus.pending)
+        .order_by(Reservation.start_dt)
+    )
+
+@router.get("/reservations/pending", response_model=list[dict], dependencies=[query_budget(2)])
+async def pending_reservations(current_user=Depends(get_current_user),
+                               session: AsyncSession = Depends(get_async_session)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(403, "No autorizado")
-    async with async_session() as session:
-        stmt = (
-            select(Reservation)
-            .options(joinedload(Reservation.locale))  # ← carga el local
-            .where(Reservation.status == ReservationStatus.pending)
-            .order_by(Reservation.start_dt)
-        )
-        rows = (await session.execute(stmt)).scalars().all()
-
-        # ← armamos el DTO a mano
-        return [
-            {
-                "id": str(r.id),
-                "startDate": r.start_dt.isoformat(),
-                "endDate": r.end_dt.isoformat(),
-                "status": r.status.value,
-                "motive": r.motive,
-                "userName": r.user.full_name if r.user else "Usuario Desconocido",
-                "userEmail": r.user.email if r.user else "Sin email",
-                "locale": {
-                    "id": str(r.locale_id),
-                    "name": r.locale.name if r.locale else "Local Desconocido",
-                    "imagen_url": f"/assets/locales/{r.locale.imagen}" if r.locale.imagen else "/assets/img/no-image.jpg"
-                }
+    stmt = pending_stmt()
+    rows = (await session.execute(stmt)).scalars().all()
+
+    # ← armamos el DTO a mano
+    return [
+        {
+            "id": str(r.id),
+            "startDate": r.start_dt.isoformat(),
+            "endDate": r.end_dt.isoformat(),
+            "status": r.status.value,
+            "motive": r.motive,
+            "userName": r.user.full_name if r.user else "Usuario Desconocido",
+            "userEmail": r.user.email if r.user else "Sin email",
+            "locale": {
+                "id": str(r.locale_id),
+                "name": r.locale.name if r.locale else "Local Desconocido",
+                "imagen_url": f"/assets/locales/{r.locale.imagen}" if r.locale.imagen else "/assets/img/no-image.jpg"
             }
-            for r in rows
-        ]
+        }
+        for r in rows
+    ]
 
-@router.patch("/reservations/{res_id}/status", response_model=ReservationOut)
+# +2 idas y vueltas por la Idempotency-Key (reservarla y guardar la respuesta)
+# y +2 al aprobar (el local y, en los compartidos, su bloqueo)
+@router.patch("/reservations/{res_id}/status", response_model=ReservationOut, dependencies=[query_budget(10)])
 async def set_reservation_status(
     res_id: str,
     # Se recomienda renombrar el parámetro para evitar confusión.
     # Lo llamaremos 'status_update' para indicar que es el objeto Pydantic.
     status_update: ReservationStatusUpdate,  
-    current_user=Depends(get_current_user)
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+    idem: Idempotency = Depends(idempotency("set_reservation_status")),
 ):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="No autorizado")
-        
+    return await idem.run(lambda: _set_reservation_status(res_id, status_update, current_user, session, idem),
+                          response_model=ReservationOut)
+
+
+async def _set_reservation_status(res_id: str, status_update: ReservationStatusUpdate, current_user,
+                                  session: AsyncSession, idem: Idempotency):
     # Extraemos el valor del Enum del objeto Pydantic
     new_status_value = status_update.status 
 
-    async with async_session() as session:
-        res = await session.execute(select(Reservation).where(Reservation.id == res_id))
-        reservation = res.scalar_one_or_none()
-        
-        if not reservation:
-            raise HTTPException(status_code=404, detail="Reserva no encontrada")
-            
-        # 🛠️ CORRECCIÓN CLAVE: Asignamos el valor extraído (new_status_value), 
-        # que es un objeto Enum, no el modelo Pydantic completo.
-        reservation.status = new_status_value 
+    res = await session.execute(select(Reservation).where(Reservation.id == res_id))
+    reservation = res.scalar_one_or_none()
+    
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reserva no encontrada")
         
-        await session.commit()
-        await session.refresh(reservation)
-        return reservation
+    # En locales compartidos, que quepa en la capacidad (capacity.py)
+    if new_status_value == ReservationStatus.approved and (
+        conflict := await approval_conflict(session, reservation, OVERLAP_DETAIL)
+    ):
+        raise HTTPException(status_code=409, detail=conflict)
+
+    # 🛠️ CORRECCIÓN CLAVE: Asignamos el valor extraído (new_status_value), 
+    # que es un objeto Enum, no el modelo Pydantic completo.
+    reservation.status = new_status_value 
+    await _flush_status_change(session)
+    await events.publish_reservation_changes(session, "status_changed", [reservation])
+    await enqueue_reservation_notices(session, "status_changed", [reservation])
+    await idem.save(session, reservation)   # en el mismo commit que el cambio
+    await _commit_status_change(session)
+    replicas.pin(replicas.user_key(current_user.id))   # su historial, ya desde el primario
+    availability_cache.invalidate(reservation.locale_id, reservation.start_dt, reservation.end_dt)
+    return reservation
+
+BULK_MAX_ITEMS = 1000
+
+# +2 por el SAVEPOINT del UPDATE y +1 para buscar locales compartidos (bulk.py);
+# cada local compartido con aprobaciones suma además su bloqueo
+@router.post("/reservations/bulk-status", dependencies=[query_budget(8)])
+async def bulk_set_reservation_status(
+    items: list[ReservationBulkItem],
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Aprueba / rechaza muchas reservas en una sola transacción.
+    Devuelve el resultado de cada elemento: updated, not_found, overlap
+    (aprobarla chocaría con otra reserva aprobada del mismo local) o full
+    (sus asistentes no caben en el local compartido).
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Máximo {BULK_MAX_ITEMS} reservas por lote.")
+
+    results = await apply_status_changes(
+        session, [StatusChange(id=i.id, status=i.status, priority=i.priority) for i in items]
+    )
+    updated = [r for r in results if r.result == "updated"]
+    await events.publish_reservation_changes(session, "status_changed", updated)
+    await enqueue_reservation_notices(session, "status_changed", updated)
+    await _commit_status_change(session)
+    replicas.pin(replicas.user_key(current_user.id))   # su historial, ya desde el primario
+
+    summary = {"updated": 0, "not_found": 0, "overlap": 0, "full": 0}
+    for r in results:
+        summary[r.result] += 1
+        if r.result == "updated":
+            availability_cache.invalidate(r.locale_id, r.start_dt, r.end_dt)
+
+    return {
+        **summary,
+        "results": [
+            {
+                "id": str(r.id),
+                "result": r.result,
+                "status": r.status.value if r.status else None,
+                "priority": r.priority,
+            }
+            for r in results
+        ],
+    }
+
+@router.post("/auto-resolve")
+async def auto_resolve(
+    start_date: datetime = Query(..., description="Inicio de la ventana (ISO 8601)"),
+    end_date: datetime = Query(..., description="Fin de la ventana (ISO 8601)"),
+    locale_id: UUID | None = Query(None, description="Limitar a un local"),
+    dry_run: bool = Query(True, description="Solo calcular, sin guardar"),
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Resuelve automáticamente las pendientes que empiezan en la ventana: por local,
+    aprueba el conjunto sin solapamientos de mayor prioridad y rechaza el resto.
+    Con dry_run=true (por defecto) solo devuelve la propuesta.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    window_start = start_date.replace(tzinfo=None)
+    window_end = end_date.replace(tzinfo=None)
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="end_date debe ser posterior a start_date.")
+
+    decisions = await plan_resolution(session, window_start, window_end, locale_id, lock=not dry_run)
+
+    outcome = {}
+    if not dry_run:
+        results = await apply_resolution(session, decisions)
+        updated = [r for r in results if r.result == "updated"]
+        await events.publish_reservation_changes(session, "status_changed", updated)
+        await enqueue_reservation_notices(session, "status_changed", updated)
+        await _commit_status_change(session)
+        replicas.pin(replicas.user_key(current_user.id))   # su historial, ya desde el primario
+        outcome = {r.id: r.result for r in results}
+        for d in decisions:
+            if outcome.get(d.id) == "updated":
+                availability_cache.invalidate(d.locale_id, d.start_dt, d.end_dt)
+
+    approved = sum(d.status == ReservationStatus.approved for d in decisions)
+    return {
+        "dry_run": dry_run,
+        "approved": approved,
+        "rejected": len(decisions) - approved,
+        "decisions": [
+            {
+                "id": str(d.id),
+                "locale_id": str(d.locale_id),
+                "startDate": d.start_dt.isoformat(),
+                "endDate": d.end_dt.isoformat(),
+                "priority": d.priority,
+                "status": d.status.value,
+                "reason": d.reason,
+                **({"result": outcome.get(d.id)} if not dry_run else {}),
+            }
+            for d in decisions
+        ],
+    }
+
+# ====================================================================
+# 📡 EVENTOS EN VIVO PARA EL PANEL (Server-Sent Events)
+# ====================================================================
+SSE_HEARTBEAT_SECONDS = 15
+
+@router.post("/events/ticket")
+async def admin_events_ticket(current_user=Depends(get_current_user)):
+    """Ticket de vida corta para abrir GET /events; el panel pide uno en cada (re)conexión."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return {"ticket": create_stream_ticket(current_user), "expires_in": STREAM_TICKET_TTL}
+
+
+@router.get("/events")
+async def admin_events(request: Request, current_user=Depends(get_current_user_from_ticket)):
+    """
+    Stream SSE con los cambios de reservas (ver app/events.py).
+    EventSource no envía cabeceras, por eso va un ticket en ?ticket= (POST /events/ticket).
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    async def stream():
+        queue = events.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # mantiene viva la conexión a través de proxies
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ====================================================================
 # 🔒 ENDPOINT DE ADMINISTRADOR: HISTORIAL DE TODAS LAS RESERVAS
 # ====================================================================
-# ⚠️ IMPORTANTE: Este endpoint asume que solo el administrador puede acceder a él.
-# La lógica de autorización debe estar en get_current_user (o un nuevo Depends).
-# Por ahora, solo requiere autenticación.
+# Paginación por cursor (keyset) sobre (start_dt, id) descendente: cada página
+# cuesta lo mismo sin importar cuán atrás esté, a diferencia de OFFSET.
+# El cursor de la página siguiente viaja en la cabecera X-Next-Cursor, así el
+# cuerpo sigue siendo la lista de siempre. Sin `limit` ni `cursor` se devuelve
+# la lista completa, como antes (el panel actual no pagina).
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+
+
+def _encode_cursor(start_dt: datetime, res_id) -> str:
+    raw = f"{start_dt.isoformat()}|{res_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
 
-@router.get("/history", response_model=list[dict])
+
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        start_raw, id_raw = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(start_raw), UUID(id_raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+async def _stream_history(stmt, user_id: UUID):
+    """NDJSON fila a fila desde un cursor del servidor (en una réplica si hay): memoria constante."""
+    async with replicas.read_session() as session:
+        replicas.use_primary_if_pinned(session, replicas.user_key(user_id))
+        await set_statement_timeout(session, HISTORY_STREAM_STATEMENT_TIMEOUT_MS)
+        result = await session.stream(stmt.execution_options(yield_per=HISTORY_STREAM_BATCH))
+        async for partition in result.partitions():
+            yield b"".join(orjson.dumps(history_row(r)) + b"\n" for r in partition)
+
+
+@router.get("/history", response_model=list[dict],
+            dependencies=[statement_timeout(HISTORY_STATEMENT_TIMEOUT_MS, get_user_read_session), query_budget(3)])
 async def get_all_history_reservations(
     start_date: str | None = Query(None, alias="start_date"),
     end_date: str | None = Query(None, alias="end_date"),
+    locale_id: UUID | None = Query(None),
+    user_id: UUID | None = Query(None),
+    status: ReservationStatus | None = Query(None),
+    q: str | None = Query(None, max_length=200, description="Texto a buscar en el motivo"),
+    cursor: str | None = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    limit: int | None = Query(None, ge=1, le=HISTORY_MAX_PAGE_SIZE,
+                              description=f"Tamaño de página (con cursor, {HISTORY_PAGE_SIZE} por defecto)"),
+    stream: bool = Query(False, description="Exportar todo el resultado como NDJSON"),
     current_user=Depends(get_current_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_user_read_session)
 ):
     """
-    Obtiene TODAS las reservas (cualquier estado) con su información completa.
+    Obtiene las reservas (cualquier estado) con su información completa.
+    Con limit o cursor, paginadas por cursor; sin ninguno de los dos, todas.
+    Con stream=true devuelve TODO el resultado filtrado como NDJSON sin cargarlo en memoria.
     Solo accesible por administradores.
     """
-    # 1. Construcción de la consulta con JOINs
-    stmt = select(Reservation).options(
-        selectinload(Reservation.locale),
-        selectinload(Reservation.user)
-    )
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
 
-    # 2. (Opcional) filtros de rango de fecha si los mandan
+    # 1. Filtros de rango de fecha si los mandan
     try:
-        if start_date:
-            start_dt_parsed = datetime.fromisoformat(start_date.replace("Z", "+00:00"))
-            stmt = stmt.where(Reservation.start_dt >= start_dt_parsed.replace(tzinfo=None))
-
-        if end_date:
-            end_dt_parsed = datetime.fromisoformat(end_date.replace("Z", "+00:00"))
-            stmt = stmt.where(Reservation.start_dt <= end_dt_parsed.replace(tzinfo=None))
+        start = parse_iso(start_date) if start_date else None
+        end = parse_iso(end_date) if end_date else None
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use ISO 8601.")
 
-    # 3. Ordenar por fecha (más reciente primero)
-    stmt = stmt.order_by(desc(Reservation.start_dt))
+    after = _decode_cursor(cursor) if cursor else None
+    stmt = history_stmt(start, end, locale_id, user_id, status, q, after)
 
-    # 4. Ejecutar la consulta
-    res = await session.execute(stmt)
-    reservations = res.scalars().all()
+    # 2. Exportación completa en streaming
+    if stream:
+        return StreamingResponse(_stream_history(stmt, current_user.id), media_type="application/x-ndjson")
+
+    # 3. Sin paginar: la lista completa, como espera el panel
+    if limit is None and cursor is None:
+        rows = (await session.execute(stmt)).all()
+        return ORJSONResponse([history_row(r) for r in rows])
+
+    # 4. Una página (pedimos una fila de más para saber si hay siguiente)
+    limit = limit or HISTORY_PAGE_SIZE
+    rows = (await session.execute(stmt.limit(limit + 1))).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1].start_dt, rows[-1].id)
+
+    # Ya son dicts: directo a bytes con orjson, sin jsonable_encoder
+    return ORJSONResponse([history_row(r) for r in rows], headers=headers)
+
+# ====================================================================
+# 👤 ROL Y ESTADO DE LOS USUARIOS
+# ====================================================================
+# Los tokens llevan el rol en sus claims y los usuarios autenticados se cachean
+# (dependencies.py): todo cambio de rol o de is_active pasa por aquí para
+# invalidarlos en este worker y, vía pg_notify, en los demás.
+
+@router.patch("/users/{user_id}", response_model=dict)
+async def update_user_access(
+    user_id: UUID,
+    data: UserAccessUpdate,
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Cambia el rol y/o is_active de un usuario; sus tokens vigentes dejan de valer con los datos viejos."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    if user.id == current_user.id and (data.role == UserRole.USER or data.is_active is False):
+        raise HTTPException(status_code=400, detail="No puedes quitarte el acceso de administrador a ti mismo.")
+
+    if data.role is not None:
+        user.role = data.role
+    if data.is_active is not None:
+        user.is_active = data.is_active
+    user.tokens_valid_after = datetime.utcnow()   # persiste la revocación (dependencies.py)
+    await events.publish_user_access_change(session, user.email)
+    await session.commit()
+    invalidate_user(user.email)   # sin esperar al LISTEN de este worker
+    return {
+        "id": str(user.id),
+        "email": user.email,
+        "full_name": user.full_name,
+        "role": UserRole(user.role).value,
+        "is_active": user.is_active is not False,
+    }
+
+# ====================================================================
+# 🧵 TRABAJOS EN SEGUNDO PLANO (ver app/jobs.py y app/job_handlers.py)
+# ====================================================================
+JOBS_PAGE_MAX = 200
 
-    # 5. Mapear el resultado
-    return [
-        {
-            "id": str(r.id),
-            "startDate": r.start_dt.isoformat(),
-            "endDate": r.end_dt.isoformat(),
-            "status": r.status.value,
-            "motive": r.motive,
-            "userName": r.user.full_name if r.user else "Usuario Desconocido",
-            "userEmail": r.user.email if r.user else "Sin email",
-            "locale": {
-                "id": str(r.locale_id),
-                "name": r.locale.name if r.locale else "Local Desconocido",
-                "imagen_url": f"/assets/locales/{r.locale.imagen}" if r.locale.imagen else "/assets/img/no-image.jpg"
-            }
-        }
-        for r in reservations
-    ]
+
+@router.post("/jobs", status_code=202)
+async def create_job(
+    data: JobCreate,
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Encola un trabajo; su estado se consulta en GET /jobs/{id}."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    try:
+        job = await jobs.enqueue(session, data.type, data.params, created_by=current_user.id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Tipo de trabajo desconocido. Tipos: {', '.join(sorted(jobs.JOB_TYPES))}")
+    await session.commit()
+    return jobs.job_out(job)
+
+
+@router.get("/jobs", response_model=list[dict])
+async def list_jobs(
+    type: str | None = Query(None),
+    status: str | None = Query(None, description="queued | running | succeeded | failed"),
+    limit: int = Query(50, ge=1, le=JOBS_PAGE_MAX),
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    stmt = select(Job).order_by(desc(Job.created_at)).limit(limit)
+    if type:
+        stmt = stmt.where(Job.type == type)
+    if status:
+        stmt = stmt.where(Job.status == status)
+    rows = (await session.execute(stmt)).scalars().all()
+    return [jobs.job_out(j) for j in rows]
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: UUID,
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    job = await session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return jobs.job_out(job)
+
+
+@router.get("/jobs/{job_id}/output")
+async def get_job_output(
+    job_id: UUID,
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Descarga el resultado voluminoso de un trabajo (p. ej. la exportación del historial)."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    row = (await session.execute(
+        select(Job.output, Job.output_type, Job.result).where(Job.id == job_id)
+    )).one_or_none()
+    if not row or row.output_type is None:
+        raise HTTPException(status_code=404, detail="El trabajo no tiene archivo de salida")
+    filename = (row.result or {}).get("filename", f"job-{job_id}")
+    return Response(
+        content=row.output,
+        media_type=row.output_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 # ---------- LISTAR ----------
 @router.get("/locales", response_model=list[LocaleOut])
-async def list_locales(current_user=Depends(get_current_user),
+async def list_locales(request: Request,
+                       current_user=Depends(get_current_user),
                        session: AsyncSession = Depends(get_async_session)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    rows = (await session.execute(select(Locale).order_by(Locale.name))).scalars().all()
-
-    return [
-        LocaleOut(
-            id=str(r.id),
-            name=r.name,
-            description=r.description,
-            capacity=r.capacity,
-            location=r.location,
-            open_time=r.open_time.strftime("%H:%M"),
-            close_time=r.close_time.strftime("%H:%M"),
-            imagen_url=f"/assets/locales/{r.imagen}" if r.imagen else "/assets/img/no-image.jpg"
-        )
-        for r in rows
-    ]
+    return await catalog_response(request, session)
 
 # ---------- CREAR ----------
 @router.post("", response_model=LocaleOut)
@@ -208,6 +591,7 @@ async def create_locale(
     location: str = Form(...),
     open_time: str = Form(...),
     close_time: str = Form(...),
+    shared_capacity: bool = Form(False),
     imagen: UploadFile | None = File(None),
     current_user=Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session)
@@ -227,11 +611,12 @@ async def create_locale(
         location=location,
         open_time=open_time,
         close_time=close_time,
+        shared_capacity=shared_capacity,
         imagen=file_name
     )
     session.add(new_locale)
     await session.commit()
-    await session.refresh(new_locale)
+    bump_catalog_version()
     return new_locale
 
 # ---------- EDITAR ----------
@@ -244,6 +629,7 @@ async def update_locale(
     location: str = Form(...),
     open_time: str = Form(...),
     close_time: str = Form(...),
+    shared_capacity: bool | None = Form(None),   # sin enviar: se mantiene
     imagen: UploadFile | None = File(None),
     current_user=Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session)
@@ -258,6 +644,8 @@ async def update_locale(
     # actualizar campos
     for field, value in {"name": name, "description": description, "capacity": capacity, "location": location, "open_time": open_time, "close_time": close_time}.items():
         setattr(res, field, value)
+    if shared_capacity is not None:
+        res.shared_capacity = shared_capacity
 
     # imagen opcional
     if imagen:
@@ -267,12 +655,40 @@ async def update_locale(
         res.imagen = file_name
 
     await session.commit()
-    await session.refresh(res)
+    bump_catalog_version()
+    schedules.invalidate(res.id)
+    availability_cache.invalidate_locale(res.id)
     return res
 
+# ---------- HORARIO (semanal, excepciones y cierres; ver schedules.py) ----------
+@router.put("/{locale_id}/schedule", response_model=LocaleOut)
+async def set_locale_schedule(
+    locale_id: UUID,
+    schedule: LocaleSchedule | None = Body(None),
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Reemplaza el horario del local; con `null` vuelve a open_time/close_time todos los días."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    res = await session.get(Locale, locale_id)
+    if not res:
+        raise HTTPException(status_code=404, detail="Local no encontrado")
+    for b in schedule.blackouts if schedule else []:
+        if b.start_dt >= b.end_dt:
+            raise HTTPException(status_code=400, detail="Cada cierre debe terminar después de empezar.")
+
+    res.schedule = schedule.model_dump(mode="json") if schedule else None
+    await session.commit()
+    bump_catalog_version()
+    schedules.invalidate(res.id)
+    availability_cache.invalidate_locale(res.id)
+    return locale_out(res)
+
 # ---------- ELIMINAR ----------
 @router.delete("/{locale_id}", status_code=204)
 async def delete_locale(locale_id: str,
+                        background: bool = Query(False, description="Borrar en segundo plano (202 + trabajo)"),
                         current_user=Depends(get_current_user),
                         session: AsyncSession = Depends(get_async_session)):
     if current_user.role != UserRole.ADMIN:
@@ -280,5 +696,13 @@ async def delete_locale(locale_id: str,
     res = await session.get(Locale, locale_id)
     if not res:
         raise HTTPException(status_code=404, detail="Local no encontrado")
+    if background:
+        # Locales con muchas reservas: el borrado en lotes no bloquea la petición
+        job = await jobs.enqueue(session, "delete_locale", {"locale_id": str(res.id)}, created_by=current_user.id)
+        await session.commit()
+        return JSONResponse(status_code=202, content=jobs.job_out(job))
     await session.delete(res)
-    await session.commit()
\ No newline at end of file
+    await session.commit()
+    bump_catalog_version()
+    schedules.invalidate(res.id)
+    availability_cache.invalidate_locale(res.id)
\ No newline at end of file
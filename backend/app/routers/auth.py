@@ -3,7 +3,6 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.future import select
-import bcrypt as bcrypt_native
 from jose import jwt
 from datetime import datetime, timedelta
 from ..models import User
@@ -11,6 +10,7 @@ from ..schemas import UserCreate, Token
 from ..database import async_session
 from ..dependencies import get_current_user
 from ..enums import UserRole
+from ..hashing import hash_password, verify_password
 
 router = APIRouter()
 
@@ -19,30 +19,18 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 
 
-# ✅ Wrapper propio: mismo nombre para no tocar el resto del código
-class pwd_context:
-    @staticmethod
-    def hash(password: str) -> str:
-        return bcrypt_native.hashpw(
-            password.encode('utf-8')[:72],
-            bcrypt_native.gensalt()
-        ).decode('utf-8')
-
-    @staticmethod
-    def verify(password: str, hashed: str) -> bool:
-        return bcrypt_native.checkpw(
-            password.encode('utf-8')[:72],
-            hashed.encode('utf-8')
-        )
-
-
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def _claims_for(user: User) -> dict:
+    """uid/name/role en el token permiten a get_current_user no consultar la BD."""
+    return {"sub": user.email, "role": user.role, "uid": str(user.id), "name": user.full_name}
+
+
 @router.post("/register", response_model=Token, status_code=201)
 async def register(user: UserCreate):
     async with async_session() as session:
@@ -54,7 +42,7 @@ async def register(user: UserCreate):
         # 2. Creamos el usuario
         new_user = User(
             email=user.email,
-            password_hash=pwd_context.hash(user.password),
+            password_hash=await hash_password(user.password),
             full_name=user.full_name,
             role=UserRole.USER
         )
@@ -63,9 +51,7 @@ async def register(user: UserCreate):
         await session.refresh(new_user)          # <- trae id y role definitivos
 
     # 3. Token para el usuario recién creado
-    access_token = create_access_token(
-        data={"sub": new_user.email, "role": new_user.role}
-    )
+    access_token = create_access_token(data=_claims_for(new_user))
 
     # 4. Lo devolvemos tal como espera el esquema Token
     return {"access_token": access_token, "token_type": "bearer"}
@@ -79,10 +65,14 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         if not user:
             raise HTTPException(status_code=400, detail="Credenciales incorrectas")
 
-        if not pwd_context.verify(form_data.password, user.password_hash):
-            raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    # Fuera del bloque de sesión: no retenemos una conexión del pool mientras bcrypt trabaja
+    if not await verify_password(form_data.password, user.password_hash):
+        raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    if user.is_active is False:
+        # Sus claims evitarían la BD en get_current_user: no emitimos tokens a inactivos
+        raise HTTPException(status_code=403, detail="Usuario desactivado")
 
-    access_token = create_access_token(data={"sub": user.email, "role": user.role})
+    access_token = create_access_token(data=_claims_for(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 
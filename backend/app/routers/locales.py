@@ -1,4 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import heapq
+from itertools import islice
+from typing import Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import Session
@@ -7,10 +12,16 @@ from uuid import UUID
 
 # Importaciones de modelos y esquemas
 from ..models import Locale, Reservation, User
-from ..schemas import LocaleOut, AvailabilityResponse, TimeSlot, ReservationCreate, ReservationOut, ReservationDisplay
+from ..schemas import LocaleOut, AvailabilityResponse, TimeSlot, CapacitySlot, SlotSuggestion, ReservationCreate, ReservationOut, ReservationDisplay
 from ..enums import ReservationStatus
 
-from ..database import async_session
+from ..database import get_async_session
+from ..replicas import get_read_session, locale_key, use_primary_if_pinned
+from ..catalog import catalog_response
+from .. import availability_cache
+from ..sql_budget import query_budget
+from ..capacity import remaining_blocks
+from ..schedules import Schedule, schedule_for
 
 router = APIRouter()
 
@@ -19,28 +30,263 @@ RESERVATION_SLOT_DURATION = timedelta(hours=1)
 # ⚠️ IMPORTANTE: Este ID es un placeholder y debe ser reemplazado por la autenticación del usuario.
 MOCK_USER_ID = UUID("00000000-0000-0000-0000-000000000001") 
 
-# Dependencia para obtener la sesión de DB
-async def get_async_session():
-    async with async_session() as session:
-        yield session
-
-@router.get("/", response_model=list[LocaleOut])
-async def list_locales(session: AsyncSession = Depends(get_async_session)):
-    rows = (await session.execute(select(Locale).order_by(Locale.name))).scalars().all()
-
-    return [
-        LocaleOut(
-            id=str(r.id),                    # ← UUID → string
-            name=r.name,
-            description=r.description,
-            capacity=r.capacity,
-            location=r.location,
-            open_time=r.open_time.strftime("%H:%M"),
-            close_time=r.close_time.strftime("%H:%M"),
-            imagen_url=f"/assets/locales/{r.imagen}" if r.imagen else "/assets/img/no-image.jpg"
+def locale_schedule(locale: Locale) -> Schedule:
+    """Horario compilado del local (ver schedules.py); se compila una vez, no en cada petición."""
+    try:
+        return schedule_for(locale)
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=500, detail="Horario del local mal configurado (no es 'HH:MM').")
+
+def free_blocks(start: datetime, end: datetime, occupied: list[tuple[datetime, datetime]]) -> list[tuple[datetime, datetime]]:
+    """Huecos libres de [start, end) dados los tramos ocupados ordenados por inicio (pueden salirse del rango)."""
+    blocks = []
+    current_time = start
+    for slot_start, slot_end in occupied:
+        if slot_start >= end:
+            break
+        if current_time < slot_start:
+            blocks.append((current_time, slot_start))
+        current_time = max(current_time, slot_end)
+    if current_time < end:
+        blocks.append((current_time, end))
+    return blocks
+
+def availability_stmt(locale_id: UUID, start_of_day: datetime, end_of_day: datetime):
+    """Reservas activas del local que tocan la ventana (usa ix_reservations_locale_start)."""
+    # 🛠️ IMPORTANTE: Incluimos Reservation.id para satisfacer la validación de Pydantic
+    return (
+        select(
+            Reservation.id, # ⬅️ CAMBIO CLAVE: Solución al error "id is missing"
+            Reservation.start_dt,
+            Reservation.end_dt,
+            Reservation.status,
+            Reservation.headcount,
+            User.email.label("user_email") # Obtenemos el email
         )
-        for r in rows
+        .join(User, Reservation.user_id == User.id) 
+        .where(
+            Reservation.locale_id == locale_id,
+            Reservation.start_dt < end_of_day,
+            Reservation.end_dt > start_of_day,
+            Reservation.status.in_([ReservationStatus.approved, ReservationStatus.pending])
+        )
+        .order_by(Reservation.start_dt)
+    )
+
+@router.get("/", response_model=list[LocaleOut], dependencies=[query_budget(1)])
+async def list_locales(request: Request, session: AsyncSession = Depends(get_read_session)):
+    # Catálogo cacheado y pre-serializado; responde 304 si el ETag coincide
+    return await catalog_response(request, session)
+
+# Límites del endpoint de rango (30 días × 20 locales entra holgado)
+MAX_RANGE_DAYS = 62
+MAX_RANGE_LOCALES = 100
+
+@router.get("/availability", dependencies=[query_budget(2)])
+async def get_availability_range(
+    locale_ids: list[UUID] = Query(..., alias="locale_ids[]", description="IDs de los locales"),
+    from_date: date = Query(..., alias="from", description="Primer día (YYYY-MM-DD)"),
+    to_date: date = Query(..., alias="to", description="Último día, inclusive (YYYY-MM-DD)"),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Disponibilidad de varios locales en varios días con una sola petición.
+
+    Respuesta compacta:
+        {"from": "...", "to": "...",
+         "locales": {"<locale_id>": {"name": "...",
+                                     "days": {"YYYY-MM-DD": {"occupied": [[inicio, fin, estado, id], ...],
+                                                             "free": [[inicio, fin], ...]}}}}}
+
+    En locales de capacidad compartida ("capacity" aparece en el local), cada
+    tramo de "free" lleva además las plazas que quedan: [inicio, fin, plazas].
+    """
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' debe ser posterior o igual a 'from'.")
+    if (to_date - from_date).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango máximo es de {MAX_RANGE_DAYS} días.")
+    ids = list(dict.fromkeys(locale_ids))
+    if len(ids) > MAX_RANGE_LOCALES:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_RANGE_LOCALES} locales por consulta.")
+    use_primary_if_pinned(session, *(locale_key(i) for i in ids))
+
+    # 1. Locales activos pedidos y sus tramos reservables de cada día
+    locales = (await session.execute(
+        select(Locale).where(Locale.id.in_(ids), Locale.active.is_(True))
+    )).scalars().all()
+    days = [from_date + timedelta(days=i) for i in range((to_date - from_date).days + 1)]
+    windows = {}
+    for locale in locales:
+        schedule = locale_schedule(locale)
+        windows[locale.id] = [schedule.day_windows(d) for d in days]
+    spans = [w for per_day in windows.values() for day_windows in per_day for w in day_windows]
+    if not spans:
+        return {"from": from_date.isoformat(), "to": to_date.isoformat(),
+                "locales": {str(l.id): {"name": l.name, "days": {}} for l in locales}}
+
+    # 2. TODAS las reservas activas que tocan el rango, en una sola consulta ordenada
+    range_start = min(s for s, _ in spans)
+    range_end = max(e for _, e in spans)
+    rows = (await session.execute(
+        select(Reservation.locale_id, Reservation.id, Reservation.start_dt, Reservation.end_dt, Reservation.status,
+               Reservation.headcount)
+        .where(
+            Reservation.locale_id.in_(list(windows)),
+            Reservation.start_dt < range_end,
+            Reservation.end_dt > range_start,
+            Reservation.status.in_([ReservationStatus.approved, ReservationStatus.pending])
+        )
+        .order_by(Reservation.locale_id, Reservation.start_dt)
+    )).all()
+
+    by_locale: dict[UUID, list] = {locale_id: [] for locale_id in windows}
+    for row in rows:
+        by_locale[row.locale_id].append(row)
+
+    # 3. Una pasada por local: los días avanzan en orden y las reservas también,
+    #    así que `first` solo se mueve hacia delante.
+    result = {}
+    for locale in sorted(locales, key=lambda l: l.name):
+        reservations = by_locale[locale.id]
+        first = 0
+        locale_days = {}
+        for day, day_windows in zip(days, windows[locale.id]):
+            if not day_windows:   # cerrado
+                locale_days[day.isoformat()] = {"occupied": [], "free": []}
+                continue
+            day_start, day_end = day_windows[0][0], day_windows[-1][1]
+            while first < len(reservations) and reservations[first].end_dt <= day_start:
+                first += 1
+            occupied = []
+            loads = []
+            i = first
+            while i < len(reservations) and reservations[i].start_dt < day_end:
+                r = reservations[i]
+                if r.end_dt > day_start:
+                    occupied.append((max(r.start_dt, day_start), min(r.end_dt, day_end), r.status.value, str(r.id)))
+                    loads.append((r.start_dt, r.end_dt, r.headcount or locale.capacity or 0))
+                i += 1
+            if locale.shared_capacity:
+                free = [
+                    [s.isoformat(), e.isoformat(), remaining]
+                    for ws, we in day_windows
+                    for s, e, remaining in remaining_blocks(ws, we, locale.capacity or 0, loads)
+                    if remaining > 0
+                ]
+            else:
+                free = [
+                    [s.isoformat(), e.isoformat()]
+                    for ws, we in day_windows
+                    for s, e in free_blocks(ws, we, [(s, e) for s, e, _, _ in occupied])
+                ]
+            locale_days[day.isoformat()] = {
+                "occupied": [[s.isoformat(), e.isoformat(), st, rid] for s, e, st, rid in occupied],
+                "free": free,
+            }
+        result[str(locale.id)] = {"name": locale.name, "days": locale_days}
+        if locale.shared_capacity:
+            result[str(locale.id)]["capacity"] = locale.capacity or 0
+
+    return {"from": from_date.isoformat(), "to": to_date.isoformat(), "locales": result}
+
+# Límites de la búsqueda de huecos
+MAX_SEARCH_DAYS = 14
+MAX_SEARCH_RESULTS = 50
+
+def _locale_slots(locale: Locale, reservations: list, start: datetime, end: datetime,
+                  duration: timedelta, people: int) -> Iterator[SlotSuggestion]:
+    """
+    Huecos de al menos `duration` del local dentro de [start, end), en orden;
+    uno por hueco, empezando lo antes posible. En locales compartidos vale
+    cualquier tramo con `people` plazas libres o más.
+    """
+    schedule = locale_schedule(locale)
+    windows = [
+        (max(ws, start), min(we, end))
+        for d in range((end.date() - start.date()).days + 2)
+        for ws, we in schedule.day_windows(start.date() + timedelta(days=d - 1))
+        if ws < end and we > start
+    ]
+    occupied = [(r.start_dt, r.end_dt) for r in reservations]
+    loads = [(r.start_dt, r.end_dt, r.headcount or locale.capacity or 0) for r in reservations]
+    for ws, we in sorted(windows):
+        if locale.shared_capacity:
+            # Tramos contiguos con plazas suficientes; `remaining` es el mínimo del hueco
+            blocks = []
+            for s, e, remaining in remaining_blocks(ws, we, locale.capacity or 0, loads):
+                if remaining < people:
+                    continue
+                if blocks and blocks[-1][1] == s:
+                    blocks[-1] = (blocks[-1][0], e, min(blocks[-1][2], remaining))
+                else:
+                    blocks.append((s, e, remaining))
+        else:
+            blocks = [(s, e, None) for s, e in free_blocks(ws, we, occupied)]
+        for s, e, remaining in blocks:
+            if e - s >= duration:
+                yield SlotSuggestion(
+                    locale_id=locale.id, locale_name=locale.name, location=locale.location,
+                    start_dt=s, end_dt=s + duration, free_until=e, remaining=remaining,
+                )
+
+@router.get("/search", response_model=list[SlotSuggestion], dependencies=[query_budget(1)])
+async def search_slots(
+    duration_minutes: int = Query(..., ge=1, le=24 * 60, description="Duración de la reserva en minutos"),
+    min_capacity: int = Query(1, ge=1, description="Personas que deben caber"),
+    from_dt: datetime = Query(..., alias="from", description="Inicio de la ventana de búsqueda"),
+    to_dt: datetime = Query(..., alias="to", description="Fin de la ventana de búsqueda"),
+    location: str | None = Query(None, description="Texto a buscar en la ubicación del local"),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    "¿Dónde hay sala para 30 personas, 2 horas, mañana por la tarde?": los
+    primeros `limit` huecos libres entre todos los locales que cumplen, por
+    hora de inicio. Sustituye a pedir la disponibilidad de cada local.
+
+    Una sola consulta trae los locales candidatos y sus reservas activas en la
+    ventana; luego cada local da sus huecos en orden (su horario compilado
+    menos las reservas) y heapq.merge los mezcla hasta tener `limit`.
+    """
+    start = max(from_dt.replace(tzinfo=None), datetime.utcnow())
+    # Al minuto siguiente: sin segundos sueltos en los huecos sugeridos
+    if start.second or start.microsecond:
+        start = start.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    end = to_dt.replace(tzinfo=None)
+    duration = timedelta(minutes=duration_minutes)
+    if end - start < duration:
+        return []
+    if (end - start).days >= MAX_SEARCH_DAYS:
+        raise HTTPException(status_code=400, detail=f"La ventana máxima es de {MAX_SEARCH_DAYS} días.")
+
+    filters = [Locale.active.is_(True), Locale.capacity >= min_capacity]
+    if location:
+        pattern = location.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        filters.append(Locale.location.ilike(f"%{pattern}%", escape="\\"))
+    rows = (await session.execute(
+        select(Locale, Reservation.start_dt, Reservation.end_dt, Reservation.headcount)
+        .outerjoin(Reservation, and_(
+            Reservation.locale_id == Locale.id,
+            Reservation.start_dt < end,
+            Reservation.end_dt > start,
+            Reservation.status.in_([ReservationStatus.approved, ReservationStatus.pending]),
+        ))
+        .where(*filters)
+        .order_by(Locale.id, Reservation.start_dt)
+    )).all()
+
+    by_locale: dict[UUID, tuple[Locale, list]] = {}
+    for row in rows:
+        _, reservations = by_locale.setdefault(row.Locale.id, (row.Locale, []))
+        if row.start_dt is not None:
+            reservations.append(row)
+
+    per_locale = [
+        _locale_slots(locale, reservations, start, end, duration, min_capacity)
+        for locale, reservations in by_locale.values()
     ]
+    merged = heapq.merge(*per_locale, key=lambda slot: (slot.start_dt, slot.locale_name))
+    return list(islice(merged, limit))
 
 @router.get("/{locale_id}", response_model=LocaleOut)
 async def get_locale(locale_id: UUID, session: AsyncSession = Depends(get_async_session)):
@@ -49,57 +295,38 @@ async def get_locale(locale_id: UUID, session: AsyncSession = Depends(get_async_
         raise HTTPException(status_code=404, detail="Local no encontrado")
     return locale
 
-@router.get("/{locale_id}/availability", response_model=AvailabilityResponse)
+@router.get("/{locale_id}/availability", response_model=AvailabilityResponse,
+            dependencies=[query_budget(2)])
 async def get_locale_availability(
     locale_id: UUID,
     search_date: date = Query(default=date.today(), description="Fecha a consultar (YYYY-MM-DD)"),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
+    use_primary_if_pinned(session, locale_key(locale_id))
+    # Cacheado por (local, día); peticiones idénticas simultáneas comparten una sola consulta
+    return await availability_cache.get_or_compute(
+        (locale_id, search_date),
+        lambda: compute_locale_availability(session, locale_id, search_date),
+    )
+
+async def compute_locale_availability(session: AsyncSession, locale_id: UUID, search_date: date) -> AvailabilityResponse:
     # 1. Buscar el Local y sus horas de operación
     locale = await session.get(Locale, locale_id)
     
     if not locale or not locale.active:
         raise HTTPException(status_code=404, detail="Local no encontrado o inactivo")
 
-    # 2. Obtener las horas de operación
-    if isinstance(locale.open_time, time):
-        open_t = locale.open_time
-        close_t = locale.close_time
-    else:
-        try:
-            # Intentamos parsear HH:MM si es un string (asumiendo que en DB es string o time)
-            open_t = datetime.strptime(str(locale.open_time), "%H:%M").time()
-            close_t = datetime.strptime(str(locale.close_time), "%H:%M").time()
-        except (ValueError, TypeError):
-            raise HTTPException(status_code=500, detail="Horario del local mal configurado (no es 'HH:MM').")
-    
+    # 2. Tramos reservables del día (horario semanal, excepciones y cierres)
+    day_windows = locale_schedule(locale).day_windows(search_date)
+    if not day_windows:
+        return AvailabilityResponse(occupied_slots=[], available_slots=[])
+
     # 3. Definir el rango exacto del día a buscar
-    start_of_day = datetime.combine(search_date, open_t).replace(tzinfo=None)
-    end_of_day = datetime.combine(search_date, close_t).replace(tzinfo=None)
-    
-    if end_of_day <= start_of_day:
-        end_of_day += timedelta(days=1)
+    start_of_day, end_of_day = day_windows[0][0], day_windows[-1][1]
 
     # 4. BUSCAR RESERVAS CON DETALLE DE USUARIO Y ESTADO
     
-    # 🛠️ IMPORTANTE: Incluimos Reservation.id para satisfacer la validación de Pydantic
-    stmt = (
-        select(
-            Reservation.id, # ⬅️ CAMBIO CLAVE: Solución al error "id is missing"
-            Reservation.start_dt,
-            Reservation.end_dt,
-            Reservation.status,
-            User.email.label("user_email") # Obtenemos el email
-        )
-        .join(User, Reservation.user_id == User.id) 
-        .where(
-            Reservation.locale_id == locale_id,
-            Reservation.start_dt < end_of_day,
-            Reservation.end_dt > start_of_day,
-            Reservation.status.in_([ReservationStatus.approved, ReservationStatus.pending])
-        )
-        .order_by(Reservation.start_dt)
-    )
+    stmt = availability_stmt(locale_id, start_of_day, end_of_day)
 
     occupied_results = await session.execute(stmt)
     
@@ -107,6 +334,7 @@ async def get_locale_availability(
     
     occupied_slots_raw = [] 
     occupied_slots_enriched = [] 
+    loads = []  # (inicio, fin, asistentes) para los locales compartidos
     
     for row in occupied_results:
         # Extraemos el ID
@@ -129,8 +357,9 @@ async def get_locale_availability(
             else:
                 color_indicator = "gray"
             
-            # 1. Slot para el CÁLCULO de huecos libres (TimeSlot básico)
-            occupied_slots_raw.append(TimeSlot(start_dt=start, end_dt=end))
+            # 1. Tramo (inicio, fin) para el CÁLCULO de huecos libres
+            occupied_slots_raw.append((start, end))
+            loads.append((start, end, row.headcount or locale.capacity or 0))
             
             # 2. Slot para la RESPUESTA ENRIQUECIDA (ReservationDisplay)
             occupied_slots_enriched.append(
@@ -146,16 +375,31 @@ async def get_locale_availability(
             )
     
     # 6. CÁLCULO DE BLOQUES DISPONIBLES CONTINUOS
-    available_blocks = []
-    current_time = start_of_day
+    if locale.shared_capacity:
+        # Local compartido: plazas libres de cada tramo; disponible mientras quede alguna
+        capacity = locale.capacity or 0
+        capacity_slots = [
+            CapacitySlot(start_dt=start, end_dt=end, remaining=remaining)
+            for ws, we in day_windows
+            for start, end, remaining in remaining_blocks(ws, we, capacity, loads)
+        ]
+        full = [(slot.start_dt, slot.end_dt) for slot in capacity_slots if slot.remaining == 0]
+        return AvailabilityResponse(
+            occupied_slots=occupied_slots_enriched,
+            available_slots=[
+                TimeSlot(start_dt=start, end_dt=end)
+                for ws, we in day_windows
+                for start, end in free_blocks(ws, we, full)
+            ],
+            capacity=capacity,
+            capacity_slots=capacity_slots,
+        )
 
-    for slot in occupied_slots_raw:
-        if current_time < slot.start_dt:
-            available_blocks.append(TimeSlot(start_dt=current_time, end_dt=slot.start_dt))
-        current_time = max(current_time, slot.end_dt)
-        
-    if current_time < end_of_day:
-        available_blocks.append(TimeSlot(start_dt=current_time, end_dt=end_of_day))
+    available_blocks = [
+        TimeSlot(start_dt=start, end_dt=end)
+        for ws, we in day_windows
+        for start, end in free_blocks(ws, we, occupied_slots_raw)
+    ]
 
     # 7. Devolver la respuesta estructurada
     return AvailabilityResponse(
@@ -2,11 +2,26 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, func
 from sqlalchemy.orm import selectinload
-from datetime import datetime, time, timedelta
+from datetime import datetime
+from uuid import UUID
 # Asegúrate de que los modelos y esquemas están correctamente importados
-from ..models import Reservation, Locale, ReservationStatus, User 
-from ..schemas import ReservationCreate, ReservationOut
-from ..dependencies import get_current_user, get_async_session 
+from ..models import Reservation, Locale, ReservationSeries, ReservationStatus, User 
+from ..schemas import ReservationCreate, ReservationOut, ReservationSeriesCreate, ReservationSeriesOut, ReservationSeriesUpdate
+from ..dependencies import get_current_user, get_async_session, get_user_read_session
+from ..sql_budget import query_budget
+from ..conflicts import find_approved_overlap
+from ..capacity import FULL_DETAIL, has_room
+from .. import availability_cache, replicas
+from ..events import publish_reservation_changes
+from ..mailer import enqueue_reservation_notices
+from ..partitions import ensure_partitions, reservations_source
+from ..idempotency import Idempotency, idempotency
+from ..fastjson import columns, rows_response
+from ..series import (
+    Occurrence, SeriesError, cancel_series, check_occurrences, expand, insert_series, reschedule,
+    update_series, upcoming_occurrences,
+)
+from .locales import locale_schedule
 # Asumo que tienes un esquema para la salida del historial que incluye nombre de usuario y local.
 # Si no lo tienes, usa ReservationOut y lo mapearemos después. Para este ejemplo, usaré un esquema nuevo simple.
 
@@ -23,16 +38,26 @@ router = APIRouter(
 # 🚀 CREACIÓN DE RESERVA (CON VALIDACIÓN DE HORARIO Y CORRECCIÓN DE DATETIME)
 # ====================================================================
 
-@router.post("/", response_model=ReservationOut, status_code=status.HTTP_201_CREATED)
+# Presupuestos: +2 idas y vueltas por la Idempotency-Key (reservarla y guardar la respuesta);
+# un local compartido suma 1 (bloqueo del local antes de medir la capacidad)
+@router.post("/", response_model=ReservationOut, status_code=status.HTTP_201_CREATED,
+             dependencies=[query_budget(9)])
 async def create_reservation(
     data: ReservationCreate,
     current_user=Depends(get_current_user),
     # Cambié el uso de async_session() as session por una dependencia para mejor integración con FastAPI
-    session: AsyncSession = Depends(get_async_session) 
+    session: AsyncSession = Depends(get_async_session),
+    idem: Idempotency = Depends(idempotency("create_reservation")),
 ):
     """
     Crea una nueva reserva (estado pendiente por defecto) validando que esté dentro del horario del local.
+    Con la cabecera Idempotency-Key, un reintento devuelve la misma reserva en lugar de crear otra.
     """
+    return await idem.run(lambda: _create_reservation(data, current_user, session, idem),
+                          status_code=status.HTTP_201_CREATED, response_model=ReservationOut)
+
+
+async def _create_reservation(data: ReservationCreate, current_user, session: AsyncSession, idem: Idempotency):
 
     # 1. ⚠️ CORRECCIÓN CLAVE: Hacer los datetimes 'naive' (sin zona horaria)
     # Esto resuelve el error "can't subtract offset-naive and offset-aware datetimes" en PostgreSQL.
@@ -48,35 +73,30 @@ async def create_reservation(
     if not locale or not locale.active:
         raise HTTPException(status_code=404, detail="Local no encontrado o inactivo.")
 
-    # 4. Verificar Horario de Operación del Local (Lógica de horarios)
-    
-    # Intenta convertir open_time/close_time a objetos time si son strings (como es común en modelos)
-    try:
-        if isinstance(locale.open_time, time):
-            open_t = locale.open_time
-            close_t = locale.close_time
-        else:
-            open_t = datetime.strptime(str(locale.open_time), "%H:%M:%S").time() # Asumiendo formato HH:MM:SS
-            close_t = datetime.strptime(str(locale.close_time), "%H:%M:%S").time()
-    except (ValueError, TypeError):
-        raise HTTPException(status_code=500, detail="Horario del local mal configurado en la base de datos.")
-    
-    # Combina la fecha de la reserva con los horarios del local para crear rangos Naive
-    reservation_date = start_dt_naive.date()
-    locale_start_dt = datetime.combine(reservation_date, open_t)
-    locale_end_dt_time = datetime.combine(reservation_date, close_t)
-    
-    # Manejar cierre al día siguiente (ej: 22:00 a 06:00)
-    if locale_end_dt_time <= locale_start_dt:
-        locale_end_dt = locale_end_dt_time + timedelta(days=1)
-    else:
-        locale_end_dt = locale_end_dt_time
+    # 4. Verificar Horario de Operación del Local: horario semanal, excepciones y
+    # cierres, compilado una vez por local (schedules.py)
+    schedule = locale_schedule(locale)
+    if not schedule.contains(start_dt_naive, end_dt_naive):
+        raise HTTPException(status_code=400, detail=schedule.outside_detail(start_dt_naive, end_dt_naive))
 
-    # La comparación ahora es válida porque todos los datetimes son Naive
-    if not (locale_start_dt <= start_dt_naive and end_dt_naive <= locale_end_dt):
-        raise HTTPException(status_code=400, detail=f"La reserva está fuera del horario de operación del local ({open_t.strftime('%H:%M')} a {close_t.strftime('%H:%M')}).")
+    # La partición mensual (si es un mes lejano) se crea ANTES de leer reservations:
+    # su DDL espera a las transacciones que ya la leyeron, también a esta
+    await ensure_partitions(start_dt_naive)
 
-    # 5. Crear y Guardar la Reserva
+    # 5. Rechazo temprano si el horario ya está tomado por una reserva APROBADA
+    # (consulta por índice GiST sobre `during`, no recorre la tabla).
+    # En locales compartidos, en cambio, que los asistentes quepan (capacity.py).
+    headcount = None
+    if locale.shared_capacity:
+        headcount = data.headcount or 1
+        if headcount > (locale.capacity or 0):
+            raise HTTPException(status_code=400, detail=f"El local admite como máximo {locale.capacity or 0} personas.")
+        if not await has_room(session, locale, headcount, start_dt_naive, end_dt_naive):
+            raise HTTPException(status_code=409, detail=FULL_DETAIL)
+    elif await find_approved_overlap(session, data.locale_id, start_dt_naive, end_dt_naive):
+        raise HTTPException(status_code=409, detail="El horario se solapa con una reserva ya aprobada.")
+
+    # 6. Crear y Guardar la Reserva (en su partición mensual)
     new_res = Reservation(
         locale_id=data.locale_id,
         user_id=current_user.id,
@@ -84,58 +104,80 @@ async def create_reservation(
         end_dt=end_dt_naive,     # ⬅️ USAR LA VERSIÓN NAIVE
         motive=data.motive,
         status=ReservationStatus.pending, # Usar el Enum si está disponible
-        priority=9
+        priority=9,
+        headcount=headcount,
     )
     
     session.add(new_res)
+    await session.flush()  # ← obtiene el id para el evento
+    await publish_reservation_changes(session, "reservation_created", [new_res])
+    await enqueue_reservation_notices(session, "reservation_created", [new_res])  # el correo sale del worker
+    await idem.save(session, new_res)   # la respuesta de la Idempotency-Key, en el mismo commit
     await session.commit()
-    await session.refresh(new_res)
+    replicas.pin(replicas.user_key(current_user.id))
+    availability_cache.invalidate(new_res.locale_id, start_dt_naive, end_dt_naive)
+    # Sin refresh: expire_on_commit=False y el INSERT ya devolvió id y defaults
     return new_res
 
 # ====================================================================
 # 📚 OBTENER MIS RESERVAS
 # ====================================================================
 
-@router.get("/my", response_model=list[ReservationOut])
-async def my_reservations(
-    current_user=Depends(get_current_user),
-    session: AsyncSession = Depends(get_async_session)
-):
-    """Reservas del usuario a partir de hoy (futuras)."""
-    stmt = (
-        select(Reservation)
+# Ambas consultas recorren ix_reservations_user_start (user_id, start_dt) y
+# traen solo las columnas de ReservationOut (fastjson.py)
+def my_reservations_stmt(user_id, now: datetime):
+    return (
+        select(*columns(Reservation, ReservationOut))
         .where(
-            Reservation.user_id == current_user.id,
-            Reservation.start_dt >= datetime.utcnow()
+            Reservation.user_id == user_id,
+            Reservation.start_dt >= now
         )
         .order_by(Reservation.start_dt)
     )
-    res = await session.execute(stmt)
-    return res.scalars().all()
 
-@router.get("/my/history", response_model=list[ReservationOut])
+def my_history_stmt(user_id, now: datetime):
+    R = reservations_source()  # el historial completo incluye los meses archivados
+    return (
+        select(*columns(R, ReservationOut))
+        .where(
+            R.user_id == user_id,
+            R.start_dt < now
+        )
+        .order_by(desc(R.start_dt))  # más reciente primero
+    )
+
+@router.get("/my", response_model=list[ReservationOut], dependencies=[query_budget(2)])
+async def my_reservations(
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_user_read_session)
+):
+    """Reservas del usuario a partir de hoy (futuras)."""
+    stmt = my_reservations_stmt(current_user.id, datetime.utcnow())
+    rows = (await session.execute(stmt)).all()
+    return rows_response(rows, ReservationOut)
+
+@router.get("/my/history", response_model=list[ReservationOut], dependencies=[query_budget(2)])
 async def my_history(
     current_user=Depends(get_current_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_user_read_session)
 ):
     """Reservas PASADAS del usuario autenticado."""
-    stmt = (
-        select(Reservation)
-        .where(
-            Reservation.user_id == current_user.id,
-            Reservation.start_dt < datetime.utcnow()
-        )
-        .order_by(desc(Reservation.start_dt))  # más reciente primero
-    )
-    res = await session.execute(stmt)
-    return res.scalars().all()
+    stmt = my_history_stmt(current_user.id, datetime.utcnow())
+    rows = (await session.execute(stmt)).all()
+    return rows_response(rows, ReservationOut)
 
-@router.delete("/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[query_budget(6)])
 async def cancel_reservation(
     reservation_id: str,
     current_user=Depends(get_current_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_async_session),
+    idem: Idempotency = Depends(idempotency("cancel_reservation")),
 ):
+    return await idem.run(lambda: _cancel_reservation(reservation_id, current_user, session, idem),
+                          status_code=status.HTTP_204_NO_CONTENT)
+
+
+async def _cancel_reservation(reservation_id: str, current_user, session: AsyncSession, idem: Idempotency):
     # 1. Verificar que la reserva existe y pertenece al usuario
     stmt = select(Reservation).where(
         Reservation.id == reservation_id,
@@ -152,9 +194,163 @@ async def cancel_reservation(
         raise HTTPException(status_code=400, detail="No se puede cancelar una reserva pasada")
 
     # 3. Marcar como cancelada (o eliminar, según tu lógica)
-    reservation.status = "cancelled"
+    reservation.status = ReservationStatus.cancelled
+    await publish_reservation_changes(session, "status_changed", [reservation])
+    await idem.save(session, None)
     await session.commit()
+    replicas.pin(replicas.user_key(current_user.id))
+    availability_cache.invalidate(reservation.locale_id, reservation.start_dt, reservation.end_dt)
 
     # 204 No Content → Angular no espera cuerpo
     return None
 
+
+# ====================================================================
+# 🔁 SERIES DE RESERVAS RECURRENTES (ver series.py)
+# ====================================================================
+
+def _occurrences_out(occurrences: list[Occurrence]) -> list[dict]:
+    return [
+        {"start_dt": o.start_dt, "end_dt": o.end_dt, "result": o.result, "reservation_id": o.reservation_id}
+        for o in occurrences
+    ]
+
+def _dates(occurrences: list[Occurrence], limit: int = 10) -> str:
+    shown = ", ".join(o.start_dt.date().isoformat() for o in occurrences[:limit])
+    return shown + (f" y {len(occurrences) - limit} más" if len(occurrences) > limit else "")
+
+@router.post("/series", response_model=ReservationSeriesOut, status_code=status.HTTP_201_CREATED,
+             dependencies=[query_budget(10)])
+async def create_reservation_series(
+    data: ReservationSeriesCreate,
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+    idem: Idempotency = Depends(idempotency("create_reservation_series")),
+):
+    """
+    Crea todas las fechas de un patrón semanal o diario en una sola petición.
+    Las fechas ocupadas, llenas o pasadas no se crean; la respuesta trae el
+    resultado de cada una.
+    """
+    return await idem.run(lambda: _create_reservation_series(data, current_user, session, idem),
+                          status_code=status.HTTP_201_CREATED, response_model=ReservationSeriesOut)
+
+
+async def _create_reservation_series(data: ReservationSeriesCreate, current_user, session: AsyncSession,
+                                     idem: Idempotency):
+    start_dt = data.start_dt.replace(tzinfo=None)
+    end_dt = data.end_dt.replace(tzinfo=None)
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=400, detail="La hora de inicio debe ser anterior a la hora de fin.")
+
+    locale = await session.get(Locale, data.locale_id)
+    if not locale or not locale.active:
+        raise HTTPException(status_code=404, detail="Local no encontrado o inactivo.")
+
+    try:
+        occurrences = expand(start_dt, end_dt, freq=data.freq, interval=data.interval, weekdays=data.weekdays,
+                             until=data.until, count=data.count, exceptions=data.exceptions)
+    except SeriesError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    # El horario puede cambiar según el día de la semana, festivos o cierres
+    schedule = locale_schedule(locale)
+    for o in occurrences:
+        if not schedule.contains(o.start_dt, o.end_dt):
+            o.result = "closed"
+
+    headcount = None
+    if locale.shared_capacity:
+        headcount = data.headcount or 1
+        if headcount > (locale.capacity or 0):
+            raise HTTPException(status_code=400, detail=f"El local admite como máximo {locale.capacity or 0} personas.")
+
+    await ensure_partitions(*(o.start_dt for o in occurrences))   # antes de leer reservations
+    await check_occurrences(session, locale, occurrences, headcount, datetime.utcnow())
+    free = [o for o in occurrences if o.result == "created"]
+    if not free:
+        raise HTTPException(status_code=409, detail="Ninguna fecha de la serie está disponible.")
+
+    rule = data.model_dump(mode="json", include={"freq", "interval", "weekdays", "until", "count", "exceptions"})
+    series_id, rows = await insert_series(session, locale, current_user.id, rule, data.motive, headcount, free)
+    await publish_reservation_changes(session, "reservation_created", rows)
+    await enqueue_reservation_notices(session, "reservation_created", rows)
+    response = {"id": series_id, "created": len(rows), "occurrences": _occurrences_out(occurrences)}
+    await idem.save(session, response)
+    await session.commit()
+    replicas.pin(replicas.user_key(current_user.id))
+    for r in rows:
+        availability_cache.invalidate(r.locale_id, r.start_dt, r.end_dt)
+    return response
+
+
+async def _own_series(session: AsyncSession, series_id: UUID, current_user) -> ReservationSeries:
+    series = await session.get(ReservationSeries, series_id)
+    if not series or series.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Serie no encontrada o no autorizada")
+    return series
+
+
+@router.patch("/series/{series_id}", dependencies=[query_budget(9)])
+async def update_reservation_series(
+    series_id: UUID,
+    changes: ReservationSeriesUpdate,
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Cambia el motivo y/o el horario de todas las reservas futuras de la serie.
+    Un cambio de horario se comprueba para todas las fechas a la vez: si alguna
+    choca no se cambia ninguna (409), y las movidas vuelven a 'pending'.
+    """
+    series = await _own_series(session, series_id, current_user)
+    now = datetime.utcnow()
+    moves = None
+    if changes.start_time or changes.end_time:
+        locale = await session.get(Locale, series.locale_id)
+        current = await upcoming_occurrences(session, series_id, now)
+        if not current:
+            return {"id": series_id, "updated": 0}
+        schedule = locale_schedule(locale)
+        occurrences = []
+        for n, r in enumerate(current):
+            start, end = reschedule(r.start_dt, r.end_dt, changes.start_time, changes.end_time)
+            if not schedule.contains(start, end):
+                raise HTTPException(status_code=400, detail=f"{start.date().isoformat()}: {schedule.outside_detail(start, end)}")
+            occurrences.append(Occurrence(n, start, end, reservation_id=r.id))
+        await check_occurrences(session, locale, occurrences, current[0].headcount, now, exclude_series_id=series_id)
+        blocked = [o for o in occurrences if o.result != "created"]
+        if blocked:
+            raise HTTPException(status_code=409, detail=f"El nuevo horario no está disponible: {_dates(blocked)}.")
+        moves = {o.reservation_id: (o.start_dt, o.end_dt) for o in occurrences}
+    elif changes.motive is None:
+        raise HTTPException(status_code=400, detail="Nada que cambiar.")
+
+    old = {r.id: r for r in current} if moves else {}
+    rows = await update_series(session, series_id, now, changes.motive, moves)
+    if moves:
+        await publish_reservation_changes(session, "status_changed", rows)
+    await session.commit()
+    replicas.pin(replicas.user_key(current_user.id))
+    for r in rows:
+        if r.id in old:
+            availability_cache.invalidate(r.locale_id, old[r.id].start_dt, old[r.id].end_dt)
+        availability_cache.invalidate(r.locale_id, r.start_dt, r.end_dt)
+    return {"id": series_id, "updated": len(rows)}
+
+
+@router.delete("/series/{series_id}", dependencies=[query_budget(4)])
+async def cancel_reservation_series(
+    series_id: UUID,
+    current_user=Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Cancela de una vez todas las reservas futuras de la serie."""
+    await _own_series(session, series_id, current_user)
+    rows = await cancel_series(session, series_id, datetime.utcnow())
+    await publish_reservation_changes(session, "status_changed", rows)
+    await session.commit()
+    replicas.pin(replicas.user_key(current_user.id))
+    for r in rows:
+        availability_cache.invalidate(r.locale_id, r.start_dt, r.end_dt)
+    return {"id": series_id, "cancelled": len(rows)}
@@ -0,0 +1,240 @@
+# backend/app/schedules.py
+"""
+Horario de apertura de cada local, compilado una vez y guardado en memoria.
+
+    SCHEDULE_CACHE_SIZE   locales compilados que se guardan (1000)
+    SCHEDULE_CACHE_TTL    segundos que dura cada uno (3600)
+
+`Locale.schedule` (JSONB, ver schemas.LocaleSchedule) admite:
+
+    hours        tramos por día de la semana (0 = lunes); varios por día
+                 para horario partido; un día sin tramos está cerrado
+    exceptions   fechas con otro horario (sin tramos = cerrado, p. ej. festivos)
+    blackouts    periodos [inicio, fin) en que el local no se puede reservar
+
+Sin `schedule` vale open_time/close_time todos los días, como siempre. Como
+en opening_window, un tramo cuyo cierre no es posterior a la apertura termina
+al día siguiente.
+
+`compile_schedule` lo convierte en un Schedule con:
+
+- los tramos semanales en segundos desde el lunes 00:00, fusionados y
+  ordenados (los que pasan del domingo se repiten al principio); un tramo
+  que sigue pasada la medianoche pertenece al día en que abre;
+- las excepciones por fecha, ya como datetimes;
+- los cierres fusionados y ordenados.
+
+Así `contains` (validar una reserva) es una búsqueda binaria en los tramos y
+otra en los cierres, sin parsear nada por petición. `schedule_for` lo cachea
+por local junto con el horario del que salió: si la fila cambió (otro worker
+editó el local) se recompila al verla; admin.py además llama a
+`invalidate()` al editar.
+"""
+import os
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from uuid import UUID
+
+from .cache import TTLLRUCache
+from .models import Locale
+
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "1000"))
+SCHEDULE_CACHE_TTL = float(os.getenv("SCHEDULE_CACHE_TTL", "3600"))
+
+DAY = 86400
+WEEK = 7 * DAY
+
+Interval = tuple[datetime, datetime]
+
+
+def parse_time(value) -> time:
+    """time, "HH:MM" o "HH:MM:SS" (la BD y los formularios de admin traen cualquiera)."""
+    if isinstance(value, time):
+        return value
+    text = str(value)
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).time()
+        except ValueError:
+            pass
+    raise ValueError(f"Hora no válida: {text!r} (se espera HH:MM)")
+
+
+def _seconds(t: time) -> int:
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def _span(open_s: int, close_s: int) -> tuple[int, int]:
+    return (open_s, close_s) if close_s > open_s else (open_s, close_s + DAY)
+
+
+def _merge(spans: list[tuple]) -> list[tuple]:
+    """Ordena y fusiona tramos (también los contiguos)."""
+    merged: list[tuple] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+@dataclass(frozen=True)
+class Schedule:
+    starts: list[int]                                   # tramos semanales, segundos desde el lunes
+    ends: list[int]
+    exceptions: dict[date, list[Interval]] = field(default_factory=dict)
+    blackout_starts: list[datetime] = field(default_factory=list)
+    blackout_ends: list[datetime] = field(default_factory=list)
+    blackout_reasons: list[str | None] = field(default_factory=list)
+
+    # ---------- CONSULTAS ----------
+
+    def _weekly(self, day: date) -> list[Interval]:
+        base = datetime.combine(day, time()) - timedelta(days=day.weekday())
+        lo, hi = day.weekday() * DAY, (day.weekday() + 1) * DAY
+        i = bisect_right(self.starts, lo - 1)
+        spans = []
+        while i < len(self.starts) and self.starts[i] < hi:
+            spans.append((base + timedelta(seconds=self.starts[i]), base + timedelta(seconds=self.ends[i])))
+            i += 1
+        return spans
+
+    def opening(self, day: date) -> list[Interval]:
+        """Tramos que abren ese día, sin descontar cierres."""
+        if day in self.exceptions:
+            return self.exceptions[day]
+        return self._weekly(day)
+
+    def blackout_at(self, start: datetime, end: datetime) -> int | None:
+        """Índice del primer cierre que toca [start, end), o None."""
+        i = bisect_right(self.blackout_ends, start)
+        if i < len(self.blackout_starts) and self.blackout_starts[i] < end:
+            return i
+        return None
+
+    def contains(self, start: datetime, end: datetime) -> bool:
+        """Si [start, end) cae entero dentro de un tramo abierto y no toca ningún cierre."""
+        if self.blackout_at(start, end) is not None:
+            return False
+        day = start.date()
+        previous = day - timedelta(days=1)
+        if day in self.exceptions or previous in self.exceptions:
+            return any(s <= start and end <= e for s, e in self.opening(previous) + self.opening(day))
+        offset = (start - datetime.combine(day, time())).total_seconds() + day.weekday() * DAY
+        i = bisect_right(self.starts, offset) - 1
+        return i >= 0 and offset + (end - start).total_seconds() <= self.ends[i]
+
+    def day_windows(self, day: date) -> list[Interval]:
+        """Tramos reservables de ese día: los de apertura menos los cierres, en orden."""
+        windows = []
+        for start, end in self.opening(day):
+            i = bisect_right(self.blackout_ends, start)
+            while i < len(self.blackout_starts) and self.blackout_starts[i] < end:
+                if start < self.blackout_starts[i]:
+                    windows.append((start, self.blackout_starts[i]))
+                start = max(start, self.blackout_ends[i])
+                i += 1
+            if start < end:
+                windows.append((start, end))
+        return windows
+
+    def describe(self, day: date) -> str:
+        spans = self.opening(day)
+        if not spans:
+            return "cerrado ese día"
+        return ", ".join(f"{s.strftime('%H:%M')} a {e.strftime('%H:%M')}" for s, e in spans)
+
+    def outside_detail(self, start: datetime, end: datetime) -> str:
+        """Mensaje para una reserva que `contains` rechazó."""
+        i = self.blackout_at(start, end)
+        if i is not None:
+            reason = self.blackout_reasons[i]
+            return "El local está cerrado en ese horario" + (f" ({reason})." if reason else ".")
+        return f"La reserva está fuera del horario de operación del local ({self.describe(start.date())})."
+
+
+# ---------- COMPILAR ----------
+
+def _source(locale: Locale):
+    return (locale.open_time, locale.close_time, locale.schedule)
+
+
+def compile_schedule(locale: Locale) -> Schedule:
+    """ValueError si el horario del local no se puede interpretar."""
+    open_time, close_time, schedule = _source(locale)
+    if schedule is None:
+        hours = [(d, parse_time(open_time), parse_time(close_time)) for d in range(7)]
+    else:
+        hours = [(h["weekday"], parse_time(h["open_time"]), parse_time(h["close_time"]))
+                 for h in schedule.get("hours", [])]
+
+    weekly = []
+    for weekday, open_t, close_t in hours:
+        start, end = _span(_seconds(open_t), _seconds(close_t))
+        weekly.append((weekday * DAY + start, weekday * DAY + end))
+    # Dos semanas seguidas para que el domingo por la noche se una al lunes de
+    # madrugada; lo que pasa del domingo se repite al principio (antes del lunes)
+    weekly = [w for w in _merge(weekly + [(s + WEEK, e + WEEK) for s, e in weekly]) if w[0] < WEEK]
+    carried = [(s - WEEK, e - WEEK) for s, e in weekly if e > WEEK]
+    weekly = carried + [w for w in weekly if not any(c[0] <= w[0] and w[1] <= c[1] for c in carried)]
+
+    exceptions = {}
+    for exc in (schedule or {}).get("exceptions", []):
+        day = date.fromisoformat(exc["day"])
+        midnight = datetime.combine(day, time())
+        spans = []
+        for h in exc.get("intervals", []):
+            start, end = _span(_seconds(parse_time(h["open_time"])), _seconds(parse_time(h["close_time"])))
+            spans.append((midnight + timedelta(seconds=start), midnight + timedelta(seconds=end)))
+        exceptions[day] = _merge(spans)
+
+    blackouts: list[list] = []
+    for start, end, reason in sorted(
+        (datetime.fromisoformat(b["start_dt"]).replace(tzinfo=None),
+         datetime.fromisoformat(b["end_dt"]).replace(tzinfo=None),
+         b.get("reason"))
+        for b in (schedule or {}).get("blackouts", [])
+    ):
+        if blackouts and start <= blackouts[-1][1]:
+            blackouts[-1][1] = max(blackouts[-1][1], end)
+            blackouts[-1][2] = blackouts[-1][2] or reason
+        else:
+            blackouts.append([start, end, reason])
+
+    return Schedule(
+        starts=[s for s, _ in weekly],
+        ends=[e for _, e in weekly],
+        exceptions=exceptions,
+        blackout_starts=[b[0] for b in blackouts],
+        blackout_ends=[b[1] for b in blackouts],
+        blackout_reasons=[b[2] for b in blackouts],
+    )
+
+
+# ---------- CACHÉ ----------
+
+_cache = TTLLRUCache(maxsize=SCHEDULE_CACHE_SIZE, ttl=SCHEDULE_CACHE_TTL)
+compiles = 0
+
+
+def schedule_for(locale: Locale) -> Schedule:
+    """Horario compilado del local; solo compila si no está en caché o la fila cambió."""
+    global compiles
+    source = _source(locale)
+    cached = _cache.get(locale.id)
+    if cached is not None and cached[0] == source:
+        return cached[1]
+    schedule = compile_schedule(locale)
+    compiles += 1
+    _cache.set(locale.id, (source, schedule))
+    return schedule
+
+
+def invalidate(locale_id: UUID) -> None:
+    _cache.pop(locale_id)
+
+
+def schedule_cache_stats() -> dict:
+    return {**_cache.stats(), "compiles": compiles}
@@ -1,9 +1,9 @@
 #backend/app/schemas.py
-from pydantic import BaseModel, EmailStr
-from datetime import datetime, time
+from pydantic import BaseModel, EmailStr, Field
+from datetime import date, datetime, time
 from uuid import UUID
-from .enums import ReservationStatus   # si quieres restringir valores
-from typing import Optional
+from .enums import ReservationStatus, UserRole   # si quieres restringir valores
+from typing import Literal, Optional
 
 # ---------- AUTH ----------
 class UserCreate(BaseModel):
@@ -15,15 +15,45 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class UserAccessUpdate(BaseModel):
+    """Cuerpo de PATCH /api/admin/users/{user_id}: solo lo que llegue cambia."""
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+
 # ---------- LOCALES ----------
+class OpeningHours(BaseModel):
+    open_time: time
+    close_time: time                      # si no es posterior a open_time, cierra al día siguiente
+
+class WeeklyHours(OpeningHours):
+    weekday: int = Field(..., ge=0, le=6)  # 0 = lunes
+
+class ScheduleException(BaseModel):
+    day: date
+    intervals: list[OpeningHours] = []    # vacío = cerrado todo el día
+    reason: Optional[str] = None
+
+class Blackout(BaseModel):
+    start_dt: datetime
+    end_dt: datetime
+    reason: Optional[str] = None
+
+class LocaleSchedule(BaseModel):
+    """Locale.schedule: horario semanal, fechas con otro horario y cierres (ver schedules.py)."""
+    hours: list[WeeklyHours] = []
+    exceptions: list[ScheduleException] = []
+    blackouts: list[Blackout] = []
+
 class LocaleOut(BaseModel):
     id: str
     name: str
     description: str
     capacity: int
+    shared_capacity: bool = False   # varias reservas a la vez hasta llenar `capacity`
     location: str
     open_time: str          # ← string, no time
     close_time: str         # ← string, no time
+    schedule: Optional[LocaleSchedule] = None   # sin él: open_time a close_time todos los días
     imagen_url: str         # ← imagen_url, no imagen
 
     class Config:
@@ -36,12 +66,57 @@ class ReservationCreate(BaseModel):
     start_dt: datetime
     end_dt: datetime
     motive: str
+    headcount: Optional[int] = Field(None, ge=1)   # solo locales compartidos; por defecto 1
 
 class ReservationStatusUpdate(BaseModel):
     """Modelo para recibir el cuerpo JSON en la ruta PATCH de status."""
     # Esto espera el JSON: {"status": "approved"}
     status: ReservationStatus
 
+class ReservationBulkItem(BaseModel):
+    """Un elemento de POST /api/admin/reservations/bulk-status."""
+    id: UUID
+    status: ReservationStatus
+    priority: Optional[int] = None
+
+# ---------- SERIES ----------
+class ReservationSeriesCreate(BaseModel):
+    """Cuerpo de POST /api/reservations/series (patrón parecido a RRULE; ver series.py)."""
+    locale_id: UUID
+    start_dt: datetime                    # primera fecha; hora y duración de todas
+    end_dt: datetime
+    motive: str
+    headcount: Optional[int] = Field(None, ge=1)
+    freq: Literal["daily", "weekly"] = "weekly"
+    interval: int = Field(1, ge=1, le=52)
+    weekdays: list[int] = []              # solo weekly; 0 = lunes. Vacío: el día de start_dt
+    until: Optional[date] = None          # inclusive
+    count: Optional[int] = Field(None, ge=1)
+    exceptions: list[date] = []
+
+class ReservationSeriesUpdate(BaseModel):
+    """Cuerpo de PATCH /api/reservations/series/{id}: se aplica a sus reservas futuras."""
+    motive: Optional[str] = None
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None
+
+class SeriesOccurrenceOut(BaseModel):
+    start_dt: datetime
+    end_dt: datetime
+    result: str                           # created | overlap | full | past | closed
+    reservation_id: Optional[UUID] = None
+
+class ReservationSeriesOut(BaseModel):
+    id: UUID
+    created: int
+    occurrences: list[SeriesOccurrenceOut]
+
+# ---------- TRABAJOS ----------
+class JobCreate(BaseModel):
+    """Cuerpo de POST /api/admin/jobs."""
+    type: str
+    params: dict = {}
+
 class ReservationOut(BaseModel):
     id: UUID
     locale_id: UUID
@@ -51,6 +126,7 @@ class ReservationOut(BaseModel):
     motive: str
     status: str          # o  status: ReservationStatus
     priority: int
+    headcount: Optional[int] = None
 
     class Config:
         from_attributes = True   # V2
@@ -89,10 +165,26 @@ class ReservationDisplay(TimeSlot):
     locale_name: Optional[str] = None
     display_text: Optional[str] = None
 
+# Tramo con las plazas que quedan (locales de capacidad compartida)
+class CapacitySlot(TimeSlot):
+    remaining: int
+
 # Esquema de Respuesta para la Disponibilidad
 class AvailabilityResponse(BaseModel):
     # Los horarios ocupados (reservas confirmadas o pendientes)
     occupied_slots: list[TimeSlot]
     # Los horarios que el local está abierto pero no reservado
+    # (en locales compartidos: los que aún tienen plazas)
     available_slots: list[TimeSlot]
+    # Solo locales compartidos: capacidad y plazas libres de cada tramo del día
+    capacity: Optional[int] = None
+    capacity_slots: list[CapacitySlot] = []
+
+# GET /api/locales/search: primeros huecos libres entre todos los locales
+class SlotSuggestion(TimeSlot):
+    locale_id: UUID
+    locale_name: str
+    location: Optional[str] = None
+    free_until: datetime                  # el hueco sigue libre hasta aquí
+    remaining: Optional[int] = None       # solo locales compartidos: plazas libres
 
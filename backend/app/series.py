@@ -0,0 +1,268 @@
+# backend/app/series.py
+"""
+Series de reservas recurrentes (POST /api/reservations/series).
+
+    SERIES_MAX_OCCURRENCES   máximo de fechas por serie (200)
+
+Patrón, parecido a una RRULE (ReservationSeriesCreate):
+
+    freq         "daily" | "weekly"
+    interval     cada cuántos días o semanas (1)
+    weekdays     solo weekly: días de la semana, 0 = lunes (por defecto el de start_dt)
+    until/count  hasta esa fecha (inclusive) o ese número de fechas; al menos uno
+    exceptions   fechas que se saltan (cuentan para `count`, como EXDATE)
+
+Todas las fechas tienen la hora y la duración de la primera. El router marca
+como closed las que caen fuera del horario del local (schedules.py: cambia
+según el día de la semana, festivos y cierres). Después:
+
+1. `check_occurrences`: UNA consulta para todas las fechas. Un VALUES
+   (n, inicio, fin) con un EXISTS por fecha sobre el índice GiST (locales
+   normales) o con el pico de asistentes de capacity.peaks_stmt (locales
+   compartidos).
+2. `insert_series`: la fila de reservation_series y UN INSERT de varias filas
+   con las fechas libres.
+
+Cada fecha vuelve con su resultado: created, overlap, full, past o closed. Cancelar
+la serie o cambiar su motivo u horario es un solo UPDATE sobre sus reservas
+futuras (`cancel_series`, `update_series`). El commit lo hace quien llama.
+"""
+import itertools
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Iterator
+from uuid import UUID
+
+from sqlalchemy import DateTime, cast, column, exists, func, insert, literal, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .capacity import ACTIVE, lock_locale, peaks_stmt, windows_values
+from .enums import ReservationStatus
+from .models import Locale, Reservation, ReservationSeries
+
+SERIES_MAX_OCCURRENCES = int(os.getenv("SERIES_MAX_OCCURRENCES", "200"))
+
+_RETURNING = (
+    Reservation.id, Reservation.locale_id, Reservation.user_id,
+    Reservation.start_dt, Reservation.end_dt, Reservation.status,
+)
+
+
+class SeriesError(ValueError):
+    """Patrón imposible de expandir; el router lo devuelve como 400."""
+
+
+@dataclass
+class Occurrence:
+    n: int
+    start_dt: datetime
+    end_dt: datetime
+    result: str = "created"          # created | overlap | full | past | closed
+    reservation_id: UUID | None = None
+
+
+# ---------- EXPANDIR ----------
+
+def _starts(first: datetime, freq: str, interval: int, weekdays: list[int]) -> Iterator[datetime]:
+    if freq == "daily":
+        for i in itertools.count():
+            yield first + timedelta(days=i * interval)
+    days = sorted(set(weekdays)) or [first.weekday()]
+    monday = first - timedelta(days=first.weekday())
+    for week in itertools.count(0, interval):
+        for day in days:
+            start = monday + timedelta(weeks=week, days=day)
+            if start >= first:
+                yield start
+
+
+def expand(
+    start_dt: datetime,
+    end_dt: datetime,
+    *,
+    freq: str = "weekly",
+    interval: int = 1,
+    weekdays: list[int] = (),
+    until: date | None = None,
+    count: int | None = None,
+    exceptions: list[date] = (),
+) -> list[Occurrence]:
+    """Fechas de la serie, en orden. SeriesError si el patrón no sirve."""
+    if until is None and count is None:
+        raise SeriesError("Indique 'until' o 'count'.")
+    if any(d not in range(7) for d in weekdays):
+        raise SeriesError("weekdays va de 0 (lunes) a 6 (domingo).")
+    duration = end_dt - start_dt
+    skip = set(exceptions)
+    occurrences = []
+    for i, start in enumerate(_starts(start_dt, freq, interval, list(weekdays))):
+        if (count is not None and i >= count) or (until is not None and start.date() > until):
+            break
+        if i >= SERIES_MAX_OCCURRENCES:
+            raise SeriesError(f"Una serie admite como máximo {SERIES_MAX_OCCURRENCES} fechas.")
+        if start.date() not in skip:
+            occurrences.append(Occurrence(len(occurrences), start, start + duration))
+    if not occurrences:
+        raise SeriesError("La serie no tiene ninguna fecha.")
+    return occurrences
+
+
+# ---------- COMPROBAR ----------
+
+async def check_occurrences(
+    session: AsyncSession,
+    locale: Locale,
+    occurrences: list[Occurrence],
+    headcount: int | None,
+    now: datetime,
+    exclude_series_id: UUID | None = None,
+) -> None:
+    """
+    Marca en cada fecha si cabe (result queda en "created") o por qué no. Como
+    al crear una reserva suelta: en locales normales solo bloquean las
+    aprobadas; en compartidos cuentan pendientes y aprobadas.
+    """
+    for o in occurrences:
+        if o.start_dt < now:
+            o.result = "past"
+    candidates = {o.n: o for o in occurrences if o.result == "created"}
+    if not candidates:
+        return
+    windows = windows_values([(o.n, o.start_dt, o.end_dt) for o in candidates.values()])
+
+    if locale.shared_capacity:
+        capacity = locale.capacity or 0
+        await lock_locale(session, locale.id)
+        peaks = await session.execute(
+            peaks_stmt(locale.id, capacity, windows, ACTIVE, exclude_series_id=exclude_series_id)
+        )
+        for n, peak in peaks:
+            if peak + headcount > capacity:
+                candidates[n].result = "full"
+        return
+
+    blocked = exists().where(
+        Reservation.locale_id == locale.id,
+        Reservation.status == ReservationStatus.approved,
+        Reservation.during.op("&&")(func.tsrange(windows.c.start_dt, windows.c.end_dt, literal("[)"))),
+    )
+    if exclude_series_id is not None:
+        blocked = blocked.where(Reservation.series_id.is_distinct_from(exclude_series_id))
+    for n in (await session.execute(select(windows.c.n).where(blocked))).scalars():
+        candidates[n].result = "overlap"
+
+
+# ---------- ESCRIBIR ----------
+
+async def insert_series(
+    session: AsyncSession,
+    locale: Locale,
+    user_id: UUID,
+    rule: dict,
+    motive: str,
+    headcount: int | None,
+    occurrences: list[Occurrence],
+) -> tuple[UUID, list]:
+    """
+    Crea la serie y sus reservas pendientes; devuelve el id y las filas
+    insertadas. Las particiones de sus meses ya deben existir (ensure_partitions
+    antes de check_occurrences).
+    """
+    series_id = await session.scalar(
+        insert(ReservationSeries)
+        .values(user_id=user_id, locale_id=locale.id, rule=rule)
+        .returning(ReservationSeries.id)
+    )
+    rows = (await session.execute(
+        insert(Reservation.__table__)
+        .values([
+            {
+                "locale_id": locale.id,
+                "user_id": user_id,
+                "start_dt": o.start_dt,
+                "end_dt": o.end_dt,
+                "motive": motive,
+                "status": ReservationStatus.pending,
+                "priority": 9,
+                "headcount": headcount,
+                "series_id": series_id,
+            }
+            for o in occurrences
+        ])
+        .returning(*_RETURNING)
+    )).all()
+    by_start = {o.start_dt: o for o in occurrences}
+    for r in rows:
+        by_start[r.start_dt].reservation_id = r.id
+    return series_id, rows
+
+
+def _upcoming(series_id: UUID, now: datetime):
+    return (
+        Reservation.series_id == series_id,
+        Reservation.start_dt >= now,
+        Reservation.status.in_(ACTIVE),
+    )
+
+
+async def cancel_series(session: AsyncSession, series_id: UUID, now: datetime) -> list:
+    """Cancela de una vez las reservas futuras de la serie; devuelve las filas cambiadas."""
+    return (await session.execute(
+        update(Reservation.__table__)
+        .where(*_upcoming(series_id, now))
+        .values(status=ReservationStatus.cancelled)
+        .returning(*_RETURNING)
+    )).all()
+
+
+def reschedule(start_dt: datetime, end_dt: datetime, start_time: time | None,
+               end_time: time | None) -> tuple[datetime, datetime]:
+    """Mismo día, nuevas horas; si el fin queda antes del inicio, es del día siguiente."""
+    day = start_dt.date()
+    new_start = datetime.combine(day, start_time or start_dt.time())
+    new_end = datetime.combine(day, end_time or end_dt.time())
+    if new_end <= new_start:
+        new_end += timedelta(days=1)
+    return new_start, new_end
+
+
+async def upcoming_occurrences(session: AsyncSession, series_id: UUID, now: datetime) -> list:
+    """Reservas futuras de la serie, bloqueadas hasta el commit."""
+    return (await session.execute(
+        select(Reservation.id, Reservation.start_dt, Reservation.end_dt, Reservation.headcount)
+        .where(*_upcoming(series_id, now))
+        .order_by(Reservation.start_dt)
+        .with_for_update()
+    )).all()
+
+
+async def update_series(
+    session: AsyncSession,
+    series_id: UUID,
+    now: datetime,
+    motive: str | None,
+    moves: dict[UUID, tuple[datetime, datetime]] | None = None,
+) -> list:
+    """
+    Un solo UPDATE sobre las reservas futuras: el motivo y, si hay `moves`
+    (id -> nuevo inicio y fin, ya comprobados), el horario. Las que cambian de
+    horario vuelven a 'pending' para que el admin las apruebe de nuevo.
+    """
+    stmt = update(Reservation.__table__).where(*_upcoming(series_id, now))
+    if moves:
+        v = values(
+            column("id", PG_UUID(as_uuid=True)),
+            column("start_dt", DateTime),
+            column("end_dt", DateTime),
+            name="moves",
+        ).data([(rid, s, e) for rid, (s, e) in moves.items()])
+        stmt = stmt.where(Reservation.id == cast(v.c.id, PG_UUID(as_uuid=True))).values(
+            start_dt=v.c.start_dt,
+            end_dt=v.c.end_dt,
+            status=ReservationStatus.pending,
+        )
+    if motive is not None:
+        stmt = stmt.values(motive=motive)
+    return (await session.execute(stmt.returning(*_RETURNING))).all()
@@ -0,0 +1,178 @@
+# backend/app/sql_budget.py
+"""
+Presupuesto de SQL por petición y detector de N+1.
+
+Cada petición HTTP lleva un RequestSQL en un contextvar; los eventos del engine
+van sumando:
+
+    round_trips   ejecuciones en el cursor (cada una es una ida y vuelta)
+    statements    sentencias lógicas (un executemany de 50 filas cuenta 50)
+    connections   conexiones sacadas del pool (una sesión por fila se nota aquí)
+    db_time       tiempo total dentro de la BD
+
+y la respuesta sale con la cabecera
+`Server-Timing: db;dur=3.41;desc="trips=2 stmts=2 conns=1"`,
+visible en la pestaña Network del navegador. Las filas no se cuentan: con
+asyncpg cursor.rowcount es -1 en los SELECT, así que solo se verían las
+escrituras.
+
+Las rutas declaran su presupuesto con `dependencies=[query_budget(n)]`. Si una
+petición lo supera, o repite la misma sentencia más de SQL_REPEAT_THRESHOLD
+veces (el patrón N+1), se registra un aviso y sube la métrica
+sql_budget_violations_total. Con SQL_BUDGET_ENFORCE=1 (modo test) se lanza
+una excepción en la sentencia que rompe el presupuesto, así que la prueba falla.
+"""
+import logging
+import os
+import time
+from collections import Counter as Tally
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from fastapi import Depends
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .metrics import current_route
+
+logger = logging.getLogger(__name__)
+
+SQL_BUDGET_ENFORCE = os.getenv("SQL_BUDGET_ENFORCE", "0") == "1"
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+
+ROUND_TRIPS = Histogram(
+    "http_request_db_round_trips", "Idas y vueltas a la BD por petición", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+VIOLATIONS = Counter(
+    "sql_budget_violations", "Peticiones que superaron su presupuesto o repitieron sentencias (N+1)",
+    ["route", "kind"],
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """La ruta hizo más idas y vueltas a la BD de las declaradas (solo con SQL_BUDGET_ENFORCE=1)."""
+
+
+class RepeatedQueryDetected(AssertionError):
+    """La misma sentencia se ejecutó demasiadas veces en una petición: probable N+1."""
+
+
+@dataclass
+class RequestSQL:
+    route: str
+    budget: int | None = None
+    round_trips: int = 0
+    statements: int = 0
+    connections: int = 0
+    db_time: float = 0.0
+    repeats: Tally = field(default_factory=Tally)
+    flagged: set = field(default_factory=set)
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.db_time * 1000:.2f};'
+            f'desc="trips={self.round_trips} stmts={self.statements} conns={self.connections}"'
+        )
+
+
+current_sql: ContextVar[RequestSQL | None] = ContextVar("current_sql", default=None)
+
+
+def _violation(stats: RequestSQL, kind: str, message: str, exc_type: type[AssertionError]) -> None:
+    if kind in stats.flagged:
+        return
+    stats.flagged.add(kind)
+    VIOLATIONS.labels(stats.route, kind).inc()
+    if SQL_BUDGET_ENFORCE:
+        raise exc_type(message)
+    logger.warning(message)
+
+
+def _check(stats: RequestSQL, statement: str | None = None) -> None:
+    if stats.budget is not None and stats.round_trips > stats.budget:
+        _violation(stats, "budget",
+                   f"{stats.route}: {stats.round_trips} idas y vueltas a la BD (presupuesto {stats.budget})",
+                   QueryBudgetExceeded)
+    if statement is not None and stats.repeats[statement] > SQL_REPEAT_THRESHOLD:
+        _violation(stats, "repeated",
+                   f"{stats.route}: la misma sentencia se ejecutó {stats.repeats[statement]} veces "
+                   f"(¿N+1?): {statement[:200]}",
+                   RepeatedQueryDetected)
+
+
+def query_budget(max_round_trips: int):
+    """Dependencia de ruta: `@router.get(..., dependencies=[query_budget(2)])`."""
+    async def declare() -> None:
+        stats = current_sql.get()
+        if stats is not None:
+            stats.budget = max_round_trips
+            _check(stats)   # por si las dependencias anteriores ya lo gastaron
+    return Depends(declare)
+
+
+# ---------- MIDDLEWARE ----------
+
+class SQLBudgetMiddleware:
+    """Va por DENTRO de PrometheusMiddleware (usa la ruta que éste resolvió)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestSQL(route=current_route.get())
+        token = current_sql.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"server-timing", stats.server_timing().encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_sql.reset(token)
+            ROUND_TRIPS.labels(stats.route).observe(stats.round_trips)
+
+
+# ---------- EVENTOS DEL ENGINE ----------
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        stats = current_sql.get()
+        if stats is not None:
+            stats.connections += 1
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("budget_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["budget_start"].pop()
+        stats = current_sql.get()
+        if stats is None:
+            return
+        stats.round_trips += 1
+        stats.statements += len(parameters) if executemany else 1
+        stats.db_time += elapsed
+        stats.repeats[statement] += 1
+        _check(stats, statement)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # Sin after_cursor_execute para la sentencia que falló: su inicio no debe quedar en la pila
+        conn = context.connection
+        if conn is not None and conn.info.get("budget_start"):
+            conn.info["budget_start"].pop()
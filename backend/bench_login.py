@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de GET /api/locales/ mientras hay logins concurrentes.
+
+Con bcrypt dentro del event loop, cada login congela el worker ~250 ms y el p99
+del catálogo se dispara. Con el pool de hashing (app/hashing.py) el p99 debe
+quedarse cerca del valor en reposo.
+
+Uso:
+    python bench_login.py [--logins 8] [--duration 20]
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+# ---------- CONFIG ----------
+BASE_URL = "http://localhost:8000"
+LOGIN_ENDPOINT = "/api/auth/login"
+LOCALES_ENDPOINT = "/api/locales/"
+EMAIL = "admin@admin.com"
+PASSWORD = "admin"
+# ----------------------------
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def login_loop(stop: threading.Event, counter: list[int]) -> None:
+    s = requests.Session()
+    while not stop.is_set():
+        r = s.post(BASE_URL + LOGIN_ENDPOINT, data={"username": EMAIL, "password": PASSWORD})
+        if r.status_code == 200:
+            counter[0] += 1
+
+
+def probe_locales(stop: threading.Event, samples: list[float]) -> None:
+    s = requests.Session()
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        s.get(BASE_URL + LOCALES_ENDPOINT).raise_for_status()
+        samples.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.02)
+
+
+def run(logins: int, duration: float) -> list[float]:
+    stop = threading.Event()
+    samples: list[float] = []
+    counter = [0]
+    threads = [threading.Thread(target=login_loop, args=(stop, counter)) for _ in range(logins)]
+    threads.append(threading.Thread(target=probe_locales, args=(stop, samples)))
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    if logins:
+        print(f"   logins completados: {counter[0]} ({counter[0] / duration:.1f}/s)")
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    if not samples:
+        sys.exit("Sin muestras: ¿está levantada la API?")
+    print(
+        f"{label:<22} n={len(samples):<5} "
+        f"p50={statistics.median(samples):7.1f} ms  "
+        f"p99={percentile(samples, 99):7.1f} ms  "
+        f"max={max(samples):7.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=8, help="hilos haciendo login en bucle")
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos por fase")
+    args = parser.parse_args()
+
+    report("reposo", run(0, args.duration / 2))
+    report(f"{args.logins} logins concurrentes", run(args.logins, args.duration))
+
+
+if __name__ == "__main__":
+    main()
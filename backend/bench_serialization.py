@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: filas por segundo al devolver listas de reservas (GET /my, /my/history).
+
+Compara tres caminos con las mismas N reservas:
+
+    pydantic+json    antes: entidades ORM -> response_model (validación con
+                     from_attributes) -> jsonable_encoder -> json.dumps
+    pydantic dump    FAST_JSON=0: filas -> TypeAdapter -> dump_json
+    orjson           FAST_JSON=1: filas proyectadas -> dict -> orjson (fastjson.py)
+
+Con --user-id mide además la lectura en la BD (DATABASE_URL): select(Reservation)
+hidratando entidades frente a select(*columns(Reservation, ReservationOut)).
+
+Uso:
+    python bench_serialization.py [--rows 500] [--repeat 200]
+    DATABASE_URL=... python bench_serialization.py --user-id <uuid>
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.enums import ReservationStatus
+from app.fastjson import columns, rows_response
+from app.models import Reservation
+from app.schemas import ReservationOut
+
+FIELDS = list(ReservationOut.model_fields)
+Row = namedtuple("Row", FIELDS)   # mismo _fields que las filas de SQLAlchemy
+
+
+def sample(n: int) -> tuple[list[Reservation], list[Row]]:
+    start = datetime(2026, 1, 1, 8)
+    values = [
+        dict(
+            id=uuid.uuid4(), locale_id=uuid.uuid4(), user_id=uuid.uuid4(),
+            start_dt=start + timedelta(hours=i), end_dt=start + timedelta(hours=i + 1),
+            motive=f"Reunión {i}", status=ReservationStatus.approved, priority=9, headcount=None,
+        )
+        for i in range(n)
+    ]
+    return [Reservation(**v) for v in values], [Row(**v) for v in values]
+
+
+def timed(label: str, rows: int, repeat: int, fn) -> float:
+    fn()  # calentamiento
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    rate = rows * repeat / (time.perf_counter() - t0)
+    print(f"{label:<18} {rate:>12,.0f} filas/s")
+    return rate
+
+
+def bench_serialization(n: int, repeat: int) -> None:
+    entities, rows = sample(n)
+    adapter = TypeAdapter(list[ReservationOut])
+
+    def before():
+        validated = adapter.validate_python(entities, from_attributes=True)
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode()
+
+    def pydantic_dump():
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+    def fast():
+        return rows_response(rows, ReservationOut).body
+
+    assert json.loads(before()) == json.loads(fast()) == json.loads(pydantic_dump())
+    print(f"serialización de {n} reservas × {repeat}")
+    base = timed("pydantic+json", n, repeat, before)
+    timed("pydantic dump", n, repeat, pydantic_dump)
+    rate = timed("orjson", n, repeat, fast)
+    print(f"orjson / antes: ×{rate / base:.1f}")
+
+
+async def bench_db(user_id: uuid.UUID, repeat: int) -> None:
+    from sqlalchemy import select
+
+    from app.database import async_session
+
+    entity_stmt = select(Reservation).where(Reservation.user_id == user_id)
+    projected_stmt = select(*columns(Reservation, ReservationOut)).where(Reservation.user_id == user_id)
+    async with async_session() as session:
+        for label, stmt, scalars in (("ORM entidades", entity_stmt, True), ("proyección", projected_stmt, False)):
+            total = 0
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                result = await session.execute(stmt)
+                total += len(result.scalars().all() if scalars else result.all())
+                session.expunge_all()
+            print(f"{label:<18} {total / (time.perf_counter() - t0):>12,.0f} filas/s ({total // repeat} filas)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500, help="reservas por respuesta")
+    parser.add_argument("--repeat", type=int, default=200, help="respuestas por camino")
+    parser.add_argument("--user-id", type=uuid.UUID, help="medir también la lectura de sus reservas en la BD")
+    args = parser.parse_args()
+
+    bench_serialization(args.rows, args.repeat)
+    if args.user_id:
+        print()
+        asyncio.run(bench_db(args.user_id, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
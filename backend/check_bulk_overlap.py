@@ -0,0 +1,126 @@
+# backend/check_bulk_overlap.py
+"""
+Prueba manual de bulk.apply_status_changes cuando una aprobación simultánea
+se cuela entre el SELECT ... FOR UPDATE y el UPDATE, sin base de datos.
+
+    python check_bulk_overlap.py
+
+La sesión de mentira deja pasar el SELECT (ningún choque a la vista) y hace
+que el UPDATE del lote dispare la restricción de exclusión (SQLSTATE 23P01)
+por culpa de una sola reserva. Comprueba que:
+- el lote no falla: esa reserva sale como "overlap" y las demás "updated";
+- cada intento va en su SAVEPOINT;
+- otro IntegrityError (no de exclusión) sí se propaga.
+
+Y, en un local compartido, que el lote toma el bloqueo del local antes del
+SELECT ... FOR UPDATE y que una reserva con más asistentes que la capacidad
+sale como "full".
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://u:p@localhost/db")
+
+from sqlalchemy.exc import IntegrityError  # noqa: E402
+
+from app import bulk  # noqa: E402
+from app.bulk import StatusChange, apply_status_changes  # noqa: E402
+from app.enums import ReservationStatus  # noqa: E402
+
+LOCALE = uuid.uuid4()
+START = datetime(2026, 11, 2, 9)
+IDS = [uuid.uuid4() for _ in range(4)]
+LOSER = IDS[2]
+
+
+def row(res_id, i):
+    return SimpleNamespace(
+        id=res_id, locale_id=LOCALE, start_dt=START + timedelta(hours=i), end_dt=START + timedelta(hours=i + 1),
+        clashes=False, status=ReservationStatus.approved, priority=9, user_id=None,
+        headcount=None, shared_capacity=False, capacity=10,
+    )
+
+
+ROWS = {res_id: row(res_id, i) for i, res_id in enumerate(IDS)}
+
+
+class Violation(Exception):
+    def __init__(self, sqlstate):
+        self.sqlstate = sqlstate
+
+
+class FakeSession:
+    def __init__(self, sqlstate="23P01", shared=False):
+        self.sqlstate = sqlstate
+        self.shared = shared
+        self.savepoints = 0
+        self.log = []
+
+    async def scalars(self, stmt):
+        self.log.append("shared_locales")
+        return SimpleNamespace(all=lambda: [LOCALE] if self.shared else [])
+
+    def begin_nested(self):
+        session = self
+
+        class Savepoint:
+            async def __aenter__(self):
+                session.savepoints += 1
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Savepoint()
+
+    async def execute(self, stmt):
+        if isinstance(stmt, tuple) and stmt[0] == "update":
+            self.log.append("update")
+            ids = [c.id for c in stmt[1]]
+            if LOSER in ids:
+                raise IntegrityError("UPDATE reservations", {}, Violation(self.sqlstate))
+            return SimpleNamespace(all=lambda: [ROWS[i] for i in ids])
+        if "pg_advisory_xact_lock" in str(stmt):
+            self.log.append("lock")
+            return None
+        if stmt._for_update_arg is not None:   # el SELECT ... FOR UPDATE del lote
+            self.log.append("select_for_update")
+            return SimpleNamespace(all=lambda: list(ROWS.values()))
+        return SimpleNamespace(one=lambda: ROWS[LOSER])   # datos de la que chocó
+
+
+async def main():
+    bulk._update_stmt = lambda accepted: ("update", accepted)
+    changes = [StatusChange(id=i, status=ReservationStatus.approved) for i in IDS]
+
+    session = FakeSession()
+    results = await apply_status_changes(session, changes)
+    outcome = {r.id: r.result for r in results}
+    assert outcome[LOSER] == "overlap", outcome
+    assert all(outcome[i] == "updated" for i in IDS if i != LOSER), outcome
+    assert session.savepoints == 1 + len(IDS), session.savepoints
+    print("exclusión en el UPDATE del lote: 1 overlap, 3 updated,", session.savepoints, "savepoints")
+
+    try:
+        await apply_status_changes(FakeSession(sqlstate="23505"), changes)
+        raise AssertionError("un IntegrityError que no es de exclusión debe propagarse")
+    except IntegrityError:
+        print("otro IntegrityError: se propaga")
+
+    # Local compartido: bloqueo antes que las filas, y capacidad
+    for r in ROWS.values():
+        r.shared_capacity, r.headcount = True, 4
+    ROWS[IDS[0]].headcount = 12
+    session = FakeSession(shared=True)
+    results = await apply_status_changes(session, changes)
+    outcome = {r.id: r.result for r in results}
+    assert session.log[:3] == ["shared_locales", "lock", "select_for_update"], session.log
+    assert outcome[IDS[0]] == "full" and outcome[LOSER] == "overlap", outcome
+    print("local compartido: bloqueo antes del FOR UPDATE; 12 personas en 10 plazas: full")
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
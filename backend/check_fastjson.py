@@ -0,0 +1,73 @@
+# backend/check_fastjson.py
+"""
+Prueba manual de fastjson.rows_response: el camino rápido (orjson) y el del
+esquema (FAST_JSON=0) deben dar el mismo JSON y rechazar lo mismo.
+
+    python check_fastjson.py
+
+No necesita base de datos: las filas son namedtuples con los mismos _fields
+que devuelve select(*columns(Reservation, ReservationOut)).
+"""
+import json
+import os
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://u:p@localhost/db")
+
+from pydantic import ValidationError  # noqa: E402
+
+from app import fastjson  # noqa: E402
+from app.enums import ReservationStatus  # noqa: E402
+from app.schemas import ReservationOut  # noqa: E402
+
+Row = namedtuple("Row", list(ReservationOut.model_fields))
+
+
+def sample(n: int = 20, **override) -> list[Row]:
+    start = datetime(2026, 11, 2, 8, 30, 15, 250000)
+    rows = [
+        Row(id=uuid.uuid4(), locale_id=uuid.uuid4(), user_id=uuid.uuid4(),
+            start_dt=start + timedelta(hours=i), end_dt=start + timedelta(hours=i + 1),
+            motive=f"Reunión «{i}»", status=list(ReservationStatus)[i % len(ReservationStatus)],
+            priority=i % 10, headcount=None if i % 2 else i)
+        for i in range(n)
+    ]
+    if override:
+        rows[-1] = rows[-1]._replace(**override)
+    return rows
+
+
+def render(rows, fast: bool):
+    fastjson.FAST_JSON = fast
+    return json.loads(fastjson.rows_response(rows, ReservationOut).body)
+
+
+def rejected(rows, fast: bool) -> bool:
+    try:
+        render(rows, fast)
+    except ValidationError:
+        return True
+    return False
+
+
+def main():
+    rows = sample()
+    assert render(rows, True) == render(rows, False)
+    assert render([], True) == render([], False) == []
+    print("mismo JSON por ambos caminos (incluida la lista vacía)")
+
+    for field in ("motive", "priority", "user_id"):
+        bad = sample(**{field: None})
+        assert rejected(bad, True) and rejected(bad, False), field
+        print(f"{field}=None: rechazado por ambos caminos")
+
+    ok = sample(headcount=None)
+    assert not rejected(ok, True) and not rejected(ok, False)
+    print("headcount=None (Optional): aceptado por ambos")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
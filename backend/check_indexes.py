@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Comprueba con EXPLAIN que las consultas calientes usan los índices de las
+migraciones (alembic upgrade head) en lugar de un Seq Scan sobre reservations.
+
+Las consultas se construyen con las mismas funciones que usan los routers, así
+que si alguien cambia un WHERE/ORDER BY y deja de encajar con su índice, este
+script lo detecta.
+
+En una base de desarrollo casi vacía el planner prefiere Seq Scan siempre, por
+eso se ejecuta con `enable_seqscan = off`: lo que se verifica es que el índice
+ES utilizable para la consulta, no el coste real.
+
+Uso (desde backend/):
+    python check_indexes.py
+"""
+import asyncio
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.conflicts import _marked_reservations
+from app.enums import ReservationStatus
+from app.routers.admin import history_stmt, pending_stmt
+from app.routers.locales import availability_stmt
+from app.routers.reservations import my_history_stmt, my_reservations_stmt
+
+load_dotenv()
+
+SAMPLE_ID = uuid.UUID("00000000-0000-0000-0000-000000000001")
+NOW = datetime(2026, 1, 15, 12, 0)
+
+
+def hot_queries():
+    """(nombre, sentencia, índices aceptables)"""
+    day_start = NOW.replace(hour=8)
+    day_end = NOW.replace(hour=18)
+    return [
+        ("locales: disponibilidad", availability_stmt(SAMPLE_ID, day_start, day_end),
+         {"ix_reservations_locale_start", "ix_reservations_locale_during"}),
+        ("reservations: /my", my_reservations_stmt(SAMPLE_ID, NOW),
+         {"ix_reservations_user_start"}),
+        ("reservations: /my/history", my_history_stmt(SAMPLE_ID, NOW),
+         {"ix_reservations_user_start"}),
+        ("admin: pendientes", pending_stmt(),
+         {"ix_reservations_pending_start", "ix_reservations_pending_locale_start"}),
+        ("admin: conflictos", select(_marked_reservations((ReservationStatus.pending,), None, None, None)),
+         {"ix_reservations_pending_locale_start", "ix_reservations_pending_start"}),
+        ("admin: historial por rango", history_stmt(NOW - timedelta(days=30), NOW),
+         {"ix_reservations_start_id", "ix_reservations_start_brin"}),
+        ("admin: historial (cursor)", history_stmt(after=(NOW, SAMPLE_ID)).limit(100),
+         {"ix_reservations_start_id"}),
+    ]
+
+
+def used_indexes(plan: dict) -> set[str]:
+    """Nombres de índice usados sobre reservations en todo el árbol del plan."""
+    found = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "Index Name" in node:
+            found.add(node["Index Name"])
+        stack.extend(node.get("Plans", []))
+    return found
+
+
+async def main() -> int:
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    failures = 0
+    async with engine.connect() as conn:
+        await conn.execute(text("SET enable_seqscan = off"))
+        for name, stmt, expected in hot_queries():
+            sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            raw = (await conn.execute(text("EXPLAIN (FORMAT JSON) " + sql))).scalar_one()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            used = used_indexes(plan)
+            ok = bool(used & expected)
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {name:<28} usa: {', '.join(sorted(used)) or 'ningún índice'}")
+    await engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,77 @@
+# backend/check_mailer.py
+"""
+Prueba manual del envío de correos contra un servidor SMTP local (aiosmtpd).
+
+    pip install aiosmtpd
+    python check_mailer.py [cantidad]
+
+Levanta aiosmtpd en un puerto libre, envía `cantidad` avisos por la misma
+SMTPConnection que usa el worker de app/mailer.py y comprueba que llegaron
+todos por UNA sola conexión. Después corta la conexión desde el servidor y
+verifica que el siguiente envío reconecta solo. No necesita base de datos.
+"""
+import asyncio
+import os
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+
+from aiosmtpd.controller import Controller
+
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://u:p@localhost/db")
+
+from app.mailer import SMTPConnection, mail_config, render  # noqa: E402
+
+
+class Inbox:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def main(count: int):
+    port = free_port()
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    os.environ.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=str(port), MAIL_SUPPRESS_SEND="0")
+    conn = SMTPConnection(mail_config())
+    start = datetime(2026, 1, 15, 10, 0)
+    try:
+        t0 = time.perf_counter()
+        for i in range(count):
+            msg = render("approved", to_email=f"user{i}@example.com", name=f"Usuario {i}",
+                         locale="Salón A", start=start, end=start + timedelta(hours=2), sender=conn.sender)
+            await conn.send(msg)
+        elapsed = time.perf_counter() - t0
+        print(f"{count} correos en {elapsed:.3f}s ({count / elapsed:.0f}/s), conexiones: {conn.connects}")
+        assert len(inbox.messages) == count, f"llegaron {len(inbox.messages)} de {count}"
+        assert conn.connects == 1 and len(inbox.sessions) == 1, "cada envío abrió una conexión nueva"
+
+        # El servidor cierra la conexión: el siguiente envío debe reconectar
+        controller.stop()
+        controller = Controller(inbox, hostname="127.0.0.1", port=port)
+        controller.start()
+        await conn.send(render("received", to_email="otro@example.com", name="Otro", locale="Cancha B",
+                               start=start, end=start + timedelta(hours=1), sender=conn.sender))
+        assert len(inbox.messages) == count + 1 and conn.connects == 2
+        print("reconexión tras caída del servidor: OK")
+    finally:
+        await conn.close()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
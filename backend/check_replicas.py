@@ -0,0 +1,85 @@
+# backend/check_replicas.py
+"""
+Prueba manual del enrutado a réplicas (app/replicas.py) con dos PostgreSQL locales.
+
+    docker run -d --name pg-a -e POSTGRES_PASSWORD=pg -p 5433:5432 postgres:15
+    docker run -d --name pg-b -e POSTGRES_PASSWORD=pg -p 5434:5432 postgres:15
+
+    DATABASE_URL=postgresql+asyncpg://postgres:pg@localhost:5433/postgres \\
+    DATABASE_REPLICA_URLS=postgresql+asyncpg://postgres:pg@localhost:5434/postgres \\
+    python check_replicas.py
+
+No hace falta replicación real: cada sesión pregunta a qué servidor está
+conectada (identificador del clúster), así se ve adónde fue cada lectura.
+Comprueba:
+
+1. el chequeo de salud y el retraso de cada réplica;
+2. el turno rotatorio entre réplicas sanas (con una sola, siempre la misma);
+3. que un UPDATE se enruta al primario aunque la sesión sea de lectura;
+4. que un usuario fijado con pin() lee del primario, y otro no;
+5. que con las réplicas caídas (o dadas de baja) se lee del primario.
+
+Para ver el paso 5 de verdad: `docker stop pg-b` y volver a ejecutar.
+"""
+import asyncio
+import uuid
+
+from sqlalchemy import select, text, update
+
+from app import replicas
+from app.database import engine
+from app.models import Locale
+
+# Dos instancias independientes tienen distinto system_identifier; una réplica
+# real comparte el del primario pero está en recuperación.
+WHERE = text("""
+    SELECT (SELECT system_identifier FROM pg_control_system())::text
+           || CASE WHEN pg_is_in_recovery() THEN ' (recuperación)' ELSE ' (lectura/escritura)' END
+""")
+
+
+async def where(session) -> str:
+    return await session.scalar(WHERE)
+
+
+async def main() -> None:
+    if not replicas.replicas:
+        raise SystemExit("Defina DATABASE_REPLICA_URLS")
+    async with engine.connect() as conn:
+        primary = await conn.scalar(WHERE)
+    print(f"primario: {primary}")
+
+    await replicas.start()
+    for r in replicas.replicas:
+        print(f"{r.name}: sana={r.healthy} retraso={r.lag} error={r.last_error}")
+
+    print("\nturno rotatorio (4 sesiones de lectura):")
+    for i in range(4):
+        async with replicas.read_session() as session:
+            print(f"  sesión {i + 1}: {await where(session)}")
+
+    print("\nescritura en una sesión de lectura (solo se enruta, no se ejecuta):")
+    async with replicas.read_session() as session:
+        for label, clause in (("SELECT", select(Locale)), ("UPDATE", update(Locale).values(active=True))):
+            bind = session.sync_session.get_bind(clause=clause)
+            print(f"  {label} va a {bind.url.host}:{bind.url.port}")
+
+    me, other = uuid.uuid4(), uuid.uuid4()
+    replicas.pin(replicas.user_key(me))
+    for label, user in (("recién escribió", me), ("no escribió", other)):
+        async with replicas.read_session() as session:
+            replicas.use_primary_if_pinned(session, replicas.user_key(user))
+            print(f"\nusuario que {label}: {await where(session)}")
+
+    for r in replicas.replicas:
+        r.healthy = False
+    async with replicas.read_session() as session:
+        print(f"\nsin réplicas sanas: {await where(session)}")
+
+    print("\n", replicas.replica_stats())
+    await replicas.stop()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+# backend/check_revocation.py
+"""
+Prueba manual de la revocación de usuarios autenticados, sin base de datos.
+
+    python check_revocation.py
+
+Con un token que trae uid/rol/nombre en sus claims comprueba que:
+- se resuelve sin consultar la BD (y queda en la caché);
+- PATCH /api/admin/users/{id} que cambia el rol hace que ese mismo token pase
+  por la BD y devuelva el rol nuevo;
+- desactivar al usuario deja su token en 401 y el login en 403;
+- el aviso user_access_changed que llega por LISTEN (otros workers) también
+  invalida la caché;
+- un worker que arranca (o reconecta su LISTEN) recarga las revocaciones de
+  users.tokens_valid_after y, mientras no las tiene, no confía en ningún claim.
+"""
+import asyncio
+import json
+import os
+import uuid
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://u:p@localhost/db")
+
+from fastapi import HTTPException  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import events  # noqa: E402
+from app.database import get_async_session  # noqa: E402
+from app import dependencies  # noqa: E402
+from app.dependencies import (  # noqa: E402
+    Principal, get_current_user, principal_cache_stats, resolve_principal, revocations_unsynced, sync_revocations,
+)
+from app.enums import UserRole  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routers import auth  # noqa: E402
+
+USER = SimpleNamespace(id=uuid.uuid4(), email="ana@example.com", full_name="Ana", role=UserRole.USER,
+                       is_active=True, password_hash="x", tokens_valid_after=None)
+ADMIN = Principal(id=uuid.uuid4(), email="admin@example.com", full_name="Admin", role=UserRole.ADMIN)
+
+
+class FakeSession:
+    """Lo justo para resolve_principal y la ruta de administración."""
+    selects = 0
+    notifies: list[str] = []
+
+    async def execute(self, stmt, params=None):
+        if params and "payload" in params:
+            FakeSession.notifies.append(params["payload"])
+            return None
+        FakeSession.selects += 1
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(first=lambda: USER))
+
+    async def get(self, model, key):
+        return USER if key == USER.id else None
+
+    async def commit(self):
+        pass
+
+
+async def fake_session():
+    yield FakeSession()
+
+
+def resolve(token: str) -> Principal:
+    return asyncio.run(resolve_principal(token, FakeSession()))
+
+
+def main():
+    token = auth.create_access_token(data=auth._claims_for(USER))
+
+    # Arranque: hasta cargar las revocaciones, todo va a la BD
+    resolve(token)
+    assert FakeSession.selects == 1
+    sync_revocations([])
+    FakeSession.selects = 0
+    print("sin revocaciones cargadas: a la BD")
+
+    p = resolve(token)
+    assert p.role == UserRole.USER and FakeSession.selects == 0
+    resolve(token)
+    assert principal_cache_stats()["hits"] >= 1
+    print("claims sin BD y en caché")
+
+    app.dependency_overrides[get_async_session] = fake_session
+    app.dependency_overrides[get_current_user] = lambda: ADMIN
+    client = TestClient(app)
+    url = f"/api/admin/users/{USER.id}"
+
+    r = client.patch(url, json={"role": "admin"})
+    assert r.status_code == 200, r.text
+    assert USER.tokens_valid_after is not None
+    assert json.loads(FakeSession.notifies[-1])[0] == {"type": "user_access_changed", "email": USER.email}
+    p = resolve(token)
+    assert p.role == UserRole.ADMIN and FakeSession.selects == 1
+    print("cambio de rol: el token viejo va a la BD y ve 'admin'")
+
+    r = client.patch(url, json={"is_active": False})
+    assert r.status_code == 200 and r.json()["is_active"] is False, r.text
+    try:
+        resolve(token)
+        raise AssertionError("un usuario desactivado no debería autenticarse")
+    except HTTPException as e:
+        assert e.status_code == 401
+    print("desactivado: 401")
+
+    r = client.patch(url, json={"role": "user"})
+    assert r.status_code == 200, r.text
+    r = client.patch(f"/api/admin/users/{uuid.uuid4()}", json={"is_active": True})
+    assert r.status_code == 404, r.text
+    USER.is_active = True
+
+    # Otro worker: el aviso llega por LISTEN
+    fresh = auth.create_access_token(data=auth._claims_for(USER))
+    resolve(fresh)
+    before = FakeSession.selects
+    events._on_notify(None, 0, events.CHANNEL, FakeSession.notifies[-1])
+    resolve(fresh)
+    assert FakeSession.selects == before + 1
+    print("user_access_changed por LISTEN invalida la caché")
+
+    # Worker reiniciado: la memoria está vacía, pero la revocación está en la BD
+    dependencies._revoked_before.clear()
+    revocations_unsynced()
+    before = FakeSession.selects
+    resolve(token)
+    assert FakeSession.selects == before + 1
+    sync_revocations([(USER.email, USER.tokens_valid_after)])
+    resolve(token)   # token anterior a la revocación: sigue yendo a la BD
+    assert FakeSession.selects == before + 2
+    print("reinicio: con LISTEN caído y tras recargar de la BD, el token viejo no confía en sus claims")
+
+    # Login de un usuario inactivo
+    USER.is_active = False
+
+    async def verify(_pw, _hash):
+        return True
+
+    auth.verify_password = verify
+    auth.async_session = lambda: _Ctx()
+    r = client.post("/api/auth/login", data={"username": USER.email, "password": "x"})
+    assert r.status_code == 403, r.text
+    print("login de inactivo: 403")
+    print("OK")
+
+
+class _Ctx:
+    async def __aenter__(self):
+        return FakeSession()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# backend/check_schedule.py
+"""
+Prueba manual de PUT /api/admin/{locale_id}/schedule sin base de datos.
+
+    python check_schedule.py
+
+Sustituye el usuario y la sesión por dobles en memoria y comprueba que:
+- un horario válido se guarda y se devuelve en LocaleOut;
+- un cuerpo `null` (o vacío) borra el horario: vuelve a open_time/close_time;
+- un cierre que no termina después de empezar da 400;
+- un usuario que no es administrador recibe 403.
+"""
+import os
+import uuid
+from datetime import time
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://u:p@localhost/db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import get_async_session  # noqa: E402
+from app.dependencies import get_current_user  # noqa: E402
+from app.enums import UserRole  # noqa: E402
+from app.main import app  # noqa: E402
+
+LOCALE = SimpleNamespace(
+    id=uuid.uuid4(), name="Salón", description="Prueba", capacity=20, shared_capacity=False,
+    location="Planta 1", open_time=time(8), close_time=time(18), schedule=None, imagen=None,
+)
+USER = SimpleNamespace(id=uuid.uuid4(), role=UserRole.ADMIN, email="admin@example.com")
+
+
+class FakeSession:
+    commits = 0
+
+    async def get(self, model, key):
+        return LOCALE if key == LOCALE.id else None
+
+    async def commit(self):
+        FakeSession.commits += 1
+
+
+async def fake_session():
+    yield FakeSession()
+
+
+def main():
+    app.dependency_overrides[get_async_session] = fake_session
+    app.dependency_overrides[get_current_user] = lambda: USER
+    client = TestClient(app)
+    url = f"/api/admin/{LOCALE.id}/schedule"
+
+    body = {"hours": [{"weekday": 0, "open_time": "09:00", "close_time": "13:00"}]}
+    r = client.put(url, json=body)
+    assert r.status_code == 200, r.text
+    assert r.json()["schedule"]["hours"][0]["weekday"] == 0
+    assert LOCALE.schedule["hours"][0]["open_time"] == "09:00:00"
+    print("horario guardado:", r.json()["schedule"]["hours"])
+
+    r = client.put(url, content="null", headers={"Content-Type": "application/json"})
+    assert r.status_code == 200, r.text
+    assert r.json()["schedule"] is None and LOCALE.schedule is None
+    print("null borra el horario")
+
+    LOCALE.schedule = body
+    r = client.put(url)
+    assert r.status_code == 200, r.text
+    assert LOCALE.schedule is None
+    print("sin cuerpo también")
+
+    bad = {"blackouts": [{"start_dt": "2026-11-02T10:00:00", "end_dt": "2026-11-02T09:00:00"}]}
+    r = client.put(url, json=bad)
+    assert r.status_code == 400, r.text
+    print("cierre invertido: 400")
+
+    r = client.put(f"/api/admin/{uuid.uuid4()}/schedule", json=body)
+    assert r.status_code == 404, r.text
+
+    USER.role = UserRole.USER
+    r = client.put(url, json=body)
+    assert r.status_code == 403, r.text
+    print("no administrador: 403")
+
+    print(f"OK ({FakeSession.commits} commits)")
+
+
+if __name__ == "__main__":
+    main()
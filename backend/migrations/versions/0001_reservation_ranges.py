@@ -0,0 +1,55 @@
+"""rango tsrange y restricción de no-solapamiento en reservations
+
+Lleva a las bases existentes lo que db/init.sql ya crea en instalaciones nuevas
+(columna `during`, índice GiST y exclusión de reservas aprobadas solapadas).
+Es idempotente: sobre una base recién creada con init.sql no hace nada.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.execute(
+        "ALTER TABLE reservations ADD COLUMN IF NOT EXISTS during TSRANGE "
+        "GENERATED ALWAYS AS (tsrange(start_dt, end_dt, '[)')) STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_reservations_locale_during "
+        "ON reservations USING gist (locale_id, during)"
+    )
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'reservations_valid_range') THEN
+                ALTER TABLE reservations
+                    ADD CONSTRAINT reservations_valid_range CHECK (start_dt < end_dt);
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'reservations_no_overlap_approved') THEN
+                ALTER TABLE reservations
+                    ADD CONSTRAINT reservations_no_overlap_approved
+                    EXCLUDE USING gist (locale_id WITH =, during WITH &&)
+                    WHERE (status = 'approved');
+            END IF;
+        END $$;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_no_overlap_approved")
+    op.execute("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_valid_range")
+    op.execute("DROP INDEX IF EXISTS ix_reservations_locale_during")
+    op.execute("ALTER TABLE reservations DROP COLUMN IF EXISTS during")
@@ -0,0 +1,51 @@
+"""índices para las consultas calientes de reservations
+
+- ix_reservations_locale_start: disponibilidad por local (locale_id, start_dt)
+  cubriendo end_dt/status/user_id para permitir index-only scans.
+- ix_reservations_user_start: "mis reservas" / "mi historial" (user_id, start_dt).
+- ix_reservations_pending_start / ix_reservations_pending_locale_start: parciales
+  sobre status = 'pending' (lista de pendientes y detección de conflictos).
+- ix_reservations_start_brin: BRIN sobre start_dt para el historial, que crece
+  casi siempre en orden de fecha.
+
+Se crean con CONCURRENTLY para no bloquear escrituras en producción.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_reservations_locale_start":
+        "ON reservations (locale_id, start_dt) INCLUDE (end_dt, status, user_id)",
+    "ix_reservations_user_start":
+        "ON reservations (user_id, start_dt)",
+    "ix_reservations_pending_start":
+        "ON reservations (start_dt) WHERE status = 'pending'",
+    "ix_reservations_pending_locale_start":
+        "ON reservations (locale_id, start_dt, id) WHERE status = 'pending'",
+    "ix_reservations_start_brin":
+        "ON reservations USING brin (start_dt)",
+}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+        op.execute("ANALYZE reservations")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
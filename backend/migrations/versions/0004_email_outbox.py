@@ -0,0 +1,41 @@
+"""tabla email_outbox para los avisos de reservas
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            reservation_id UUID NOT NULL REFERENCES reservations(id) ON DELETE CASCADE,
+            template VARCHAR(32) NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_email_outbox_due "
+        "ON email_outbox (next_attempt_at) WHERE status = 'pending'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS email_outbox")
@@ -0,0 +1,48 @@
+"""tabla jobs para la cola de trabajos en segundo plano
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            type VARCHAR(64) NOT NULL,
+            params JSONB NOT NULL DEFAULT '{}'::jsonb,
+            status VARCHAR(16) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_by VARCHAR(128),
+            heartbeat_at TIMESTAMP,
+            result JSONB,
+            output BYTEA,
+            output_type VARCHAR(64),
+            error TEXT,
+            created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_jobs_queued ON jobs (type, run_after) WHERE status = 'queued'")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_jobs_running ON jobs (type, heartbeat_at) WHERE status = 'running'")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_jobs_created ON jobs (created_at)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS jobs")
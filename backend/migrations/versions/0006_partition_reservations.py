@@ -0,0 +1,201 @@
+"""reservations particionada por mes (start_dt) y esquema archive
+
+Convierte `reservations` en una tabla particionada por rango mensual de
+start_dt. Las particiones se llaman reservations_AAAA_MM y las crea la función
+reservations_ensure_partition(mes). La usa también app/partitions.py para
+crear los meses siguientes y los que pida una reserva. Cada partición lleva su
+propia restricción de exclusión de aprobadas solapadas, porque PostgreSQL 15 no
+la admite en la tabla padre.
+
+Consecuencias:
+- La clave primaria pasa a ser (id, start_dt), que debe incluir la clave de
+  partición.
+- email_outbox referencia la reserva por (reservation_id, reservation_start).
+
+El esquema `archive` recibe las particiones antiguas (trabajo
+archive_reservations); archive.reservations es la tabla padre donde se
+enganchan.
+
+La conversión copia todas las filas con la tabla bloqueada: conviene hacerla
+en una ventana de mantenimiento. Sobre una base creada con init.sql, que ya
+viene particionada, solo (re)crea la función.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Meses que se dejan creados por delante del último con reservas
+MONTHS_AHEAD = 12
+
+COLUMNS = """
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    locale_id UUID,
+    user_id UUID,
+    start_dt TIMESTAMP NOT NULL,
+    end_dt TIMESTAMP NOT NULL,
+    motive TEXT,
+    status reservation_status DEFAULT 'pending',
+    priority INTEGER DEFAULT 9,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    during TSRANGE GENERATED ALWAYS AS (tsrange(start_dt, end_dt, '[)')) STORED
+"""
+COPY_COLUMNS = "id, locale_id, user_id, start_dt, end_dt, motive, status, priority, created_at"
+
+INDEXES = {
+    "ix_reservations_locale_during": "USING gist (locale_id, during)",
+    "ix_reservations_locale_start": "(locale_id, start_dt) INCLUDE (end_dt, status, user_id)",
+    "ix_reservations_user_start": "(user_id, start_dt)",
+    "ix_reservations_pending_start": "(start_dt) WHERE status = 'pending'",
+    "ix_reservations_pending_locale_start": "(locale_id, start_dt, id) WHERE status = 'pending'",
+    "ix_reservations_start_brin": "USING brin (start_dt)",
+    "ix_reservations_start_id": "(start_dt, id)",
+}
+# Las que usan las consultas de historial; al enganchar una partición en el
+# archivo, PostgreSQL adopta sus índices equivalentes en lugar de crearlos.
+ARCHIVE_INDEXES = {
+    "ix_archived_reservations_user_start": "(user_id, start_dt)",
+    "ix_archived_reservations_start_id": "(start_dt, id)",
+    "ix_archived_reservations_locale_start": "(locale_id, start_dt) INCLUDE (end_dt, status, user_id)",
+}
+
+ENSURE_PARTITION = """
+CREATE OR REPLACE FUNCTION reservations_ensure_partition(month DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo DATE := date_trunc('month', month)::date;
+    part TEXT := 'reservations_' || to_char(lo, 'YYYY_MM');
+BEGIN
+    IF to_regclass('public.' || part) IS NULL AND to_regclass('archive.' || part) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.reservations FOR VALUES FROM (%L) TO (%L)',
+                part, lo, (lo + interval '1 month')::date);
+            EXECUTE format(
+                'ALTER TABLE public.%I ADD CONSTRAINT %I '
+                'EXCLUDE USING gist (locale_id WITH =, during WITH &&) WHERE (status = ''approved'')',
+                part, part || '_no_overlap_approved');
+        EXCEPTION WHEN duplicate_table OR invalid_object_definition THEN
+            NULL;  -- otra sesión la creó al mismo tiempo
+        END;
+    END IF;
+    RETURN part;
+END $$
+"""
+
+
+def _create_partitioned(table: str, indexes: dict[str, str], schema: str = "public") -> None:
+    op.execute(f"CREATE TABLE {schema}.{table} ({COLUMNS}) PARTITION BY RANGE (start_dt)")
+    for name, definition in indexes.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {schema}.{table} {definition}")
+
+
+def upgrade() -> None:
+    op.execute("CREATE SCHEMA IF NOT EXISTS archive")
+    op.execute(ENSURE_PARTITION)
+
+    already = op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.reservations'::regclass)"
+    )).scalar()
+    if not already:
+        # 1. La bandeja de salida guarda también start_dt de la reserva
+        op.execute("ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS reservation_start TIMESTAMP")
+        op.execute(
+            "UPDATE email_outbox o SET reservation_start = r.start_dt "
+            "FROM reservations r WHERE r.id = o.reservation_id"
+        )
+        op.execute("ALTER TABLE email_outbox DROP CONSTRAINT IF EXISTS email_outbox_reservation_id_fkey")
+
+        # 2. La tabla vieja se aparta (y libera los nombres de sus índices)
+        op.execute("ALTER TABLE reservations RENAME TO reservations_legacy")
+        op.execute("ALTER TABLE reservations_legacy RENAME CONSTRAINT reservations_pkey TO reservations_legacy_pkey")
+        for name in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+
+        # 3. Tabla particionada con las mismas columnas, restricciones e índices
+        _create_partitioned("reservations", INDEXES)
+        op.execute(
+            """
+            ALTER TABLE reservations
+                ADD CONSTRAINT reservations_pkey PRIMARY KEY (id, start_dt),
+                ADD CONSTRAINT reservations_valid_range CHECK (start_dt < end_dt),
+                ADD CONSTRAINT reservations_locale_id_fkey
+                    FOREIGN KEY (locale_id) REFERENCES locales(id) ON DELETE CASCADE,
+                ADD CONSTRAINT reservations_user_id_fkey
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            """
+        )
+        op.execute(
+            f"""
+            SELECT reservations_ensure_partition(m::date)
+            FROM (
+                SELECT date_trunc('month', COALESCE(min(start_dt), now())) AS lo,
+                       date_trunc('month', GREATEST(COALESCE(max(start_dt), now()), now())) AS hi
+                FROM reservations_legacy
+            ) AS b,
+            generate_series(b.lo, b.hi + interval '{MONTHS_AHEAD} months', interval '1 month') AS m
+            """
+        )
+
+        # 4. Copia y limpieza
+        op.execute(f"INSERT INTO reservations ({COPY_COLUMNS}) SELECT {COPY_COLUMNS} FROM reservations_legacy")
+        op.execute("DROP TABLE reservations_legacy")
+        op.execute("DELETE FROM email_outbox WHERE reservation_start IS NULL")
+        op.execute("ALTER TABLE email_outbox ALTER COLUMN reservation_start SET NOT NULL")
+        op.execute(
+            "ALTER TABLE email_outbox ADD CONSTRAINT email_outbox_reservation_fkey "
+            "FOREIGN KEY (reservation_id, reservation_start) "
+            "REFERENCES reservations (id, start_dt) ON DELETE CASCADE"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_email_outbox_reservation "
+            "ON email_outbox (reservation_start, reservation_id)"
+        )
+        op.execute("ANALYZE reservations")
+
+    exists = op.get_bind().execute(sa.text("SELECT to_regclass('archive.reservations') IS NOT NULL")).scalar()
+    if not exists:
+        _create_partitioned("reservations", ARCHIVE_INDEXES, schema="archive")
+
+
+def downgrade() -> None:
+    # Vuelve a una sola tabla con lo vivo y lo archivado
+    op.execute(f"CREATE TABLE reservations_plain ({COLUMNS})")
+    op.execute(f"INSERT INTO reservations_plain ({COPY_COLUMNS}) SELECT {COPY_COLUMNS} FROM reservations")
+    op.execute(f"INSERT INTO reservations_plain ({COPY_COLUMNS}) SELECT {COPY_COLUMNS} FROM archive.reservations")
+    op.execute("ALTER TABLE email_outbox DROP CONSTRAINT IF EXISTS email_outbox_reservation_fkey")
+    op.execute("DROP TABLE reservations")
+    op.execute("DROP SCHEMA archive CASCADE")
+    op.execute("DROP FUNCTION IF EXISTS reservations_ensure_partition(DATE)")
+    op.execute("ALTER TABLE reservations_plain RENAME TO reservations")
+    op.execute(
+        """
+        ALTER TABLE reservations
+            ADD CONSTRAINT reservations_pkey PRIMARY KEY (id),
+            ADD CONSTRAINT reservations_valid_range CHECK (start_dt < end_dt),
+            ADD CONSTRAINT reservations_locale_id_fkey
+                FOREIGN KEY (locale_id) REFERENCES locales(id) ON DELETE CASCADE,
+            ADD CONSTRAINT reservations_user_id_fkey
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            ADD CONSTRAINT reservations_no_overlap_approved
+                EXCLUDE USING gist (locale_id WITH =, during WITH &&) WHERE (status = 'approved')
+        """
+    )
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON reservations {definition}")
+    op.execute(
+        "ALTER TABLE email_outbox ADD CONSTRAINT email_outbox_reservation_id_fkey "
+        "FOREIGN KEY (reservation_id) REFERENCES reservations(id) ON DELETE CASCADE"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_email_outbox_reservation")
+    op.execute("ALTER TABLE email_outbox DROP COLUMN reservation_start")
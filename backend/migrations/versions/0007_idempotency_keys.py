@@ -0,0 +1,35 @@
+"""tabla idempotency_keys para las cabeceras Idempotency-Key
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key BYTEA PRIMARY KEY,
+            fingerprint BYTEA NOT NULL,
+            status_code INTEGER,
+            body JSONB,
+            locked_until TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+        """
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires ON idempotency_keys (expires_at)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS idempotency_keys")
@@ -0,0 +1,91 @@
+"""locales de capacidad compartida y headcount por reserva
+
+- locales.shared_capacity: el local admite reservas simultáneas mientras la
+  suma de asistentes quepa en `capacity`.
+- reservations.headcount: asistentes de la reserva (solo en esos locales;
+  NULL = ocupa el local entero).
+- La exclusión de aprobadas solapadas de cada partición pasa a aplicarse solo
+  a las reservas sin headcount. Se rehace en todas las particiones, vivas y
+  archivadas, y en la función que crea las nuevas.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EXCLUSIVE = "status = 'approved' AND headcount IS NULL"
+LEGACY = "status = 'approved'"
+
+ENSURE_PARTITION = """
+CREATE OR REPLACE FUNCTION reservations_ensure_partition(month DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo DATE := date_trunc('month', month)::date;
+    part TEXT := 'reservations_' || to_char(lo, 'YYYY_MM');
+BEGIN
+    IF to_regclass('public.' || part) IS NULL AND to_regclass('archive.' || part) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.reservations FOR VALUES FROM (%L) TO (%L)',
+                part, lo, (lo + interval '1 month')::date);
+            EXECUTE format(
+                'ALTER TABLE public.%I ADD CONSTRAINT %I '
+                'EXCLUDE USING gist (locale_id WITH =, during WITH &&) WHERE ({predicate})',
+                part, part || '_no_overlap_approved');
+        EXCEPTION WHEN duplicate_table OR invalid_object_definition THEN
+            NULL;  -- otra sesión la creó al mismo tiempo
+        END;
+    END IF;
+    RETURN part;
+END $$
+"""
+
+
+def _set_exclusion(predicate: str) -> None:
+    op.execute(ENSURE_PARTITION.format(predicate=predicate.replace("'", "''")))
+    partitions = op.get_bind().execute(sa.text(
+        """
+        SELECT n.nspname, c.relname, con.conname
+        FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE con.contype = 'x' AND con.conname LIKE 'reservations\\_%\\_no\\_overlap\\_approved'
+        """
+    )).all()
+    for schema, table, constraint in partitions:
+        op.execute(
+            f'ALTER TABLE {schema}."{table}" DROP CONSTRAINT "{constraint}", '
+            f'ADD CONSTRAINT "{constraint}" EXCLUDE USING gist (locale_id WITH =, during WITH &&) WHERE ({predicate})'
+        )
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE locales ADD COLUMN IF NOT EXISTS shared_capacity BOOLEAN NOT NULL DEFAULT false")
+    for table in ("reservations", "archive.reservations"):
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS headcount INTEGER")
+    op.execute(
+        "ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_headcount_positive, "
+        "ADD CONSTRAINT reservations_headcount_positive CHECK (headcount IS NULL OR headcount > 0)"
+    )
+    _set_exclusion(EXCLUSIVE)
+
+
+def downgrade() -> None:
+    # Las reservas compartidas aprobadas y solapadas harían fallar la exclusión completa
+    for table in ("reservations", "archive.reservations"):
+        op.execute(f"UPDATE {table} SET status = 'pending' WHERE status = 'approved' AND headcount IS NOT NULL")
+    _set_exclusion(LEGACY)
+    op.execute("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_headcount_positive")
+    for table in ("reservations", "archive.reservations"):
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS headcount")
+    op.execute("ALTER TABLE locales DROP COLUMN IF EXISTS shared_capacity")
@@ -0,0 +1,63 @@
+"""series de reservas recurrentes
+
+- reservation_series: una fila por serie con el patrón pedido.
+- reservations.series_id (también en archive.reservations) e índice parcial
+  para cancelar o editar la serie entera.
+- La FK de email_outbox pasa a ON UPDATE CASCADE: editar el horario de una
+  serie cambia start_dt, que forma parte de la clave de la reserva.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _outbox_fkey(on_update: str) -> None:
+    op.execute(
+        "ALTER TABLE email_outbox DROP CONSTRAINT IF EXISTS email_outbox_reservation_fkey, "
+        "ADD CONSTRAINT email_outbox_reservation_fkey FOREIGN KEY (reservation_id, reservation_start) "
+        f"REFERENCES reservations (id, start_dt) ON DELETE CASCADE {on_update}"
+    )
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reservation_series (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            locale_id UUID NOT NULL REFERENCES locales(id) ON DELETE CASCADE,
+            rule JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    op.execute("ALTER TABLE archive.reservations ADD COLUMN IF NOT EXISTS series_id UUID")
+    op.execute("ALTER TABLE reservations ADD COLUMN IF NOT EXISTS series_id UUID")
+    op.execute(
+        "ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_series_id_fkey, "
+        "ADD CONSTRAINT reservations_series_id_fkey "
+        "FOREIGN KEY (series_id) REFERENCES reservation_series(id) ON DELETE SET NULL"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_reservations_series ON reservations (series_id, start_dt) "
+        "WHERE series_id IS NOT NULL"
+    )
+    _outbox_fkey("ON UPDATE CASCADE")
+
+
+def downgrade() -> None:
+    _outbox_fkey("")
+    op.execute("DROP INDEX IF EXISTS ix_reservations_series")
+    op.execute("ALTER TABLE reservations DROP COLUMN IF EXISTS series_id")
+    op.execute("ALTER TABLE archive.reservations DROP COLUMN IF EXISTS series_id")
+    op.execute("DROP TABLE IF EXISTS reservation_series")
@@ -0,0 +1,27 @@
+"""horario semanal, excepciones y cierres por local
+
+- locales.schedule (JSONB): tramos por día de la semana, fechas con otro
+  horario y periodos de cierre (ver backend/app/schedules.py). NULL mantiene
+  open_time a close_time todos los días.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE locales ADD COLUMN IF NOT EXISTS schedule JSONB")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE locales DROP COLUMN IF EXISTS schedule")
@@ -0,0 +1,85 @@
+"""las particiones nuevas se enganchan con ATTACH PARTITION
+
+`CREATE TABLE ... PARTITION OF reservations` pide ACCESS EXCLUSIVE sobre la
+tabla padre: espera a toda transacción que la haya leído, incluida la de la
+propia petición que reserva en un mes sin partición (interbloqueo hasta el
+statement_timeout). Ahora reservations_ensure_partition crea la tabla suelta,
+le pone la exclusión y la engancha con ATTACH PARTITION, que solo pide SHARE
+UPDATE EXCLUSIVE y convive con lecturas y escrituras.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ENSURE_PARTITION = """
+CREATE OR REPLACE FUNCTION reservations_ensure_partition(month DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo DATE := date_trunc('month', month)::date;
+    part TEXT := 'reservations_' || to_char(lo, 'YYYY_MM');
+BEGIN
+    IF to_regclass('public.' || part) IS NULL AND to_regclass('archive.' || part) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE public.%I (LIKE public.reservations '
+                'INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)',
+                part);
+            EXECUTE format(
+                'ALTER TABLE public.%I ADD CONSTRAINT %I '
+                'EXCLUDE USING gist (locale_id WITH =, during WITH &&) '
+                'WHERE (status = ''approved'' AND headcount IS NULL)',
+                part, part || '_no_overlap_approved');
+            EXECUTE format(
+                'ALTER TABLE public.reservations ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                part, lo, (lo + interval '1 month')::date);
+        EXCEPTION WHEN duplicate_table OR invalid_object_definition THEN
+            NULL;  -- otra sesión la creó al mismo tiempo
+        END;
+    END IF;
+    RETURN part;
+END $$
+"""
+
+# La de la migración 0008
+PARTITION_OF = """
+CREATE OR REPLACE FUNCTION reservations_ensure_partition(month DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo DATE := date_trunc('month', month)::date;
+    part TEXT := 'reservations_' || to_char(lo, 'YYYY_MM');
+BEGIN
+    IF to_regclass('public.' || part) IS NULL AND to_regclass('archive.' || part) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.reservations FOR VALUES FROM (%L) TO (%L)',
+                part, lo, (lo + interval '1 month')::date);
+            EXECUTE format(
+                'ALTER TABLE public.%I ADD CONSTRAINT %I '
+                'EXCLUDE USING gist (locale_id WITH =, during WITH &&) '
+                'WHERE (status = ''approved'' AND headcount IS NULL)',
+                part, part || '_no_overlap_approved');
+        EXCEPTION WHEN duplicate_table OR invalid_object_definition THEN
+            NULL;  -- otra sesión la creó al mismo tiempo
+        END;
+    END IF;
+    RETURN part;
+END $$
+"""
+
+
+def upgrade() -> None:
+    op.execute(ENSURE_PARTITION)
+
+
+def downgrade() -> None:
+    op.execute(PARTITION_OF)
@@ -0,0 +1,33 @@
+"""revocación persistente de tokens
+
+- users.tokens_valid_after: los tokens emitidos hasta ese instante (UTC) no
+  pueden confiar en el rol de sus claims y pasan por la BD (ver
+  backend/app/dependencies.py). Se fija al cambiar el rol o is_active.
+- Índice parcial para cargar las revocaciones recientes al arrancar cada worker.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS tokens_valid_after TIMESTAMP")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_users_tokens_valid_after ON users (tokens_valid_after) "
+        "WHERE tokens_valid_after IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_users_tokens_valid_after")
+    op.execute("ALTER TABLE users DROP COLUMN IF EXISTS tokens_valid_after")
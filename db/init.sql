@@ -1,5 +1,7 @@
 -- init.sql
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+-- btree_gist permite combinar igualdad (locale_id) y rangos (during) en un índice GiST
+CREATE EXTENSION IF NOT EXISTS btree_gist;
 
 CREATE TYPE user_role AS ENUM ('admin','user');
 CREATE TYPE reservation_status AS ENUM ('pending','approved','rejected','cancelled');
@@ -11,22 +13,28 @@ CREATE TABLE users (
     full_name VARCHAR(255) NOT NULL,
     role user_role NOT NULL DEFAULT 'user',
     is_active BOOLEAN DEFAULT true,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    tokens_valid_after TIMESTAMP  -- cambio de rol/is_active; ver backend/app/dependencies.py
 );
+CREATE INDEX ix_users_tokens_valid_after ON users (tokens_valid_after) WHERE tokens_valid_after IS NOT NULL;
 
 CREATE TABLE locales (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     name VARCHAR(255) NOT NULL,
     description TEXT,
     capacity INTEGER,
+    shared_capacity BOOLEAN NOT NULL DEFAULT false,  -- ver backend/app/capacity.py
     location VARCHAR(255),
     open_time TIME,
     close_time TIME,
+    schedule JSONB,  -- horario semanal, excepciones y cierres; ver backend/app/schedules.py
     active BOOLEAN DEFAULT true
 );
 
+-- Reservas: particionada por mes sobre start_dt (ver backend/app/partitions.py y la
+-- migración 0006). La clave primaria debe incluir la clave de partición.
 CREATE TABLE reservations (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     locale_id UUID REFERENCES locales(id) ON DELETE CASCADE,
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     start_dt TIMESTAMP NOT NULL,
@@ -34,8 +42,151 @@ CREATE TABLE reservations (
     motive TEXT,
     status reservation_status DEFAULT 'pending',
     priority INTEGER DEFAULT 9,
+    headcount INTEGER,
+    series_id UUID,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    during TSRANGE GENERATED ALWAYS AS (tsrange(start_dt, end_dt, '[)')) STORED,
+    CONSTRAINT reservations_pkey PRIMARY KEY (id, start_dt),
+    CONSTRAINT reservations_valid_range CHECK (start_dt < end_dt),
+    CONSTRAINT reservations_headcount_positive CHECK (headcount IS NULL OR headcount > 0)
+) PARTITION BY RANGE (start_dt);
+
+-- Búsqueda de solapamientos (cualquier estado) por local
+CREATE INDEX ix_reservations_locale_during ON reservations USING gist (locale_id, during);
+
+-- Consultas calientes (mismos índices que backend/migrations/versions/0002 y 0003)
+CREATE INDEX ix_reservations_locale_start ON reservations (locale_id, start_dt) INCLUDE (end_dt, status, user_id);
+CREATE INDEX ix_reservations_user_start ON reservations (user_id, start_dt);
+CREATE INDEX ix_reservations_pending_start ON reservations (start_dt) WHERE status = 'pending';
+CREATE INDEX ix_reservations_pending_locale_start ON reservations (locale_id, start_dt, id) WHERE status = 'pending';
+CREATE INDEX ix_reservations_start_brin ON reservations USING brin (start_dt);
+CREATE INDEX ix_reservations_start_id ON reservations (start_dt, id);
+-- Cancelar o editar una serie entera (migración 0009)
+CREATE INDEX ix_reservations_series ON reservations (series_id, start_dt) WHERE series_id IS NOT NULL;
+
+-- Una partición por mes (reservations_AAAA_MM). Dos reservas aprobadas del mismo
+-- local no pueden solaparse: la exclusión va en cada partición porque
+-- PostgreSQL 15 no la admite en la tabla padre. Las reservas con headcount
+-- (locales de capacidad compartida, migración 0008) quedan fuera: su límite es
+-- la capacidad y lo comprueba el backend.
+-- La tabla se crea suelta y se engancha con ATTACH PARTITION (SHARE UPDATE
+-- EXCLUSIVE): PARTITION OF pediría ACCESS EXCLUSIVE sobre reservations y
+-- esperaría a toda transacción que la esté leyendo (migración 0011).
+CREATE FUNCTION reservations_ensure_partition(month DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo DATE := date_trunc('month', month)::date;
+    part TEXT := 'reservations_' || to_char(lo, 'YYYY_MM');
+BEGIN
+    IF to_regclass('public.' || part) IS NULL AND to_regclass('archive.' || part) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE public.%I (LIKE public.reservations '
+                'INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)',
+                part);
+            EXECUTE format(
+                'ALTER TABLE public.%I ADD CONSTRAINT %I '
+                'EXCLUDE USING gist (locale_id WITH =, during WITH &&) '
+                'WHERE (status = ''approved'' AND headcount IS NULL)',
+                part, part || '_no_overlap_approved');
+            EXECUTE format(
+                'ALTER TABLE public.reservations ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                part, lo, (lo + interval '1 month')::date);
+        EXCEPTION WHEN duplicate_table OR invalid_object_definition THEN
+            NULL;  -- otra sesión la creó al mismo tiempo
+        END;
+    END IF;
+    RETURN part;
+END $$;
+
+-- El mes anterior, el actual y los 12 siguientes; el backend crea los demás
+SELECT reservations_ensure_partition((date_trunc('month', now()) + make_interval(months => m))::date)
+FROM generate_series(-1, 12) AS m;
+
+-- Series de reservas recurrentes (ver backend/app/series.py y la migración 0009)
+CREATE TABLE reservation_series (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    locale_id UUID NOT NULL REFERENCES locales(id) ON DELETE CASCADE,
+    rule JSONB NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+ALTER TABLE reservations ADD CONSTRAINT reservations_series_id_fkey
+    FOREIGN KEY (series_id) REFERENCES reservation_series(id) ON DELETE SET NULL;
+
+-- Particiones antiguas, movidas por el trabajo archive_reservations
+CREATE SCHEMA archive;
+CREATE TABLE archive.reservations (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    locale_id UUID,
+    user_id UUID,
+    start_dt TIMESTAMP NOT NULL,
+    end_dt TIMESTAMP NOT NULL,
+    motive TEXT,
+    status reservation_status DEFAULT 'pending',
+    priority INTEGER DEFAULT 9,
+    headcount INTEGER,
+    series_id UUID,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    during TSRANGE GENERATED ALWAYS AS (tsrange(start_dt, end_dt, '[)')) STORED
+) PARTITION BY RANGE (start_dt);
+CREATE INDEX ix_archived_reservations_user_start ON archive.reservations (user_id, start_dt);
+CREATE INDEX ix_archived_reservations_start_id ON archive.reservations (start_dt, id);
+CREATE INDEX ix_archived_reservations_locale_start ON archive.reservations (locale_id, start_dt) INCLUDE (end_dt, status, user_id);
+
+-- Bandeja de salida de correos (ver backend/app/mailer.py y la migración 0004)
+CREATE TABLE email_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    reservation_id UUID NOT NULL,
+    reservation_start TIMESTAMP NOT NULL,
+    template VARCHAR(32) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP,
+    CONSTRAINT email_outbox_reservation_fkey FOREIGN KEY (reservation_id, reservation_start)
+        REFERENCES reservations (id, start_dt) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX ix_email_outbox_due ON email_outbox (next_attempt_at) WHERE status = 'pending';
+-- Borrado en cascada desde reservations y limpieza antes de archivar un mes
+CREATE INDEX ix_email_outbox_reservation ON email_outbox (reservation_start, reservation_id);
+
+-- Cola de trabajos en segundo plano (ver backend/app/jobs.py y la migración 0005)
+CREATE TABLE jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    type VARCHAR(64) NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(128),
+    heartbeat_at TIMESTAMP,
+    result JSONB,
+    output BYTEA,
+    output_type VARCHAR(64),
+    error TEXT,
+    created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+CREATE INDEX ix_jobs_queued ON jobs (type, run_after) WHERE status = 'queued';
+CREATE INDEX ix_jobs_running ON jobs (type, heartbeat_at) WHERE status = 'running';
+CREATE INDEX ix_jobs_created ON jobs (created_at);
+
+-- Respuestas de escrituras con Idempotency-Key (ver backend/app/idempotency.py y la migración 0007)
+CREATE TABLE idempotency_keys (
+    key BYTEA PRIMARY KEY,
+    fingerprint BYTEA NOT NULL,
+    status_code INTEGER,
+    body JSONB,
+    locked_until TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+CREATE INDEX ix_idempotency_keys_expires ON idempotency_keys (expires_at);
 
 -- Usuario admin inicial: admin@admin.com / password: admin
 INSERT INTO users (email, password_hash, full_name, role, is_active)
@@ -1,4 +1,4 @@
-import { Component, inject, OnInit } from '@angular/core';
+import { Component, inject, OnDestroy, OnInit } from '@angular/core';
 import { CommonModule, DatePipe } from '@angular/common';
 // Importamos FormsModule para usar [(ngModel)] en los inputs del filtro
 import { FormBuilder, FormsModule, FormGroup, Validators } from '@angular/forms';
@@ -6,7 +6,7 @@ import { AuthService } from '../../services/auth.service';
 import { AdminService } from '../../services/admin.service';
 import { ReservationWithLocale, LocaleListItem, ReservationFull } from '../../models/reservation.model';
 // Importamos combineLatest para fusionar los disparadores de recarga y filtro
-import { Observable, BehaviorSubject, switchMap, startWith, map, of, combineLatest } from 'rxjs';
+import { Observable, BehaviorSubject, Subscription, switchMap, startWith, map, of, combineLatest, debounceTime } from 'rxjs';
 import { LocaleCreate, LocaleOut } from '../../models/locale.model';
 import { LocaleAdminService } from '../../services/locale-admin.service';
 
@@ -18,7 +18,7 @@ import { LocaleAdminService } from '../../services/locale-admin.service';
   templateUrl: './admin-dashboard.component.html',
   styleUrls: ['./admin-dashboard.component.css']
 })
-export class AdminDashboardComponent implements OnInit {
+export class AdminDashboardComponent implements OnInit, OnDestroy {
   private auth = inject(AuthService);
   private adminSvc = inject(AdminService);
 
@@ -97,8 +97,20 @@ export class AdminDashboardComponent implements OnInit {
 
     // Cargar locales reales desde el servicio
     this.locales$.subscribe(list => list.forEach(l => this.localesMap.set(l.id, l)));
+
+    // Eventos del servidor en lugar de sondeo: solo recargamos cuando algo cambia
+    // (agrupando ráfagas, p. ej. una aprobación masiva)
+    this.eventsSub = this.adminSvc.events()
+      .pipe(debounceTime(300))
+      .subscribe(() => this.reloadTrigger$.next());
+  }
+
+  ngOnDestroy(): void {
+    this.eventsSub?.unsubscribe();
   }
 
+  private eventsSub?: Subscription;
+
   // --- TEMPLATE HELPERS ---
   getLocaleDetail(id: string): LocaleListItem | undefined {
     return this.localesMap.get(id);
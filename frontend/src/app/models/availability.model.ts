@@ -23,4 +23,17 @@ export interface AvailabilityResponse {
   occupied_slots: ReservationDisplay[];
   // Los slots disponibles siguen siendo TimeRange (bloques continuos)
   available_slots: TimeRange[];
-}
\ No newline at end of file
+}
+
+// Respuesta compacta de GET /api/locales/availability (varios locales × varios días)
+// occupied: [inicio, fin, estado, id]   free: [inicio, fin]
+export interface DayAvailability {
+  occupied: [string, string, string, string][];
+  free: [string, string][];
+}
+
+export interface AvailabilityRangeResponse {
+  from: string;
+  to: string;
+  locales: { [localeId: string]: { name: string; days: { [date: string]: DayAvailability } } };
+}
@@ -1,13 +1,13 @@
-import { Injectable } from '@angular/core';
+import { Injectable, NgZone } from '@angular/core';
 import { HttpClient, HttpParams } from '@angular/common/http';
-import { Observable, map, of } from 'rxjs';
+import { Observable, Subscription, map, of } from 'rxjs';
 import { ReservationOut, ReservationWithLocale, ReservationFull } from '../models/reservation.model';
 
 @Injectable({ providedIn: 'root' })
 export class AdminService {
   private api = 'http://localhost:8000/api/admin';
 
-  constructor(private http: HttpClient) {}
+  constructor(private http: HttpClient, private zone: NgZone) {}
 
   getConflicts(): Observable<any[]> {
     return this.http.get<any[]>(`${this.api}/conflicts`);
@@ -60,4 +60,84 @@ export class AdminService {
         })
       );
   }
-}
\ No newline at end of file
+
+  /**
+   * Una página del historial paginado por cursor.
+   * nextCursor viene en la cabecera X-Next-Cursor (null si no hay más páginas).
+   */
+  getHistoryPage(
+    filters: { start?: string; end?: string; localeId?: string; userId?: string; status?: string; q?: string },
+    cursor: string | null = null,
+    limit = 100
+  ): Observable<{ items: ReservationWithLocale[]; nextCursor: string | null }> {
+    let params = new HttpParams().set('limit', limit);
+    if (filters.start) params = params.set('start_date', filters.start);
+    if (filters.end) params = params.set('end_date', filters.end);
+    if (filters.localeId) params = params.set('locale_id', filters.localeId);
+    if (filters.userId) params = params.set('user_id', filters.userId);
+    if (filters.status) params = params.set('status', filters.status);
+    if (filters.q) params = params.set('q', filters.q);
+    if (cursor) params = params.set('cursor', cursor);
+
+    return this.http.get<ReservationWithLocale[]>(`${this.api}/history`, { params, observe: 'response' })
+      .pipe(map(res => ({ items: res.body || [], nextCursor: res.headers.get('X-Next-Cursor') })));
+  }
+
+  /**
+   * Eventos en vivo del panel (SSE): reservation_created, status_changed,
+   * conflicts_changed y resync. EventSource no admite cabeceras, así que se
+   * conecta con un ticket de vida corta (POST /events/ticket, con el token en
+   * la cabecera). Ante un error no dejamos que EventSource reintente con la
+   * misma URL (el ticket ya habría caducado): cerramos, pedimos otro ticket y
+   * reabrimos con espera creciente. Al reconectar emitimos un resync porque
+   * pudimos perder eventos. Se cierra al desuscribirse.
+   */
+  events(): Observable<{ type: string; [key: string]: any }> {
+    return new Observable(subscriber => {
+      const types = ['reservation_created', 'status_changed', 'conflicts_changed', 'resync'];
+      const handler = (e: MessageEvent) => this.zone.run(() => subscriber.next(JSON.parse(e.data)));
+      let source: EventSource | null = null;
+      let ticketSub: Subscription | undefined;
+      let retry: ReturnType<typeof setTimeout> | undefined;
+      let delay = 1000;
+      let connected = false;
+      let closed = false;
+
+      const reconnect = () => {
+        if (closed) return;
+        retry = setTimeout(connect, delay);
+        delay = Math.min(delay * 2, 30000);
+      };
+
+      const connect = () => {
+        ticketSub = this.http.post<{ ticket: string }>(`${this.api}/events/ticket`, {}).subscribe({
+          next: ({ ticket }) => {
+            if (closed) return;
+            source = new EventSource(`${this.api}/events?ticket=${encodeURIComponent(ticket)}`);
+            types.forEach(t => source!.addEventListener(t, handler as EventListener));
+            source.onopen = () => {
+              delay = 1000;
+              if (connected) this.zone.run(() => subscriber.next({ type: 'resync' }));
+              connected = true;
+            };
+            source.onerror = () => {
+              source?.close();
+              source = null;
+              reconnect();
+            };
+          },
+          // Sin sesión válida no tiene sentido insistir
+          error: err => (err.status === 401 || err.status === 403) ? subscriber.error(err) : reconnect()
+        });
+      };
+
+      connect();
+      return () => {
+        closed = true;
+        clearTimeout(retry);
+        ticketSub?.unsubscribe();
+        source?.close();
+      };
+    });
+  }
+}
@@ -2,6 +2,7 @@
 import { Injectable } from '@angular/core';
 import { HttpClient, HttpParams } from '@angular/common/http';
 import { Observable } from 'rxjs';
+import { AvailabilityRangeResponse } from '../models/availability.model';
 
 export interface TimeSlot {
     start_dt: string; 
@@ -36,4 +37,17 @@ export class LocaleService {
             { params: params }
         );
     }
+
+    /**
+     * Disponibilidad de varios locales entre dos fechas (inclusive) en UNA sola petición.
+     * @param localeIds IDs de los locales
+     * @param from Primer día 'YYYY-MM-DD'
+     * @param to Último día 'YYYY-MM-DD'
+     */
+    getAvailabilityRange(localeIds: string[], from: string, to: string): Observable<AvailabilityRangeResponse> {
+        let params = new HttpParams().set('from', from).set('to', to);
+        localeIds.forEach(id => params = params.append('locale_ids[]', id));
+
+        return this.http.get<AvailabilityRangeResponse>(`${this.api}/availability`, { params });
+    }
 }
\ No newline at end of file